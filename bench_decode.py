@@ -0,0 +1,52 @@
+"""Compare full-resolution vs fast (draft) decode for scanner feature extraction.
+
+Usage: python bench_decode.py [megapixels] [runs]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from photoscanner.scanner import ScanOptions, extract_features, hamming_distance_hex_phash
+
+
+def make_jpeg(path: Path, megapixels: float) -> None:
+    # Upscaled random blobs plus grain: compresses and hashes like a real photo.
+    w = int((megapixels * 1_000_000 * 1.5) ** 0.5)
+    h = int(w / 1.5)
+    rng = np.random.default_rng(0)
+    blobs = (rng.random((30, 45, 3)) * 255).astype("uint8")
+    img = cv2.resize(blobs, (w, h), interpolation=cv2.INTER_CUBIC).astype(np.int16)
+    img += rng.integers(0, 10, size=img.shape, dtype=np.int16)
+    Image.fromarray(img.clip(0, 255).astype("uint8")).save(path, quality=92)
+
+
+def bench(path: Path, fast: bool, runs: int):
+    options = ScanOptions(fast_decode=fast)
+    extract_features(str(path), options)  # warm-up (page cache, imports)
+    start = time.perf_counter()
+    for _ in range(runs):
+        feats = extract_features(str(path), options)
+    return (time.perf_counter() - start) / runs, feats
+
+
+if __name__ == "__main__":
+    megapixels = float(sys.argv[1]) if len(sys.argv) > 1 else 24.0
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.jpg"
+        make_jpeg(path, megapixels)
+        print(f"{megapixels:.0f} MP JPEG, {path.stat().st_size / 1e6:.1f} MB, {runs} runs")
+
+        full_t, full = bench(path, fast=False, runs=runs)
+        fast_t, fast = bench(path, fast=True, runs=runs)
+
+        print(f"full decode: {full_t * 1000:8.1f} ms/file  sharpness={full.sharpness:.1f}")
+        print(f"fast decode: {fast_t * 1000:8.1f} ms/file  sharpness={fast.sharpness:.1f}")
+        print(f"speedup:     {full_t / fast_t:8.1f}x")
+        print(f"pHash distance full vs fast: {hamming_distance_hex_phash(full.phash, fast.phash)}")
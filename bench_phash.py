@@ -0,0 +1,53 @@
+"""Compare per-image imagehash.phash() with the batched NumPy pHash engine.
+
+Usage: python bench_phash.py [images] [runs]
+"""
+import sys
+import time
+
+import imagehash
+import numpy as np
+from PIL import Image
+
+from photoscanner.hashing import phash_batch, phash_input, phash_to_hex
+
+
+def make_images(count: int) -> list[Image.Image]:
+    # Working-size (512 px) images like the scanner hands to the hasher.
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        blobs = rng.random((6, 8, 3))
+        arr = np.kron(blobs, np.ones((64, 64, 1))) * 255 + rng.normal(0, 20, (384, 512, 3))
+        images.append(Image.fromarray(arr.clip(0, 255).astype("uint8")))
+    return images
+
+
+def timed(fn, runs: int):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        out = fn()
+    return (time.perf_counter() - start) / runs, out
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    images = make_images(count)
+    stack = np.stack([phash_input(img) for img in images])
+    print(f"{count} images, {runs} runs")
+
+    ref_t, ref = timed(lambda: [str(imagehash.phash(img)) for img in images], runs)
+    down_t, _ = timed(lambda: np.stack([phash_input(img) for img in images]), runs)
+    batch_t, batch = timed(lambda: phash_batch(stack), runs)
+
+    print(f"imagehash.phash per image: {ref_t * 1e6 / count:8.1f} us/image")
+    print(f"downsample to 32x32:       {down_t * 1e6 / count:8.1f} us/image")
+    print(f"phash_batch (hash only):   {batch_t * 1e6 / count:8.1f} us/image")
+    # imagehash spends the same time downsampling; the rest is DCT + hex.
+    print(f"hash step speedup:         {max(ref_t - down_t, 0.0) / batch_t:8.1f}x")
+    print(f"end-to-end speedup:        {ref_t / (down_t + batch_t):8.1f}x")
+    mismatches = sum(a != phash_to_hex(b) for a, b in zip(ref, batch))
+    print(f"mismatching hashes:        {mismatches}")
@@ -0,0 +1,28 @@
+"""Shared pytest fixtures for the photoscanner tests (``python -m pytest test_*.py``)."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+
+@pytest.fixture
+def write_image() -> Callable[..., Path]:
+    """Write a random-noise JPEG; distinct seeds give unrelated images."""
+    import numpy as np
+    from PIL import Image
+
+    def write(
+        path: Path, seed: int = 0, size: tuple[int, int] = (96, 64), mtime_ns: int | None = None
+    ) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pixels = (np.random.default_rng(seed).random((size[1], size[0], 3)) * 255).astype("uint8")
+        Image.fromarray(pixels).save(path, quality=95)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    return write
@@ -1,7 +1,15 @@
 from __future__ import annotations
 
-from photoscanner.gui.app import run
+import sys
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Subcommands run headless, without importing Qt.
+        from photoscanner.cli import main
+
+        sys.exit(main())
+
+    from photoscanner.gui.app import run
+
     run()
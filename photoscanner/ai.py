@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import importlib.util
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Optional
@@ -47,6 +48,13 @@ class EmbeddingModel:
         vec = self._model.encode([str(path)], normalize_embeddings=True)[0]
         return vec.astype("float32").tobytes()
 
+    def embed_files(self, paths: list[Path], batch_size: int = 32) -> list[bytes]:
+        """Embed several files in one encode() call (much better GPU utilisation)."""
+        vecs = self._model.encode(
+            [str(p) for p in paths], batch_size=batch_size, normalize_embeddings=True
+        )
+        return [v.astype("float32").tobytes() for v in vecs]
+
     def suggest_labels(self, path: Path, labels: list[str], top_k: int = 5) -> list[tuple[str, float]]:
         """Suggest labels for an image using Zero-Shot Classification."""
         from sentence_transformers import util  # type: ignore
@@ -236,25 +244,38 @@ class Detector:
         return out
 
 
+def _missing_modules(*names: str) -> list[str]:
+    """Modules among ``names`` that are not installed.
+
+    Only looks the packages up instead of importing them: importing
+    sentence-transformers (torch) or mediapipe takes seconds, and the GUI asks
+    when a window opens. A broken install is reported when a model is loaded.
+    """
+    missing = []
+    for name in names:
+        try:
+            if importlib.util.find_spec(name) is None:
+                missing.append(name)
+        except (ImportError, ValueError):
+            missing.append(name)
+    return missing
+
+
 def get_ai_availability() -> AIAvailability:
     embeddings_ok = True
     detection_ok = True
     emb_reason = None
     det_reason = None
 
-    try:
-        import sentence_transformers  # noqa: F401
-    except Exception as e:
+    missing = _missing_modules("sentence_transformers")
+    if missing:
         embeddings_ok = False
-        emb_reason = str(e)
+        emb_reason = f"No module named {missing[0]!r}"
 
-    try:
-        import mediapipe  # noqa: F401
-        import cv2  # noqa: F401
-        import numpy  # noqa: F401
-    except Exception as e:
+    missing = _missing_modules("mediapipe", "cv2", "numpy")
+    if missing:
         detection_ok = False
-        det_reason = str(e)
+        det_reason = f"No module named {missing[0]!r}"
 
     return AIAvailability(
         embeddings=embeddings_ok,
@@ -0,0 +1,561 @@
+"""Headless command-line interface: scan, rescan, duplicates, stats, prune, watch, bad-files, merge.
+
+Runs without PySide6, so it works on servers and from cron/systemd. Results
+are printed to stdout (JSON by default); progress goes to stderr, as JSON
+lines unless stderr is a terminal.
+
+Exit codes: 0 success, 1 error, 2 usage error, 3 scan finished but some
+files could not be read, 130 interrupted (SIGINT/SIGTERM; an interrupted
+scan can be continued with ``scan --resume``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import os
+import signal
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3
+EXIT_INTERRUPTED = 130
+
+DEFAULT_DB = "photoscanner.sqlite"
+
+
+class _Progress:
+    """Progress output on stderr."""
+
+    def __init__(self, mode: str, stream: TextIO = sys.stderr) -> None:
+        self._mode = mode
+        self._stream = stream
+
+    def event(self, name: str, **fields: Any) -> None:
+        if self._mode == "json":
+            self._stream.write(json.dumps({"event": name, **fields}) + "\n")
+        elif self._mode == "text":
+            self._stream.write(
+                f"{name}: " + ", ".join(f"{k}={v}" for k, v in fields.items()) + "\n"
+            )
+        else:
+            return
+        self._stream.flush()
+
+    def scan_cb(self, progress) -> None:
+        """ScanProgress callback; the scanner already limits the rate."""
+        if self._mode == "json":
+            self.event("progress", **dataclasses.asdict(progress))
+        elif self._mode == "text":
+            from photoscanner.progress import format_eta
+
+            self._stream.write(
+                f"scanned {progress.scanned}, done {progress.done}/{progress.queued}, "
+                f"skipped {progress.skipped}, {progress.files_per_s:.1f} files/s, "
+                f"{progress.mb_per_s:.1f} MB/s, ETA {format_eta(progress.eta)}\n"
+            )
+            self._stream.flush()
+
+
+def _emit(args: argparse.Namespace, data: Any, text: Optional[str] = None) -> None:
+    if args.format == "json" or text is None:
+        print(json.dumps(data, indent=2 if sys.stdout.isatty() else None))
+    else:
+        print(text)
+
+
+def _open_db(args: argparse.Namespace):
+    from photoscanner.db import PhotoDB
+
+    # Opening a database from an older version upgrades it first.
+    progress = _Progress(args.progress)
+    return PhotoDB(
+        Path(args.db), migration_cb=lambda p: progress.event("migrate", **dataclasses.asdict(p))
+    )
+
+
+def _scan_options(args: argparse.Namespace, incremental: bool):
+    from photoscanner.scanner import ScanOptions
+
+    return ScanOptions(
+        compute_embeddings=args.embeddings,
+        detect_faces=args.faces,
+        detect_objects=args.objects,
+        incremental=incremental,
+        workers=args.workers if args.workers is not None else max(1, os.cpu_count() or 1),
+        fast_decode=args.fast_decode,
+        exact_only=args.exact_only,
+        use_previews=args.use_previews,
+        deep=args.deep,
+        profile=args.profile,
+        retry_bad=args.retry_bad,
+        reuse_features=not args.no_reuse,
+        detect_moves=not args.no_move_detection,
+    )
+
+
+def _ai_models(args: argparse.Namespace, options) -> tuple[Optional[object], Optional[object]]:
+    if not (options.compute_embeddings or options.detect_faces or options.detect_objects):
+        return None, None
+    from photoscanner.ai import Detector, EmbeddingModel
+
+    embedding_model = EmbeddingModel(device=args.device) if options.compute_embeddings else None
+    detector = Detector() if options.detect_faces or options.detect_objects else None
+    return embedding_model, detector
+
+
+def _result_dict(res) -> dict[str, Any]:
+    return dataclasses.asdict(res)
+
+
+def _run_scan(args: argparse.Namespace, folders: list[str], incremental: bool) -> int:
+    from photoscanner.profiling import format_profile
+    from photoscanner.scanner import options_from_json, scan_folders
+
+    db = _open_db(args)
+    try:
+        options = _scan_options(args, incremental)
+        if args.resume:
+            cp = db.get_checkpoint()
+            if cp is None:
+                print("No interrupted scan to resume.", file=sys.stderr)
+                return EXIT_ERROR
+            # The checkpoint only matches its own folders and options; tuning
+            # (workers etc.) follows the command line.
+            folders = list(cp.folders)
+            options = dataclasses.replace(
+                options_from_json(cp.options_json),
+                workers=options.workers,
+                profile=options.profile,
+                reuse_features=options.reuse_features,
+                detect_moves=options.detect_moves,
+            )
+        if not folders:
+            print(
+                "No folders to scan: pass folders or register them with 'scan FOLDER'.",
+                file=sys.stderr,
+            )
+            return EXIT_USAGE
+        for folder in folders:
+            db.add_folder(folder)
+        db.commit()
+
+        embedding_model, detector = _ai_models(args, options)
+        progress = _Progress(args.progress)
+        progress.event(
+            "start", folders=folders, incremental=options.incremental, resume=args.resume
+        )
+        res = scan_folders(
+            db,
+            folders=[Path(f) for f in folders],
+            options=options,
+            embedding_model=embedding_model,
+            detector=detector,
+            progress_cb=progress.scan_cb,
+            resume=args.resume,
+            progress_interval=args.progress_interval,
+        )
+    finally:
+        db.close()
+
+    data = _result_dict(res)
+    text = (
+        f"scanned {res.scanned}, indexed {res.indexed}, skipped {res.skipped} "
+        f"(new {res.new}, changed {res.changed}, unchanged {res.unchanged}, "
+        f"vanished {res.vanished})"
+    )
+    if res.moved:
+        text += f"; {res.moved} moved files kept their rows"
+    if res.reused:
+        text += f"; reused features of {res.reused} already indexed copies"
+    if res.known_bad:
+        text += f"; {res.known_bad} known bad files not retried (see 'bad-files')"
+    if res.profile is not None:
+        text += "\n\n" + format_profile(res.profile)
+    _emit(args, data, text)
+    return EXIT_PARTIAL if res.skipped else EXIT_OK
+
+
+def cmd_scan(args: argparse.Namespace) -> int:
+    folders = [str(Path(f).resolve()) for f in args.folders]
+    for f in folders:
+        if not os.path.isdir(f):
+            print(f"Not a directory: {f}", file=sys.stderr)
+            return EXIT_USAGE
+    if not folders and not args.resume:
+        db = _open_db(args)
+        folders = db.get_folders()
+        db.close()
+    return _run_scan(args, folders, incremental=args.incremental)
+
+
+def cmd_rescan(args: argparse.Namespace) -> int:
+    db = _open_db(args)
+    folders = db.get_folders()
+    db.close()
+    return _run_scan(args, folders, incremental=not args.full)
+
+
+def cmd_duplicates(args: argparse.Namespace) -> int:
+    from photoscanner.scanner import group_duplicates_by_phash, group_duplicates_by_sha256
+
+    families = tuple(f.strip() for f in args.hash.split(",") if f.strip())
+    db = _open_db(args)
+    try:
+        records = list(db.iter_images())
+    finally:
+        db.close()
+
+    groups: list[dict[str, Any]] = []
+    if args.method in ("sha256", "all"):
+        for g in group_duplicates_by_sha256(records):
+            groups.append({"method": "sha256", "key": g[0].sha256, "paths": [r.path for r in g]})
+    if args.method in ("similar", "all"):
+        try:
+            similar = group_duplicates_by_phash(records, args.threshold, families, args.mode)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return EXIT_USAGE
+        for g in similar:
+            groups.append(
+                {"method": "+".join(families), "key": g[0].path, "paths": [r.path for r in g]}
+            )
+
+    lines = []
+    for i, g in enumerate(groups, start=1):
+        lines.append(f"[{i}] {g['method']}")
+        lines.extend(f"  {'*' if j == 0 else ' '} {p}" for j, p in enumerate(g["paths"]))
+    _emit(args, {"groups": groups}, "\n".join(lines) if lines else "No duplicates.")
+    return EXIT_OK
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    db = _open_db(args)
+    try:
+        data = db.stats()
+        data["db_path"] = str(Path(args.db).resolve())
+        data["registered_folders"] = db.get_folders()
+        cp = db.get_checkpoint()
+        data["interrupted_scan"] = cp.folders if cp is not None else None
+    finally:
+        db.close()
+    text = "\n".join(f"{k}: {v}" for k, v in data.items())
+    _emit(args, data, text)
+    return EXIT_OK
+
+
+def cmd_prune(args: argparse.Namespace) -> int:
+    """Drop rows of files that no longer exist.
+
+    Rows below a registered folder that is itself missing (an unmounted
+    share) are kept unless --include-missing-roots is given.
+    """
+    from photoscanner.db import path_prefix_bounds
+
+    db = _open_db(args)
+    try:
+        missing_roots = [f for f in db.get_folders() if not os.path.isdir(f)]
+        bounds = [path_prefix_bounds(f) for f in missing_roots]
+        removed: list[str] = []
+        kept_unavailable = 0
+        for path in list(db.iter_image_paths()):
+            if os.path.exists(path):
+                continue
+            if not args.include_missing_roots and any(lo <= path < hi for lo, hi in bounds):
+                kept_unavailable += 1
+                continue
+            removed.append(path)
+            if not args.dry_run:
+                db.delete_image(path)
+        # Failure records of deleted files go too; they are not counted as rows.
+        gone_bad = [
+            p
+            for p in db.get_bad_files()
+            if not os.path.exists(p)
+            and (args.include_missing_roots or not any(lo <= p < hi for lo, hi in bounds))
+        ]
+        if not args.dry_run:
+            db.delete_bad_files(gone_bad)
+        db.commit()
+    finally:
+        db.close()
+
+    data = {
+        "removed": len(removed),
+        "kept_unavailable": kept_unavailable,
+        "bad_files_removed": len(gone_bad),
+        "dry_run": args.dry_run,
+    }
+    if args.verbose:
+        data["paths"] = removed
+    text = f"{'would remove' if args.dry_run else 'removed'} {len(removed)} rows"
+    if gone_bad:
+        text += f" and {len(gone_bad)} bad file records"
+    if kept_unavailable:
+        text += f"; kept {kept_unavailable} below unavailable folders"
+    _emit(args, data, text)
+    return EXIT_OK
+
+
+def cmd_bad_files(args: argparse.Namespace) -> int:
+    """List files that failed to index; --retry re-processes them, --clear forgets them."""
+    db = _open_db(args)
+    try:
+        bad: dict[str, Any] = {}
+        if args.folders:
+            for folder in args.folders:
+                bad.update(db.get_bad_files(str(Path(folder).resolve())))
+        else:
+            bad = db.get_bad_files()
+
+        if args.clear:
+            n = db.delete_bad_files(list(bad))
+            db.commit()
+            _emit(args, {"cleared": n}, f"cleared {n} bad file records")
+            return EXIT_OK
+
+        if args.retry:
+            from photoscanner.scanner import index_paths
+
+            options = dataclasses.replace(_scan_options(args, incremental=True), retry_bad=True)
+            embedding_model, detector = _ai_models(args, options)
+            progress = _Progress(args.progress)
+            progress.event("start", retry=len(bad))
+            res = index_paths(
+                db,
+                list(bad),
+                options,
+                embedding_model=embedding_model,
+                detector=detector,
+                progress_cb=progress.scan_cb,
+                progress_interval=args.progress_interval,
+            )
+            data = _result_dict(res)
+            text = (
+                f"retried {res.scanned}: indexed {res.indexed}, "
+                f"failed {res.skipped}, removed {res.vanished}"
+            )
+            _emit(args, data, text)
+            return EXIT_PARTIAL if res.skipped else EXIT_OK
+    finally:
+        db.close()
+
+    files = [dataclasses.asdict(b) for b in bad.values()]
+    text = (
+        "\n".join(f"{b.path}\t{b.error_class}: {b.message}" for b in bad.values())
+        or "No bad files."
+    )
+    _emit(args, {"bad_files": files}, text)
+    return EXIT_OK
+
+
+def cmd_merge(args: argparse.Namespace) -> int:
+    """Merge shard databases scanned on other machines, see photoscanner.merge."""
+    from photoscanner.merge import merge_shards, parse_prefix_map
+
+    try:
+        prefix_map = parse_prefix_map(args.map)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_USAGE
+    progress = _Progress(args.progress)
+    db = _open_db(args)
+    try:
+        res = merge_shards(
+            db,
+            [Path(s) for s in args.shards],
+            prefix_map,
+            replace=args.replace,
+            progress_cb=lambda shard, stats: progress.event(
+                "shard", shard=shard, **dataclasses.asdict(stats)
+            ),
+        )
+    finally:
+        db.close()
+    text = (
+        f"merged {res.shards} shards: {res.images} rows, inserted {res.inserted}, "
+        f"updated {res.updated}, kept {res.kept} (target newer), deleted {res.deleted}"
+    )
+    _emit(args, _result_dict(res), text)
+    return EXIT_OK
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+    from photoscanner.watch import FolderWatcher
+
+    options = _scan_options(args, incremental=True)
+    options = dataclasses.replace(options, workers=1)
+    progress = _Progress(args.progress)
+    db = _open_db(args)
+    try:
+        if not db.get_folders():
+            print("No registered folders; run 'scan FOLDER' first.", file=sys.stderr)
+            return EXIT_USAGE
+        embedding_model, detector = _ai_models(args, options)
+        stop = threading.Event()
+        # Stop cleanly (applying pending events) on Ctrl+C or SIGTERM.
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        watcher = FolderWatcher(
+            db,
+            options,
+            embedding_model=embedding_model,
+            detector=detector,
+            batch_cb=lambda res: progress.event("batch", **_result_dict(res)),
+        )
+        progress.event("start", folders=db.get_folders())
+        watcher.run(stop)
+    finally:
+        db.close()
+    return EXIT_OK
+
+
+def _add_scan_options(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--workers", type=int, default=None, help="decode/hash processes (default: CPU count)"
+    )
+    p.add_argument("--fast-decode", action="store_true", help="decode at reduced resolution")
+    p.add_argument("--exact-only", action="store_true", help="only find byte-identical copies")
+    p.add_argument(
+        "--use-previews", action="store_true", help="pre-filter large JPEGs via EXIF thumbnails"
+    )
+    p.add_argument(
+        "--deep", action="store_true", help="list every directory even if its mtime is unchanged"
+    )
+    p.add_argument("--embeddings", action="store_true", help="compute CLIP embeddings")
+    p.add_argument("--faces", action="store_true", help="run face detection")
+    p.add_argument("--objects", action="store_true", help="run object detection")
+    p.add_argument("--device", default="cpu", help="AI device, e.g. cpu or cuda")
+    p.add_argument("--profile", action="store_true", help="report per-stage timings")
+    p.add_argument(
+        "--no-reuse", action="store_true", help="decode copies of already indexed files again"
+    )
+    p.add_argument(
+        "--no-move-detection",
+        action="store_true",
+        help="index moved/renamed files as new instead of moving their rows",
+    )
+    p.add_argument(
+        "--retry-bad",
+        action="store_true",
+        help="re-process files that failed before even if unchanged",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="photoscanner", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"database file (default: ./{DEFAULT_DB})")
+    parser.add_argument(
+        "--format", choices=("json", "text"), default="json", help="result format on stdout"
+    )
+    parser.add_argument(
+        "--progress",
+        choices=("json", "text", "none"),
+        default=None,
+        help="progress on stderr (default: text on a terminal, else json)",
+    )
+    parser.add_argument(
+        "--progress-interval", type=float, default=1.0, help="seconds between progress lines"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scan", help="scan folders (default: the registered ones)")
+    p.add_argument(
+        "folders", nargs="*", help="folders to scan; they are registered in the database"
+    )
+    p.add_argument("--incremental", action="store_true", help="skip unchanged files")
+    p.add_argument("--resume", action="store_true", help="continue an interrupted scan")
+    _add_scan_options(p)
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("rescan", help="incrementally rescan the registered folders")
+    p.add_argument("--full", action="store_true", help="re-process unchanged files too")
+    _add_scan_options(p)
+    p.set_defaults(func=cmd_rescan, resume=False)
+
+    p = sub.add_parser("duplicates", help="list duplicate groups")
+    p.add_argument("--method", choices=("sha256", "similar", "all"), default="all")
+    p.add_argument(
+        "--hash", default="phash", help="comma-separated hash families for similar images"
+    )
+    p.add_argument("--threshold", type=int, default=6, help="max Hamming distance in bits")
+    p.add_argument(
+        "--mode", choices=("all", "any"), default="all", help="require all or any family to match"
+    )
+    p.set_defaults(func=cmd_duplicates)
+
+    p = sub.add_parser("stats", help="show database statistics")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("prune", help="remove rows of deleted files")
+    p.add_argument("--dry-run", action="store_true")
+    p.add_argument(
+        "--include-missing-roots", action="store_true", help="also prune below unavailable folders"
+    )
+    p.add_argument("--verbose", action="store_true", help="list the pruned paths")
+    p.set_defaults(func=cmd_prune)
+
+    p = sub.add_parser("bad-files", help="list files that failed to index")
+    p.add_argument("folders", nargs="*", help="only files below these folders")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--retry", action="store_true", help="re-process the listed files")
+    group.add_argument(
+        "--clear", action="store_true", help="forget the listed files so the next scan retries them"
+    )
+    _add_scan_options(p)
+    p.set_defaults(func=cmd_bad_files)
+
+    p = sub.add_parser("merge", help="merge shard databases scanned on other machines")
+    p.add_argument("shards", nargs="+", help="shard database files")
+    p.add_argument(
+        "--map",
+        action="append",
+        default=[],
+        metavar="OLD=NEW",
+        help="rewrite shard paths starting with OLD to start with NEW (repeatable)",
+    )
+    p.add_argument(
+        "--replace",
+        action="store_true",
+        help="delete rows below the shards' folders they no longer have",
+    )
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser("watch", help="keep the index up to date until interrupted")
+    _add_scan_options(p)
+    p.set_defaults(func=cmd_watch)
+
+    return parser
+
+
+def _raise_interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.progress is None:
+        args.progress = "text" if sys.stderr.isatty() else "json"
+    # systemd stops services with SIGTERM; handle it like Ctrl+C so the scan
+    # checkpoint and the last committed batch stay consistent.
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("Interrupted.", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        print(f"Error: {type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
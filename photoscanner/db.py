@@ -1,20 +1,43 @@
 from __future__ import annotations
 
 import json
+import os
 import sqlite3
-from dataclasses import dataclass
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
 
+from photoscanner.migrations import MigrationProgress, migrate
 
-SCHEMA_VERSION = 1
+
+# Bumped together with a new entry in photoscanner.migrations.MIGRATIONS.
+# 2: pHash stored as a signed 64-bit INTEGER, sha256/partial_hash as BLOBs.
+SCHEMA_VERSION = 2
+
+# Prefix of the "partial:<hex>" content keys of exact-only scans, see
+# photoscanner.scanner. Stored as the 16-byte digest without the prefix.
+PARTIAL_HASH_PREFIX = "partial:"
+
+# Applied by PhotoDB.ingest_pragmas() while a scan is writing.
+INGEST_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -64 * 1024,  # KiB, i.e. 64 MiB of page cache
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
 
 
 @dataclass(frozen=True)
 class ImageRecord:
     path: str
+    # Hex digest (or a "partial:" key); stored as a BLOB.
     sha256: str
+    # Hex pHash, "" for rows that have not been decoded yet.
     phash: str
+    # As displayed; for RAW files, the size of the embedded preview.
     width: int
     height: int
     file_size: int
@@ -23,11 +46,119 @@ class ImageRecord:
     embedding: Optional[bytes]
     faces_json: Optional[str]
     objects_json: Optional[str]
+    # Further 64-bit perceptual hashes (see photoscanner.hashing); None for rows
+    # that have not been decoded with them yet.
+    dhash: Optional[int] = None
+    ahash: Optional[int] = None
+    whash: Optional[int] = None
+    chash: Optional[int] = None
+    rhash: Optional[int] = None
+    # Hashes/sharpness were computed from the embedded EXIF thumbnail.
+    from_preview: bool = False
+    # Fingerprint of size, head and tail (photoscanner.scanner.partial_hash);
+    # lets a moved file be recognised without hashing it in full.
+    partial_hash: Optional[str] = None
+    # ``phash`` as an int, as stored in the database; derived from ``phash``
+    # when not given, so pass both or neither (e.g. with dataclasses.replace).
+    phash_int: Optional[int] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.phash_int is None and self.phash:
+            object.__setattr__(self, "phash_int", int(self.phash, 16))
+
+
+@dataclass(frozen=True)
+class IndexedFile:
+    """Stat snapshot of an indexed image, used to skip unchanged files on rescan."""
+
+    path: str
+    file_size: int
+    mtime_ns: int
+    has_embedding: bool
+    has_faces: bool
+    has_objects: bool
+    # False for rows written by an exact-only scan (no pHash/dimensions yet).
+    decoded: bool = True
+    from_preview: bool = False
+
+
+@dataclass(frozen=True)
+class ScanCheckpoint:
+    """Progress of an unfinished scan, persisted so it can be resumed."""
+
+    folders: list[str]
+    options_json: str
+    options_hash: str
+    started_at: float
+    updated_at: float
+    completed_dirs: int
+
+
+@dataclass(frozen=True)
+class BadFile:
+    """A file the scanner failed on. Later scans skip it while its size and
+    mtime are unchanged (see ScanOptions.retry_bad)."""
+
+    path: str
+    file_size: int
+    mtime_ns: int
+    # Exception class name and message of the failure.
+    error_class: str
+    message: str
+    failed_at: float = 0.0
+
+
+@dataclass(frozen=True)
+class ShardMergeStats:
+    """Outcome of PhotoDB.merge_shard()."""
+
+    # Image rows in the shard, and how they were applied.
+    images: int
+    inserted: int
+    updated: int
+    # Rows not applied because the target already held the same or a newer
+    # version of the file.
+    kept: int
+    # Target rows below the shard's folders that the shard no longer has
+    # (only with replace=True).
+    deleted: int = 0
+    bad_files: int = 0
+
+
+@dataclass(frozen=True)
+class DirCacheEntry:
+    """A directory as last listed by a scan; lets unchanged directories skip re-listing."""
+
+    path: str
+    mtime_ns: int
+    # Number of image files the listing found.
+    entry_count: int
+    # Full paths of the subdirectories to descend into.
+    subdirs: tuple[str, ...]
+
+
+def path_prefix_bounds(folder: str) -> tuple[str, str]:
+    """Return the [low, high) key range covering every path below ``folder``.
+
+    Lets prefix lookups use the primary key index instead of a LIKE scan.
+    """
+    prefix = str(Path(folder))
+    if not prefix.endswith(os.sep):
+        prefix += os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
 
 
 class PhotoDB:
-    def __init__(self, db_path: Path):
+    def __init__(
+        self, db_path: Path, migration_cb: Optional[Callable[[MigrationProgress], None]] = None
+    ):
+        """Open (creating or upgrading as needed) the database at ``db_path``.
+
+        Upgrading an older database may take a while for a large index;
+        ``migration_cb`` receives its progress, see photoscanner.migrations.
+        """
         self.db_path = Path(db_path)
+        self._migration_cb = migration_cb
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self._conn = sqlite3.connect(str(self.db_path))
         self._conn.row_factory = sqlite3.Row
@@ -70,19 +201,7 @@ class PhotoDB:
         return groups
 
     def _row_to_record(self, row: sqlite3.Row) -> ImageRecord:
-        return ImageRecord(
-            path=row["path"],
-            sha256=row["sha256"],
-            phash=row["phash"],
-            width=row["width"],
-            height=row["height"],
-            file_size=row["file_size"],
-            mtime_ns=row["mtime_ns"],
-            score=row["score"],
-            embedding=row["embedding"],
-            faces_json=row["faces_json"],
-            objects_json=row["objects_json"],
-        )
+        return _row_to_record(row)
 
     def close(self) -> None:
         self._conn.close()
@@ -96,32 +215,65 @@ class PhotoDB:
             );
             """
         )
+        # Upgrade an existing database before creating what is missing.
+        migrate(self._conn, SCHEMA_VERSION, progress_cb=self._migration_cb)
+        self._conn.execute(_IMAGES_TABLE_SQL.format(table="images"))
         self._conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS images (
+            CREATE TABLE IF NOT EXISTS folders (
+                path TEXT PRIMARY KEY
+            );
+            """
+        )
+        # Directory mtime cache, see PhotoDB.get_dir_cache(). Subdirectories are
+        # stored as a JSON list of names.
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dirs (
                 path TEXT PRIMARY KEY,
-                sha256 TEXT NOT NULL,
-                phash TEXT NOT NULL,
-                width INTEGER NOT NULL,
-                height INTEGER NOT NULL,
-                file_size INTEGER NOT NULL,
                 mtime_ns INTEGER NOT NULL,
-                score REAL NOT NULL,
-                embedding BLOB,
-                faces_json TEXT,
-                objects_json TEXT
+                entry_count INTEGER NOT NULL,
+                subdirs_json TEXT NOT NULL
             );
             """
         )
+        # Single-row table describing the scan in progress, plus the directories
+        # whose files are all committed; see PhotoDB.start_checkpoint().
         self._conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS folders (
+            CREATE TABLE IF NOT EXISTS scan_checkpoint (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                folders_json TEXT NOT NULL,
+                options_json TEXT NOT NULL,
+                options_hash TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scan_checkpoint_dirs (
                 path TEXT PRIMARY KEY
             );
             """
         )
+        # Files that failed to index, with their stat at the time of the failure.
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bad_files (
+                path TEXT PRIMARY KEY,
+                file_size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                error_class TEXT NOT NULL,
+                message TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            );
+            """
+        )
         self._conn.execute("CREATE INDEX IF NOT EXISTS idx_images_sha256 ON images(sha256)")
         self._conn.execute("CREATE INDEX IF NOT EXISTS idx_images_phash ON images(phash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_images_file_size ON images(file_size)")
         self._conn.execute("INSERT OR IGNORE INTO meta(key, value) VALUES('schema_version', ?)", (str(SCHEMA_VERSION),))
         self._conn.commit()
 
@@ -130,6 +282,11 @@ class PhotoDB:
 
     def remove_folder(self, path: str) -> None:
         self._conn.execute("DELETE FROM folders WHERE path=?", (path,))
+        low, high = path_prefix_bounds(path)
+        self._conn.execute(
+            "DELETE FROM dirs WHERE path=? OR (path >= ? AND path < ?)",
+            (str(Path(path)), low, high),
+        )
 
     def get_folders(self) -> list[str]:
         cur = self._conn.execute("SELECT path FROM folders ORDER BY path")
@@ -138,46 +295,362 @@ class PhotoDB:
     def clear_all(self) -> None:
         self._conn.execute("DELETE FROM images")
         self._conn.execute("DELETE FROM folders")
+        self._conn.execute("DELETE FROM dirs")
+        self._conn.execute("DELETE FROM scan_checkpoint")
+        self._conn.execute("DELETE FROM scan_checkpoint_dirs")
+        self._conn.execute("DELETE FROM bad_files")
         self._conn.commit()
 
-    def upsert_image(self, record: ImageRecord) -> None:
-        self._conn.execute(
-            """
-            INSERT INTO images(
-                path, sha256, phash, width, height, file_size, mtime_ns, score,
-                embedding, faces_json, objects_json
+    def get_dir_cache(self, folder: str) -> dict[str, DirCacheEntry]:
+        """Return the cached listing of ``folder`` and every directory below it, keyed by path."""
+        low, high = path_prefix_bounds(folder)
+        cur = self._conn.execute(
+            "SELECT path, mtime_ns, entry_count, subdirs_json FROM dirs"
+            " WHERE path=? OR (path >= ? AND path < ?)",
+            (str(Path(folder)), low, high),
+        )
+        return {
+            row["path"]: DirCacheEntry(
+                path=row["path"],
+                mtime_ns=int(row["mtime_ns"]),
+                entry_count=int(row["entry_count"]),
+                subdirs=tuple(
+                    os.path.join(row["path"], name) for name in json.loads(row["subdirs_json"])
+                ),
             )
-            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            for row in cur
+        }
+
+    def upsert_dirs(self, entries: Iterable[DirCacheEntry]) -> None:
+        """Store directory listings. Not committed here: like checkpoint dirs,
+        they must only become durable together with the rows of their files."""
+        self._conn.executemany(
+            """
+            INSERT INTO dirs(path, mtime_ns, entry_count, subdirs_json) VALUES(?, ?, ?, ?)
             ON CONFLICT(path) DO UPDATE SET
-                sha256=excluded.sha256,
-                phash=excluded.phash,
-                width=excluded.width,
-                height=excluded.height,
-                file_size=excluded.file_size,
                 mtime_ns=excluded.mtime_ns,
-                score=excluded.score,
-                embedding=excluded.embedding,
-                faces_json=excluded.faces_json,
-                objects_json=excluded.objects_json
+                entry_count=excluded.entry_count,
+                subdirs_json=excluded.subdirs_json
+            """,
+            [
+                (
+                    e.path,
+                    e.mtime_ns,
+                    e.entry_count,
+                    dumps_json([os.path.basename(d) for d in e.subdirs]),
+                )
+                for e in entries
+            ],
+        )
+
+    def delete_dirs(self, paths: Iterable[str]) -> None:
+        self._conn.executemany("DELETE FROM dirs WHERE path=?", [(p,) for p in paths])
+
+    def get_checkpoint(self) -> Optional[ScanCheckpoint]:
+        row = self._conn.execute(
+            "SELECT folders_json, options_json, options_hash, started_at, updated_at"
+            " FROM scan_checkpoint WHERE id=1"
+        ).fetchone()
+        if not row:
+            return None
+        n = self._conn.execute("SELECT COUNT(*) FROM scan_checkpoint_dirs").fetchone()[0]
+        return ScanCheckpoint(
+            folders=json.loads(row["folders_json"]),
+            options_json=row["options_json"],
+            options_hash=row["options_hash"],
+            started_at=float(row["started_at"]),
+            updated_at=float(row["updated_at"]),
+            completed_dirs=int(n),
+        )
+
+    def start_checkpoint(self, folders: list[str], options_json: str, options_hash: str) -> None:
+        """Record a new scan in progress, discarding any previous checkpoint."""
+        now = time.time()
+        self._conn.execute("DELETE FROM scan_checkpoint_dirs")
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO scan_checkpoint(
+                id, folders_json, options_json, options_hash, started_at, updated_at
+            )
+            VALUES(1, ?, ?, ?, ?, ?)
             """,
-            (
-                record.path,
-                record.sha256,
-                record.phash,
-                record.width,
-                record.height,
-                record.file_size,
-                record.mtime_ns,
-                record.score,
-                record.embedding,
-                record.faces_json,
-                record.objects_json,
-            ),
+            (dumps_json(folders), options_json, options_hash, now, now),
         )
+        self._conn.commit()
+
+    def add_checkpoint_dirs(self, paths: Iterable[str]) -> None:
+        """Mark directories as done. Not committed here: the caller commits them
+        together with (or after) the image rows they cover."""
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO scan_checkpoint_dirs(path) VALUES(?)", [(p,) for p in paths]
+        )
+        self._conn.execute("UPDATE scan_checkpoint SET updated_at=? WHERE id=1", (time.time(),))
+
+    def get_checkpoint_dirs(self) -> set[str]:
+        return {row[0] for row in self._conn.execute("SELECT path FROM scan_checkpoint_dirs")}
+
+    def clear_checkpoint(self) -> None:
+        self._conn.execute("DELETE FROM scan_checkpoint")
+        self._conn.execute("DELETE FROM scan_checkpoint_dirs")
+        self._conn.commit()
+
+    def upsert_image(self, record: ImageRecord) -> None:
+        self._conn.execute(_UPSERT_IMAGE_SQL, _image_params(record))
+        self._conn.execute("DELETE FROM bad_files WHERE path=?", (record.path,))
+
+    def upsert_images(self, records: Iterable[ImageRecord], hashes_only: bool = False) -> None:
+        """Write a batch of records with one executemany() in a single transaction.
+
+        ``hashes_only`` is for records of an exact-only scan, which carry no
+        decoded features: rows whose size and mtime still match only take
+        their digests, and keep dimensions, hashes and AI results.
+        """
+        records = list(records)
+        sql = _UPSERT_HASHES_SQL if hashes_only else _UPSERT_IMAGE_SQL
+        self._conn.executemany(sql, [_image_params(r) for r in records])
+        # A file that indexes fine is no longer bad.
+        self._conn.executemany("DELETE FROM bad_files WHERE path=?", [(r.path,) for r in records])
+        self._conn.commit()
+
+    def add_bad_files(self, records: Iterable[BadFile]) -> None:
+        """Record failed files. Not committed here: the scan's writer commits
+        them with its next batch."""
+        now = time.time()
+        self._conn.executemany(
+            """
+            INSERT OR REPLACE INTO bad_files(
+                path, file_size, mtime_ns, error_class, message, failed_at
+            )
+            VALUES(?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (b.path, b.file_size, b.mtime_ns, b.error_class, b.message, b.failed_at or now)
+                for b in records
+            ],
+        )
+
+    def get_bad_files(self, folder: Optional[str] = None) -> dict[str, BadFile]:
+        """Return the failed files below ``folder`` (all of them if None), keyed by path."""
+        sql = "SELECT path, file_size, mtime_ns, error_class, message, failed_at FROM bad_files"
+        if folder is None:
+            cur = self._conn.execute(sql + " ORDER BY path")
+        else:
+            low, high = path_prefix_bounds(folder)
+            cur = self._conn.execute(
+                sql + " WHERE path >= ? AND path < ? ORDER BY path", (low, high)
+            )
+        return {row["path"]: _row_to_bad_file(row) for row in cur}
+
+    def get_bad_file(self, path: str) -> Optional[BadFile]:
+        row = self._conn.execute(
+            "SELECT path, file_size, mtime_ns, error_class, message, failed_at"
+            " FROM bad_files WHERE path=?",
+            (path,),
+        ).fetchone()
+        return _row_to_bad_file(row) if row else None
+
+    def delete_bad_files(self, paths: Iterable[str]) -> int:
+        cur = self._conn.executemany("DELETE FROM bad_files WHERE path=?", [(p,) for p in paths])
+        return cur.rowcount
+
+    @contextmanager
+    def ingest_pragmas(self) -> Iterator[None]:
+        """Apply bulk-ingest pragmas (see INGEST_PRAGMAS), restoring the previous values after.
+
+        synchronous=NORMAL is safe with WAL: a power loss can roll back the
+        last commits but never corrupts the database.
+        """
+        previous = {
+            name: self._conn.execute(f"PRAGMA {name}").fetchone()[0] for name in INGEST_PRAGMAS
+        }
+        for name, value in INGEST_PRAGMAS.items():
+            self._conn.execute(f"PRAGMA {name}={value}")
+        try:
+            yield
+        finally:
+            for name, value in previous.items():
+                self._conn.execute(f"PRAGMA {name}={value}")
 
     def delete_image(self, path: str) -> None:
         self._conn.execute("DELETE FROM images WHERE path=?", (path,))
 
+    def delete_images_below(self, folder: str) -> int:
+        """Delete every image indexed below ``folder``; returns the number of rows removed."""
+        low, high = path_prefix_bounds(folder)
+        cur = self._conn.execute("DELETE FROM images WHERE path >= ? AND path < ?", (low, high))
+        return cur.rowcount
+
+    def rename_image(self, old_path: str, new_path: str) -> bool:
+        """Move a row to ``new_path``, replacing any row already there. A bad
+        file record of ``old_path`` is dropped.
+
+        Returns False if nothing was indexed at ``old_path``.
+        """
+        if old_path == new_path:
+            return False
+        if self._conn.execute("SELECT 1 FROM images WHERE path=?", (old_path,)).fetchone() is None:
+            return False
+        self._conn.execute("DELETE FROM images WHERE path=?", (new_path,))
+        self._conn.execute("UPDATE images SET path=? WHERE path=?", (new_path, old_path))
+        self._conn.execute("DELETE FROM bad_files WHERE path=?", (old_path,))
+        return True
+
+    def rename_images_below(self, old_folder: str, new_folder: str) -> int:
+        """Re-root every row below ``old_folder`` under ``new_folder`` (a moved
+        directory). Bad file records below ``old_folder`` are dropped."""
+        low, high = path_prefix_bounds(old_folder)
+        new_prefix, _ = path_prefix_bounds(new_folder)
+        params = (new_prefix, len(low) + 1, low, high)
+        # Rows already at the destination would collide on the primary key.
+        self._conn.execute(
+            """
+            DELETE FROM images WHERE path IN (
+                SELECT ? || substr(path, ?) FROM images WHERE path >= ? AND path < ?
+            )
+            """,
+            params,
+        )
+        cur = self._conn.execute(
+            "UPDATE images SET path = ? || substr(path, ?) WHERE path >= ? AND path < ?",
+            params,
+        )
+        self._conn.execute("DELETE FROM bad_files WHERE path >= ? AND path < ?", (low, high))
+        return cur.rowcount
+
+    def merge_shard(
+        self, shard_path: Path, prefix_map: Sequence[tuple[str, str]] = (), replace: bool = False
+    ) -> ShardMergeStats:
+        """Copy the image rows of another database (a shard scanned on another
+        machine) into this one.
+
+        Paths are rewritten with ``prefix_map``, a list of (shard prefix,
+        target prefix) pairs; the longest matching prefix wins and paths that
+        match none are taken as they are. When a path exists on both sides the
+        row with the newer ``mtime_ns`` wins; on a tie the target row is kept
+        unless only the shard's row is decoded. Known bad files and registered
+        folders are merged the same way; directory caches and checkpoints stay
+        with the shard.
+
+        With ``replace=True``, target rows below the shard's (mapped) folders
+        that the shard does not have are deleted, so merging a fresh shard also
+        carries over deletions.
+
+        The shard is attached with ATTACH DATABASE, so rows are copied inside
+        SQLite; it must have the same schema version (opening it with PhotoDB
+        first upgrades it).
+
+        Shards holding rows from an exact-only scan are refused with
+        ValueError: their "partial:" keys are only known to be unique within
+        the shard, and equal keys from two machines would be grouped as
+        byte-identical copies without ever comparing the full SHA-256.
+        """
+        shard_path = Path(shard_path)
+        if shard_path.resolve() == self.db_path.resolve():
+            raise ValueError("cannot merge a database into itself")
+        rules = sorted(
+            ((_sep_prefix(old), _sep_prefix(new)) for old, new in prefix_map),
+            key=lambda r: len(r[0]),
+            reverse=True,
+        )
+        path_sql, path_params = _remap_path_sql("path", rules)
+
+        self._conn.commit()
+        self._conn.execute("ATTACH DATABASE ? AS shard", (str(shard_path),))
+        try:
+            row = self._conn.execute(
+                "SELECT value FROM shard.meta WHERE key='schema_version'"
+            ).fetchone()
+            if row is None or int(row[0]) != SCHEMA_VERSION:
+                raise ValueError(
+                    f"{shard_path} has schema version {row[0] if row else 'unknown'}, "
+                    f"expected {SCHEMA_VERSION}"
+                )
+            # Partial keys are the only 16-byte values (see digest_from_blob()).
+            partial = int(
+                self._conn.execute(
+                    "SELECT COUNT(*) FROM shard.images WHERE length(sha256) = 16"
+                ).fetchone()[0]
+            )
+            if partial:
+                raise ValueError(
+                    f"{shard_path} has {partial} rows from an exact-only scan; "
+                    "scan it again without exact-only before merging"
+                )
+            shard_folders = [
+                _remap_path(r[0], rules)
+                for r in self._conn.execute("SELECT path FROM shard.folders")
+            ]
+            n_images = int(self._conn.execute("SELECT COUNT(*) FROM shard.images").fetchone()[0])
+            before = int(self._conn.execute("SELECT COUNT(*) FROM main.images").fetchone()[0])
+
+            deleted = 0
+            if replace:
+                for folder in shard_folders:
+                    low, high = _prefix_bounds(folder, _path_sep(folder))
+                    cur = self._conn.execute(
+                        f"""
+                        DELETE FROM main.images WHERE path >= ? AND path < ?
+                        AND path NOT IN (SELECT {path_sql} FROM shard.images)
+                        """,
+                        [low, high] + path_params,
+                    )
+                    deleted += cur.rowcount
+                before -= deleted
+
+            changes = self._conn.total_changes
+            columns = ", ".join(_IMAGE_COLUMNS)
+            self._conn.execute(
+                f"""
+                INSERT INTO main.images({columns})
+                SELECT {path_sql}, {", ".join(_IMAGE_COLUMNS[1:])} FROM shard.images WHERE true
+                ON CONFLICT(path) DO UPDATE SET {_IMAGE_UPDATE_SET}
+                WHERE excluded.mtime_ns > images.mtime_ns
+                   OR (excluded.mtime_ns = images.mtime_ns
+                       AND images.phash IS NULL AND excluded.phash IS NOT NULL)
+                """,
+                path_params,
+            )
+            applied = self._conn.total_changes - changes
+            inserted = (
+                int(self._conn.execute("SELECT COUNT(*) FROM main.images").fetchone()[0]) - before
+            )
+
+            cur = self._conn.execute(
+                f"""
+                INSERT INTO main.bad_files(
+                    path, file_size, mtime_ns, error_class, message, failed_at
+                )
+                SELECT {path_sql}, file_size, mtime_ns, error_class, message, failed_at
+                FROM shard.bad_files WHERE true
+                ON CONFLICT(path) DO UPDATE SET
+                    file_size=excluded.file_size,
+                    mtime_ns=excluded.mtime_ns,
+                    error_class=excluded.error_class,
+                    message=excluded.message,
+                    failed_at=excluded.failed_at
+                WHERE excluded.mtime_ns > bad_files.mtime_ns
+                """,
+                path_params,
+            )
+            bad_files = cur.rowcount
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO main.folders(path) VALUES(?)", [(f,) for f in shard_folders]
+            )
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            raise
+        finally:
+            self._conn.execute("DETACH DATABASE shard")
+        return ShardMergeStats(
+            images=n_images,
+            inserted=inserted,
+            updated=applied - inserted,
+            kept=n_images - applied,
+            deleted=deleted,
+            bad_files=bad_files,
+        )
+
     def update_image_objects(self, path: str, objects_json: str) -> None:
         self._conn.execute("UPDATE images SET objects_json=? WHERE path=?", (objects_json, path))
         self._conn.commit()
@@ -186,7 +659,8 @@ class PhotoDB:
         cur = self._conn.execute(
             """
             SELECT path, sha256, phash, width, height, file_size, mtime_ns, score,
-                   embedding, faces_json, objects_json
+                   embedding, faces_json, objects_json, dhash, ahash, whash, chash, rhash,
+                   from_preview, partial_hash
             FROM images
             WHERE path=?
             """,
@@ -195,19 +669,7 @@ class PhotoDB:
         row = cur.fetchone()
         if not row:
             return None
-        return ImageRecord(
-            path=row["path"],
-            sha256=row["sha256"],
-            phash=row["phash"],
-            width=int(row["width"]),
-            height=int(row["height"]),
-            file_size=int(row["file_size"]),
-            mtime_ns=int(row["mtime_ns"]),
-            score=float(row["score"]),
-            embedding=row["embedding"],
-            faces_json=row["faces_json"],
-            objects_json=row["objects_json"],
-        )
+        return self._row_to_record(row)
 
     def commit(self) -> None:
         self._conn.commit()
@@ -216,58 +678,451 @@ class PhotoDB:
         cur = self._conn.execute(
             """
             SELECT path, sha256, phash, width, height, file_size, mtime_ns, score,
-                   embedding, faces_json, objects_json
+                   embedding, faces_json, objects_json, dhash, ahash, whash, chash, rhash,
+                   from_preview, partial_hash
             FROM images
             ORDER BY path
             """
         )
         for row in cur:
-            yield ImageRecord(
-                path=row["path"],
-                sha256=row["sha256"],
-                phash=row["phash"],
-                width=int(row["width"]),
-                height=int(row["height"]),
-                file_size=int(row["file_size"]),
-                mtime_ns=int(row["mtime_ns"]),
-                score=float(row["score"]),
-                embedding=row["embedding"],
-                faces_json=row["faces_json"],
-                objects_json=row["objects_json"],
+            yield self._row_to_record(row)
+
+    def iter_image_paths(self) -> Iterable[str]:
+        for row in self._conn.execute("SELECT path FROM images ORDER BY path"):
+            yield row["path"]
+
+    def get_phash_rows(self) -> list[tuple[str, int, int, bool]]:
+        """``(path, phash, rhash, from_preview)`` of every decoded row, for
+        comparisons that need nothing else.
+
+        The hashes are the stored signed 64-bit values (view them as uint64);
+        rows without a rotation-invariant hash repeat their pHash.
+        """
+        cur = self._conn.execute(
+            """
+            SELECT path, phash, COALESCE(rhash, phash), from_preview
+            FROM images
+            WHERE phash IS NOT NULL
+            """
+        )
+        return [
+            (path, phash, rhash, bool(from_preview)) for path, phash, rhash, from_preview in cur
+        ]
+
+    def get_indexed_files(self, folder: str) -> dict[str, IndexedFile]:
+        """Return the stat snapshot of every image indexed below ``folder``, keyed by path."""
+        low, high = path_prefix_bounds(folder)
+        cur = self._conn.execute(_INDEXED_FILE_SQL + " WHERE path >= ? AND path < ?", (low, high))
+        return {row["path"]: _row_to_indexed_file(row) for row in cur}
+
+    def get_indexed_file(self, path: str) -> Optional[IndexedFile]:
+        row = self._conn.execute(_INDEXED_FILE_SQL + " WHERE path = ?", (path,)).fetchone()
+        return _row_to_indexed_file(row) if row else None
+
+    def get_sha256_by_file_size(self, sizes: Iterable[int]) -> dict[int, list[tuple[str, str]]]:
+        """Return ``{file_size: [(path, sha256), ...]}`` for indexed images of the given sizes."""
+        sizes = list(sizes)
+        out: dict[int, list[tuple[str, str]]] = {}
+        # Stay well below SQLite's host parameter limit.
+        for i in range(0, len(sizes), 500):
+            chunk = sizes[i : i + 500]
+            marks = ",".join("?" * len(chunk))
+            cur = self._conn.execute(
+                f"SELECT path, sha256, file_size FROM images WHERE file_size IN ({marks})", chunk
             )
+            for row in cur:
+                out.setdefault(int(row["file_size"]), []).append(
+                    (row["path"], digest_from_blob(row["sha256"]))
+                )
+        return out
+
+    def update_image_sha256(self, path: str, sha256: str) -> None:
+        self._conn.execute(
+            "UPDATE images SET sha256=? WHERE path=?", (digest_to_blob(sha256), path)
+        )
 
     def get_images_by_sha256(self, sha256: str) -> list[ImageRecord]:
         cur = self._conn.execute(
             """
             SELECT path, sha256, phash, width, height, file_size, mtime_ns, score,
-                   embedding, faces_json, objects_json
+                   embedding, faces_json, objects_json, dhash, ahash, whash, chash, rhash,
+                   from_preview, partial_hash
             FROM images
             WHERE sha256=?
             ORDER BY score DESC
             """,
-            (sha256,),
+            (digest_to_blob(sha256),),
         )
-        return [
-            ImageRecord(
-                path=row["path"],
-                sha256=row["sha256"],
-                phash=row["phash"],
-                width=int(row["width"]),
-                height=int(row["height"]),
-                file_size=int(row["file_size"]),
-                mtime_ns=int(row["mtime_ns"]),
-                score=float(row["score"]),
-                embedding=row["embedding"],
-                faces_json=row["faces_json"],
-                objects_json=row["objects_json"],
-            )
-            for row in cur
-        ]
+        return [self._row_to_record(row) for row in cur]
 
     def stats(self) -> dict[str, Any]:
-        cur = self._conn.execute("SELECT COUNT(*) AS n FROM images")
-        n = int(cur.fetchone()["n"])
-        return {"images": n}
+        row = self._conn.execute(
+            """
+            SELECT COUNT(*) AS images,
+                   COALESCE(SUM(phash IS NOT NULL), 0) AS decoded,
+                   COALESCE(SUM(embedding IS NOT NULL), 0) AS with_embedding,
+                   COALESCE(SUM(faces_json IS NOT NULL), 0) AS with_faces,
+                   COALESCE(SUM(objects_json IS NOT NULL), 0) AS with_objects,
+                   COALESCE(SUM(from_preview), 0) AS from_preview,
+                   COALESCE(SUM(file_size), 0) AS total_bytes
+            FROM images
+            """
+        ).fetchone()
+        out = {k: int(row[k]) for k in row.keys()}
+        out["folders"] = int(self._conn.execute("SELECT COUNT(*) FROM folders").fetchone()[0])
+        out["bad_files"] = int(self._conn.execute("SELECT COUNT(*) FROM bad_files").fetchone()[0])
+        out["schema_version"] = int(
+            self._conn.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone()[0]
+        )
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        out["db_bytes"] = int(page_count) * int(page_size)
+        return out
+
+
+class ContentIndex:
+    """Finds indexed rows by SHA-256 from any thread.
+
+    Scan stages run on their own threads while the scan's thread writes
+    through PhotoDB; every thread here gets its own read-only connection, which
+    WAL lets read alongside the writer. Rows become visible as the writer
+    commits them.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self._uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: list[sqlite3.Connection] = []
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def find(self, sha256: str, path: str, allow_preview: bool = False) -> Optional[ImageRecord]:
+        """A decoded row with this content under another path than ``path``,
+        preferring the one with the most AI results; rows hashed from an EXIF
+        thumbnail only if ``allow_preview``.
+
+        The file's own row is never returned: a full rescan is there to
+        recompute it."""
+        row = self._conn().execute(
+            f"""
+            SELECT {", ".join(_IMAGE_COLUMNS)} FROM images
+            WHERE sha256=? AND path != ?
+              AND phash IS NOT NULL AND rhash IS NOT NULL AND (? OR from_preview = 0)
+            ORDER BY
+                (embedding IS NOT NULL) + (faces_json IS NOT NULL) + (objects_json IS NOT NULL) DESC
+            LIMIT 1
+            """,
+            (digest_to_blob(sha256), path, int(allow_preview)),
+        ).fetchone()
+        return _row_to_record(row) if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+
+
+class ImageWriter:
+    """Buffers ImageRecords and writes them to PhotoDB in batches.
+
+    A batch is flushed once it holds ``commit_size`` records or
+    ``commit_interval`` seconds have passed since the last flush, whichever
+    comes first. Use as a context manager to apply the ingest pragmas and flush
+    the remainder on exit.
+    """
+
+    def __init__(
+        self,
+        db: PhotoDB,
+        commit_size: int = 500,
+        commit_interval: float = 2.0,
+        hashes_only: bool = False,
+    ) -> None:
+        self._db = db
+        # See PhotoDB.upsert_images().
+        self._hashes_only = hashes_only
+        self._commit_size = max(1, commit_size)
+        self._commit_interval = commit_interval
+        self._pending: list[ImageRecord] = []
+        self._last_flush = time.monotonic()
+        self._pragmas = None
+
+    def __enter__(self) -> "ImageWriter":
+        self._pragmas = self._db.ingest_pragmas()
+        self._pragmas.__enter__()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        try:
+            self.flush()
+        finally:
+            self._pragmas.__exit__(*exc)
+
+    def add(self, record: ImageRecord) -> None:
+        self._pending.append(record)
+        if (
+            len(self._pending) >= self._commit_size
+            or time.monotonic() - self._last_flush >= self._commit_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self._db.upsert_images(self._pending, hashes_only=self._hashes_only)
+            self._pending = []
+        else:
+            self._db.commit()
+        self._last_flush = time.monotonic()
+
+
+# Current layout of the images table; see SCHEMA_VERSION. Changing it takes a
+# migration (photoscanner.migrations) for existing databases.
+_IMAGES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        path TEXT PRIMARY KEY,
+        sha256 BLOB NOT NULL,
+        phash INTEGER,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        file_size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        score REAL NOT NULL,
+        embedding BLOB,
+        faces_json TEXT,
+        objects_json TEXT,
+        dhash INTEGER,
+        ahash INTEGER,
+        whash INTEGER,
+        chash INTEGER,
+        rhash INTEGER,
+        from_preview INTEGER NOT NULL DEFAULT 0,
+        partial_hash BLOB
+    );
+"""
+
+_IMAGE_COLUMNS = (
+    "path",
+    "sha256",
+    "phash",
+    "width",
+    "height",
+    "file_size",
+    "mtime_ns",
+    "score",
+    "embedding",
+    "faces_json",
+    "objects_json",
+    "dhash",
+    "ahash",
+    "whash",
+    "chash",
+    "rhash",
+    "from_preview",
+    "partial_hash",
+)
+
+_IMAGE_UPDATE_SET = ", ".join(f"{c}=excluded.{c}" for c in _IMAGE_COLUMNS[1:])
+
+_UPSERT_IMAGE_SQL = f"""
+    INSERT INTO images({", ".join(_IMAGE_COLUMNS)})
+    VALUES({", ".join("?" * len(_IMAGE_COLUMNS))})
+    ON CONFLICT(path) DO UPDATE SET {_IMAGE_UPDATE_SET}
+"""
+
+_ROW_CHANGED = "(excluded.file_size != images.file_size OR excluded.mtime_ns != images.mtime_ns)"
+
+
+def _hashes_only_update(column: str) -> str:
+    kept = f"images.{column}"
+    if column == "sha256":
+        # A unique partial key must not replace a full digest (32 bytes).
+        changed = f"{_ROW_CHANGED} OR length(excluded.{column}) = 32"
+        return f"{column}=CASE WHEN {changed} THEN excluded.{column} ELSE {kept} END"
+    if column == "partial_hash":
+        kept = f"COALESCE(excluded.{column}, {kept})"
+    return f"{column}=CASE WHEN {_ROW_CHANGED} THEN excluded.{column} ELSE {kept} END"
+
+
+# Upsert of exact-only records, see PhotoDB.upsert_images(): a changed file is
+# rewritten in full (its old features are stale), an unchanged one only gets
+# its digests.
+_UPSERT_HASHES_SQL = f"""
+    INSERT INTO images({", ".join(_IMAGE_COLUMNS)})
+    VALUES({", ".join("?" * len(_IMAGE_COLUMNS))})
+    ON CONFLICT(path) DO UPDATE SET {", ".join(map(_hashes_only_update, _IMAGE_COLUMNS[1:]))}
+"""
+
+
+_INDEXED_FILE_SQL = """
+    SELECT path, file_size, mtime_ns,
+           embedding IS NOT NULL AS has_embedding,
+           faces_json IS NOT NULL AS has_faces,
+           objects_json IS NOT NULL AS has_objects,
+           phash IS NOT NULL AND rhash IS NOT NULL AS decoded,
+           from_preview
+    FROM images
+"""
+
+
+def _row_to_indexed_file(row: sqlite3.Row) -> IndexedFile:
+    return IndexedFile(
+        path=row["path"],
+        file_size=int(row["file_size"]),
+        mtime_ns=int(row["mtime_ns"]),
+        has_embedding=bool(row["has_embedding"]),
+        has_faces=bool(row["has_faces"]),
+        has_objects=bool(row["has_objects"]),
+        decoded=bool(row["decoded"]),
+        from_preview=bool(row["from_preview"]),
+    )
+
+
+def _row_to_record(row: sqlite3.Row) -> ImageRecord:
+    partial = row["partial_hash"]
+    return ImageRecord(
+        path=row["path"],
+        sha256=digest_from_blob(row["sha256"]),
+        phash=phash_from_db(row["phash"]),
+        width=int(row["width"]),
+        height=int(row["height"]),
+        file_size=int(row["file_size"]),
+        mtime_ns=int(row["mtime_ns"]),
+        score=float(row["score"]),
+        embedding=row["embedding"],
+        faces_json=row["faces_json"],
+        objects_json=row["objects_json"],
+        dhash=from_signed64(row["dhash"]),
+        ahash=from_signed64(row["ahash"]),
+        whash=from_signed64(row["whash"]),
+        chash=from_signed64(row["chash"]),
+        rhash=from_signed64(row["rhash"]),
+        from_preview=bool(row["from_preview"]),
+        partial_hash=digest_from_blob(partial) if partial is not None else None,
+        phash_int=from_signed64(row["phash"]),
+    )
+
+
+def _path_sep(prefix: str) -> str:
+    """Separator of a path that may come from another OS (a shard's paths)."""
+    return "\\" if "\\" in prefix and "/" not in prefix else "/"
+
+
+def _sep_prefix(prefix: str) -> str:
+    sep = _path_sep(prefix)
+    return prefix.rstrip(sep) + sep
+
+
+def _prefix_bounds(prefix: str, sep: str) -> tuple[str, str]:
+    """path_prefix_bounds() for a path in ``sep`` notation rather than the local one."""
+    prefix = prefix.rstrip(sep) + sep
+    return prefix, prefix[:-1] + chr(ord(sep) + 1)
+
+
+def _remap_path(path: str, rules: Sequence[tuple[str, str]]) -> str:
+    """Python twin of _remap_path_sql(), for the few paths mapped outside SQL."""
+    for old, new in rules:
+        sep, new_sep = _path_sep(old), _path_sep(new)
+        if path + sep == old:
+            return new.rstrip(new_sep) or new
+        if path.startswith(old):
+            return new + path[len(old) :].replace(sep, new_sep)
+    return path
+
+
+def _remap_path_sql(column: str, rules: Sequence[tuple[str, str]]) -> tuple[str, list]:
+    """SQL expression rewriting ``column`` with (old prefix, new prefix) rules,
+    first match wins; the separator is converted when the prefixes differ."""
+    if not rules:
+        return column, []
+    sql = "CASE"
+    params: list = []
+    for old, new in rules:
+        low, high = _prefix_bounds(old, _path_sep(old))
+        rest = f"substr({column}, {len(old) + 1})"
+        if _path_sep(old) != _path_sep(new):
+            rest = f"replace({rest}, ?, ?)"
+            params_rest = [_path_sep(old), _path_sep(new)]
+        else:
+            params_rest = []
+        sql += f" WHEN {column} >= ? AND {column} < ? THEN ? || {rest}"
+        params += [low, high, new] + params_rest
+    return sql + f" ELSE {column} END", params
+
+
+def _row_to_bad_file(row: sqlite3.Row) -> BadFile:
+    return BadFile(
+        path=row["path"],
+        file_size=int(row["file_size"]),
+        mtime_ns=int(row["mtime_ns"]),
+        error_class=row["error_class"],
+        message=row["message"],
+        failed_at=float(row["failed_at"]),
+    )
+
+
+def _image_params(record: ImageRecord) -> tuple:
+    return (
+        record.path,
+        digest_to_blob(record.sha256),
+        to_signed64(record.phash_int),
+        record.width,
+        record.height,
+        record.file_size,
+        record.mtime_ns,
+        record.score,
+        record.embedding,
+        record.faces_json,
+        record.objects_json,
+        to_signed64(record.dhash),
+        to_signed64(record.ahash),
+        to_signed64(record.whash),
+        to_signed64(record.chash),
+        to_signed64(record.rhash),
+        int(record.from_preview),
+        digest_to_blob(record.partial_hash) if record.partial_hash is not None else None,
+    )
+
+
+def to_signed64(value: Optional[int]) -> Optional[int]:
+    """Map an unsigned 64-bit hash onto SQLite's signed INTEGER range."""
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_signed64(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+
+def phash_from_db(value: Optional[int]) -> str:
+    """Hex form of a stored pHash (ImageRecord.phash); "" for NULL."""
+    return "" if value is None else f"{from_signed64(value):016x}"
+
+
+def digest_to_blob(value: str) -> bytes:
+    """Stored form of a hex SHA-256 digest or a "partial:" key."""
+    if value.startswith(PARTIAL_HASH_PREFIX):
+        return bytes.fromhex(value[len(PARTIAL_HASH_PREFIX) :])
+    return bytes.fromhex(value)
+
+
+def digest_from_blob(value: bytes) -> str:
+    # Partial keys are the only 16-byte values.
+    if len(value) == 16:
+        return PARTIAL_HASH_PREFIX + value.hex()
+    return value.hex()
 
 
 def dumps_json(value: Any) -> str:
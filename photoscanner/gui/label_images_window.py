@@ -1068,13 +1068,13 @@ class LabelImagesWindow(QWidget):
         if not record:
             # Auto-add logic (simplified)
             from photoscanner.scanner import sha256_file
-            import imagehash
+            from photoscanner.hashing import phash_image, phash_to_hex
             from PIL import Image
             
             s256 = sha256_file(self._current_image)
             try:
                 with Image.open(self._current_image) as img:
-                    ph = str(imagehash.phash(img))
+                    ph = phash_to_hex(phash_image(img))
                     w, h = img.size
             except:
                 ph = "0" * 16
@@ -10,10 +10,11 @@ from PySide6.QtWidgets import (
     QMessageBox,
 )
 
-from photoscanner.gui.label_images_window import LabelImagesWindow
-from photoscanner.gui.scanner_window import ScannerWindow
 from photoscanner.gui.settings_dialog import SettingsDialog
 
+# The tool windows (and the scanner/AI modules behind them) are imported when
+# first opened, so the main window shows up without waiting for them.
+
 
 class MainWindow(QMainWindow):
     def __init__(self) -> None:
@@ -81,6 +82,8 @@ class MainWindow(QMainWindow):
     def _open_scanner(self) -> None:
         # Check if already open? MDI allows multiples usually.
         # But maybe we want check
+        from photoscanner.gui.scanner_window import ScannerWindow
+
         w = ScannerWindow()
         sub = self._mdi_area.addSubWindow(w)
         sub.resize(w.size())
@@ -89,6 +92,9 @@ class MainWindow(QMainWindow):
 
     def _open_label_images(self) -> None:
         try:
+            from photoscanner.gui.label_images_window import LabelImagesWindow
+            from photoscanner.gui.scanner_window import ScannerWindow
+
             # Pause scanner if running
             scanner_win = None
             for sub in self._mdi_area.subWindowList():
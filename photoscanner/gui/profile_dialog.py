@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QApplication,
+    QDialog,
+    QDialogButtonBox,
+    QLabel,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+)
+
+from photoscanner.profiling import PROFILE_COLUMNS, profile_rows
+
+
+class ScanProfileDialog(QDialog):
+    """Shows the per-stage timing report of a profiled scan."""
+
+    def __init__(self, report: dict, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Scan Profile")
+        self.resize(900, 400)
+        self._report = report
+
+        rows = profile_rows(report)
+        table = QTableWidget(len(rows), len(PROFILE_COLUMNS))
+        table.setHorizontalHeaderLabels(list(PROFILE_COLUMNS))
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                item = QTableWidgetItem(value)
+                if j > 0:
+                    item.setTextAlignment(
+                        Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+                    )
+                table.setItem(i, j, item)
+        table.resizeColumnsToContents()
+
+        summary = QLabel(
+            f"Total {report['wall_seconds']:.2f} s wall, "
+            f"{report['cpu_seconds']:.2f} s CPU in the main process. "
+            "Stage CPU time is per thread; stages run concurrently, "
+            "so stage totals can exceed the wall time."
+        )
+        summary.setWordWrap(True)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        copy_btn = QPushButton("Copy JSON")
+        buttons.addButton(copy_btn, QDialogButtonBox.ButtonRole.ActionRole)
+        copy_btn.clicked.connect(self._copy_json)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout()
+        layout.addWidget(table)
+        layout.addWidget(summary)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def _copy_json(self) -> None:
+        QApplication.clipboard().setText(json.dumps(self._report, indent=2))
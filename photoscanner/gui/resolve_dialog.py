@@ -20,9 +20,25 @@ from PySide6.QtWidgets import (
 )
 
 from photoscanner.db import PhotoDB
+from photoscanner.previews import is_raw_path, raw_preview
 from photoscanner.utils import get_image_metadata, merge_image_metadata
 
 
+def _load_pixmap(path: str) -> QPixmap:
+    """Load an image; RAW files are shown via their embedded JPEG preview."""
+    if not is_raw_path(path):
+        return QPixmap(path)
+    pix = QPixmap()
+    try:
+        with open(path, "rb") as f:
+            preview = raw_preview(f.read())
+    except OSError:
+        preview = None
+    if preview is not None:
+        pix.loadFromData(preview.data)
+    return pix
+
+
 class ImageItem(QFrame):
     selected = Signal(str)
 
@@ -46,7 +62,7 @@ class ImageItem(QFrame):
         # Load thumbnail and get dims
         dims_text = "Unknown size"
         if os.path.exists(self.path):
-            pix = QPixmap(self.path)
+            pix = _load_pixmap(self.path)
             if not pix.isNull():
                 dims_text = f"{pix.width()} x {pix.height()}"
                 pix = pix.scaled(
@@ -483,13 +499,13 @@ class ResolveDuplicatesDialog(QDialog):
         # "If one of the images has a higher resolution, then it cannot be deleted."
         try:
             # Get dimensions of the kept image
-            sel_pix = QPixmap(self._selected_path)
+            sel_pix = _load_pixmap(self._selected_path)
             sel_area = sel_pix.width() * sel_pix.height()
             
             for p in to_delete:
                  if not os.path.exists(p): 
                      continue
-                 cand_pix = QPixmap(p)
+                 cand_pix = _load_pixmap(p)
                  cand_area = cand_pix.width() * cand_pix.height()
                  
                  # Using a small buffer for "strictly higher" effectively
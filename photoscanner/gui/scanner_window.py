@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import dataclasses
+import os
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -23,14 +25,19 @@ from PySide6.QtWidgets import (
 
 from photoscanner.ai import Detector, EmbeddingModel, get_ai_availability
 from photoscanner.db import PhotoDB
+from photoscanner.gui.profile_dialog import ScanProfileDialog
 from photoscanner.gui.settings_dialog import SettingsDialog
 from photoscanner.gui.resolve_dialog import ResolveDuplicatesDialog
+from photoscanner.progress import ScanProgress, format_eta
 from photoscanner.scanner import (
     ScanOptions,
+    ScanResult,
+    options_from_json,
     group_duplicates_by_phash,
     group_duplicates_by_sha256,
     scan_folders,
 )
+from photoscanner.watch import FolderWatcher
 
 
 @dataclass(frozen=True)
@@ -44,17 +51,26 @@ class DuplicateRow:
 import threading
 
 class ScanWorker(QObject):
-    progress = Signal(int, int, int, str)
-    finished = Signal(int, int, int)
+    progress = Signal(object)  # ScanProgress, at most 10 times a second
+    finished = Signal(object)  # ScanResult
     error = Signal(str)
 
-    def __init__(self, db_path: Path, folders: list[Path], options: ScanOptions, device: str, running_event: threading.Event):
+    def __init__(
+        self,
+        db_path: Path,
+        folders: list[Path],
+        options: ScanOptions,
+        device: str,
+        running_event: threading.Event,
+        resume: bool = False,
+    ):
         super().__init__()
         self._db_path = db_path
         self._folders = folders
         self._options = options
         self._device = device
         self._running_event = running_event
+        self._resume = resume
 
     def run(self) -> None:
         try:
@@ -67,22 +83,66 @@ class ScanWorker(QObject):
             if self._options.detect_faces or self._options.detect_objects:
                 detector = Detector()
 
-            def cb(scanned: int, indexed: int, skipped: int, path: str) -> None:
-                self.progress.emit(scanned, indexed, skipped, path)
-
             res = scan_folders(
                 db,
                 folders=self._folders,
                 options=self._options,
                 embedding_model=embedding_model,
                 detector=detector,
-                progress_cb=cb,
+                progress_cb=self.progress.emit,
+                running_event=self._running_event,
+                resume=self._resume,
+            )
+            db.close()
+            self.finished.emit(res)
+        except Exception as e:
+            self.error.emit(str(e))
+
+
+class WatchWorker(QObject):
+    batch = Signal(object)  # ScanResult of one applied event batch
+    finished = Signal()
+    error = Signal(str)
+
+    def __init__(
+        self,
+        db_path: Path,
+        options: ScanOptions,
+        device: str,
+        running_event: threading.Event,
+        stop_event: threading.Event,
+    ):
+        super().__init__()
+        self._db_path = db_path
+        self._options = options
+        self._device = device
+        self._running_event = running_event
+        self._stop_event = stop_event
+
+    def run(self) -> None:
+        try:
+            db = PhotoDB(self._db_path)
+            embedding_model = None
+            detector = None
+
+            if self._options.compute_embeddings:
+                embedding_model = EmbeddingModel(device=self._device)
+            if self._options.detect_faces or self._options.detect_objects:
+                detector = Detector()
+
+            watcher = FolderWatcher(
+                db,
+                self._options,
+                embedding_model=embedding_model,
+                detector=detector,
+                batch_cb=self.batch.emit,
                 running_event=self._running_event,
             )
+            watcher.run(self._stop_event)
             db.close()
-            self.finished.emit(res.scanned, res.indexed, res.skipped)
         except Exception as e:
             self.error.emit(str(e))
+        self.finished.emit()
 
 
 class ScannerWindow(QWidget):
@@ -106,18 +166,69 @@ class ScannerWindow(QWidget):
         self._clear_db_btn = QPushButton("Clear Database")
         self._settings_btn = QPushButton("Settings")
         self._scan_btn = QPushButton("Scan")
+        self._resume_btn = QPushButton("Resume last scan")
+        self._resume_btn.setVisible(False)
+        self._watch_btn = QPushButton("Watch folders")
+        self._watch_btn.setCheckable(True)
+        self._watch_btn.setToolTip(
+            "Keep the index up to date as files are added, changed, moved or deleted"
+        )
         self._resolve_btn = QPushButton("Resolve All")
         self._resolve_btn.setStyleSheet("background-color: #0078d4; color: white; font-weight: bold;")
 
         self._emb_cb = QCheckBox("Compute embeddings (optional)")
         self._faces_cb = QCheckBox("Face detection (optional)")
         self._objects_cb = QCheckBox("Object detection (optional)")
+        self._incremental_cb = QCheckBox("Skip unchanged files")
+        self._incremental_cb.setChecked(True)
+        self._incremental_cb.setToolTip(
+            "Only re-process files that are new or whose size/modification time changed"
+        )
+        self._deep_cb = QCheckBox("Deep scan")
+        self._deep_cb.setToolTip(
+            "List every directory even if its modification time is unchanged since the last scan"
+        )
+        self._fast_decode_cb = QCheckBox("Fast decode")
+        self._fast_decode_cb.setToolTip(
+            "Decode at reduced resolution for hashing and sharpness (much faster on large JPEGs)"
+        )
+        self._previews_cb = QCheckBox("Preview pre-filter")
+        self._previews_cb.setToolTip(
+            "Hash the embedded thumbnail of large JPEGs first "
+            "and fully decode only likely duplicates"
+        )
+        self._profile_cb = QCheckBox("Profile")
+        self._profile_cb.setToolTip(
+            "Time every scan stage and show a report when the scan finishes"
+        )
+        self._retry_bad_cb = QCheckBox("Retry failed files")
+        self._retry_bad_cb.setToolTip(
+            "Re-process files that failed in an earlier scan even if they are unchanged"
+        )
+        self._exact_only_cb = QCheckBox("Exact duplicates only")
+        self._exact_only_cb.setToolTip(
+            "Find byte-identical copies without decoding images; "
+            "run a normal scan later for similar images"
+        )
 
         self._phash_threshold = QSpinBox()
         self._phash_threshold.setMinimum(0)
         self._phash_threshold.setMaximum(32)
         self._phash_threshold.setValue(6)
 
+        self._rotations_cb = QCheckBox("Match rotated/mirrored")
+        self._rotations_cb.setToolTip(
+            "Also group images that are rotated or mirrored copies of each other"
+        )
+
+        self._workers = QSpinBox()
+        self._workers.setMinimum(1)
+        self._workers.setMaximum(max(1, os.cpu_count() or 1) * 2)
+        self._workers.setValue(int(self._settings.value("scan_workers", os.cpu_count() or 1)))
+        self._workers.setToolTip(
+            "Processes used for decoding and hashing (1 = no worker processes)"
+        )
+
         self._dupes_table = QTableWidget(0, 4)
         self._dupes_table.setHorizontalHeaderLabels(["Group", "Best", "Duplicate", "Method"])
         self._dupes_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
@@ -125,6 +236,11 @@ class ScannerWindow(QWidget):
         self._dupes_table.itemDoubleClicked.connect(self._on_resolve_duplicates)
 
         self._status = QLabel("Ready")
+        self._queues_label = QLabel("")
+        self._queues_label.setToolTip(
+            "Items waiting in front of each scan stage; "
+            "a full queue points at the slow stage after it"
+        )
 
         buttons = QHBoxLayout()
         buttons.addWidget(self._add_btn)
@@ -134,14 +250,26 @@ class ScannerWindow(QWidget):
         buttons.addStretch(1)
         buttons.addWidget(QLabel("pHash threshold"))
         buttons.addWidget(self._phash_threshold)
+        buttons.addWidget(self._rotations_cb)
+        buttons.addWidget(QLabel("Workers"))
+        buttons.addWidget(self._workers)
         buttons.addStretch(1)
         buttons.addWidget(self._resolve_btn)
+        buttons.addWidget(self._resume_btn)
+        buttons.addWidget(self._watch_btn)
         buttons.addWidget(self._scan_btn)
 
         opts = QHBoxLayout()
         opts.addWidget(self._emb_cb)
         opts.addWidget(self._faces_cb)
         opts.addWidget(self._objects_cb)
+        opts.addWidget(self._incremental_cb)
+        opts.addWidget(self._deep_cb)
+        opts.addWidget(self._previews_cb)
+        opts.addWidget(self._fast_decode_cb)
+        opts.addWidget(self._exact_only_cb)
+        opts.addWidget(self._profile_cb)
+        opts.addWidget(self._retry_bad_cb)
         opts.addStretch(1)
 
         root = QVBoxLayout()
@@ -152,6 +280,7 @@ class ScannerWindow(QWidget):
         root.addWidget(QLabel("Duplicates (best image chosen by score)") )
         root.addWidget(self._dupes_table)
         root.addWidget(self._status)
+        root.addWidget(self._queues_label)
 
         self.setLayout(root)
 
@@ -159,12 +288,17 @@ class ScannerWindow(QWidget):
         self._clear_db_btn.clicked.connect(self._on_clear_db)
         self._settings_btn.clicked.connect(self._on_settings)
         self._scan_btn.clicked.connect(self._on_scan)
+        self._resume_btn.clicked.connect(self._on_resume)
+        self._watch_btn.toggled.connect(self._on_watch_toggled)
         self._resolve_btn.clicked.connect(self._on_resolve_all)
 
         self._refresh_ai_availability()
         self._load_initial_state()
 
         self._thread: QThread | None = None
+        self._scanning = False
+        self._watch_thread: QThread | None = None
+        self._watch_stop = threading.Event()
 
     def _load_initial_state(self) -> None:
         db = PhotoDB(self._db_path)
@@ -177,6 +311,25 @@ class ScannerWindow(QWidget):
         # Load duplicates
         self._refresh_duplicates_view()
         db.close()
+        self._refresh_resume_button()
+
+    def _update_scan_buttons(self) -> None:
+        # A scan and a watch session must not write the same database at once.
+        watching = self._watch_thread is not None
+        self._scan_btn.setEnabled(not self._scanning and not watching)
+        self._resume_btn.setEnabled(not self._scanning and not watching)
+        self._watch_btn.setEnabled(not self._scanning)
+
+    def _refresh_resume_button(self) -> None:
+        db = PhotoDB(self._db_path)
+        cp = db.get_checkpoint()
+        db.close()
+        self._resume_btn.setVisible(cp is not None)
+        if cp is not None:
+            self._resume_btn.setToolTip(
+                f"Continue the interrupted scan of {len(cp.folders)} folder(s) "
+                f"({cp.completed_dirs} directories already done)"
+            )
 
     def _refresh_duplicates_view(self) -> None:
         # We need to open a new connection or use the existing one if passed?
@@ -201,7 +354,7 @@ class ScannerWindow(QWidget):
             for other in g[1:]:
                 rows.append(DuplicateRow(group_id=g[0].sha256[:12], best_path=best, other_path=other.path, method="sha256"))
 
-        ph_groups = group_duplicates_by_phash(records, threshold=int(self._phash_threshold.value()))
+        ph_groups = self._group_similar(records)
         for idx, g in enumerate(ph_groups, start=1):
             best = g[0].path
             gid = f"phash-{idx}"
@@ -211,6 +364,14 @@ class ScannerWindow(QWidget):
         self._render_duplicates(rows)
         self._status.setText(f"Loaded {len(records)} images. Found {len(rows)} duplicate pairs.")
 
+    def _group_similar(self, records: list) -> list:
+        threshold = int(self._phash_threshold.value())
+        if self._rotations_cb.isChecked():
+            return group_duplicates_by_phash(
+                records, threshold=threshold, families=("phash", "rhash"), mode="any"
+            )
+        return group_duplicates_by_phash(records, threshold=threshold)
+
     def _on_clear_db(self) -> None:
         if QMessageBox.question(self, "Clear Database", "Are you sure you want to delete ALL records and folders from the database? This cannot be undone.") == QMessageBox.StandardButton.Yes:
             db = PhotoDB(self._db_path)
@@ -218,6 +379,7 @@ class ScannerWindow(QWidget):
             db.close()
             self._folders_list.clear()
             self._dupes_table.setRowCount(0)
+            self._resume_btn.setVisible(False)
             self._status.setText("Database cleared.")
 
     def _on_add(self) -> None:
@@ -278,17 +440,49 @@ class ScannerWindow(QWidget):
             compute_embeddings=self._emb_cb.isChecked(),
             detect_faces=self._faces_cb.isChecked(),
             detect_objects=self._objects_cb.isChecked(),
+            incremental=self._incremental_cb.isChecked(),
+            deep=self._deep_cb.isChecked(),
+            use_previews=self._previews_cb.isChecked(),
+            workers=int(self._workers.value()),
+            fast_decode=self._fast_decode_cb.isChecked(),
+            exact_only=self._exact_only_cb.isChecked(),
+            profile=self._profile_cb.isChecked(),
+            retry_bad=self._retry_bad_cb.isChecked(),
         )
+        self._settings.setValue("scan_workers", options.workers)
+
+        self._start_scan(folders, options)
 
-        self._scan_btn.setEnabled(False)
-        self._status.setText("Scanning...")
+    def _on_resume(self) -> None:
+        db = PhotoDB(self._db_path)
+        cp = db.get_checkpoint()
+        db.close()
+        if cp is None:
+            self._resume_btn.setVisible(False)
+            return
+        # Resume with the interrupted scan's own folders and options so the
+        # checkpoint matches; only the worker count follows the current setting.
+        options = dataclasses.replace(
+            options_from_json(cp.options_json), workers=int(self._workers.value())
+        )
+        self._start_scan([Path(f) for f in cp.folders], options, resume=True)
+
+    def _start_scan(self, folders: list[Path], options: ScanOptions, resume: bool = False) -> None:
+        if self._watch_thread is not None:
+            return
+        self._scanning = True
+        self._update_scan_buttons()
+        self._resume_btn.setVisible(False)
+        self._status.setText("Resuming scan..." if resume else "Scanning...")
         self._dupes_table.setRowCount(0)
 
         settings = QSettings("PhotoScanner", "App")
         device = settings.value("ai_device", "cpu")
 
         self._thread = QThread()
-        self._worker = ScanWorker(self._db_path, folders, options, str(device), self._running_event)
+        self._worker = ScanWorker(
+            self._db_path, folders, options, str(device), self._running_event, resume=resume
+        )
         self._worker.moveToThread(self._thread)
 
         self._thread.started.connect(self._worker.run)
@@ -302,7 +496,69 @@ class ScannerWindow(QWidget):
 
         self._thread.start()
 
+    def _on_watch_toggled(self, checked: bool) -> None:
+        if not checked:
+            self._watch_stop.set()
+            self._status.setText("Stopping watch...")
+            return
+        if self._scanning:
+            self._watch_btn.setChecked(False)
+            return
+        if not self._get_folders():
+            QMessageBox.information(self, "Photo Scanner", "Add at least one folder.")
+            self._watch_btn.setChecked(False)
+            return
+
+        options = ScanOptions(
+            compute_embeddings=self._emb_cb.isChecked(),
+            detect_faces=self._faces_cb.isChecked(),
+            detect_objects=self._objects_cb.isChecked(),
+            workers=1,
+            fast_decode=self._fast_decode_cb.isChecked(),
+            exact_only=self._exact_only_cb.isChecked(),
+        )
+        settings = QSettings("PhotoScanner", "App")
+        device = settings.value("ai_device", "cpu")
+
+        self._watch_stop = threading.Event()
+        self._watch_thread = QThread()
+        self._watch_worker = WatchWorker(
+            self._db_path, options, str(device), self._running_event, self._watch_stop
+        )
+        self._watch_worker.moveToThread(self._watch_thread)
+
+        self._watch_thread.started.connect(self._watch_worker.run)
+        self._watch_worker.batch.connect(self._on_watch_batch)
+        self._watch_worker.error.connect(self._on_watch_error)
+        self._watch_worker.finished.connect(self._on_watch_finished)
+
+        self._watch_worker.finished.connect(self._watch_thread.quit)
+        self._watch_worker.finished.connect(self._watch_worker.deleteLater)
+        self._watch_thread.finished.connect(self._watch_thread.deleteLater)
+
+        self._watch_thread.start()
+        self._update_scan_buttons()
+        self._status.setText("Watching folders for changes...")
+
+    def _on_watch_batch(self, res: ScanResult) -> None:
+        self._status.setText(
+            f"Watch: indexed {res.indexed}, skipped {res.skipped}, removed {res.vanished} "
+            f"(new {res.new}, changed {res.changed})"
+        )
+
+    def _on_watch_error(self, msg: str) -> None:
+        QMessageBox.critical(self, "Watch failed", msg)
+
+    def _on_watch_finished(self) -> None:
+        self._watch_thread = None
+        self._watch_btn.blockSignals(True)
+        self._watch_btn.setChecked(False)
+        self._watch_btn.blockSignals(False)
+        self._update_scan_buttons()
+        self._status.setText("Stopped watching.")
+
     def closeEvent(self, event):
+        self._watch_stop.set()
         # Save geometry of the MDI subwindow (parent)
         p = self.parentWidget()
         if p:
@@ -318,17 +574,36 @@ class ScannerWindow(QWidget):
             self._geometry_restored = True
         super().showEvent(event)
 
-    def _on_progress(self, scanned: int, indexed: int, skipped: int, path: str) -> None:
-        self._status.setText(f"Scanned {scanned} | Indexed {indexed} | Skipped {skipped} | {path}")
+    def _on_progress(self, p: ScanProgress) -> None:
+        total = f"/{p.queued}" if p.walk_done else ""
+        self._status.setText(
+            f"Scanned {p.scanned} | Processed {p.done}{total} | "
+            f"Indexed {p.indexed} | Skipped {p.skipped} | "
+            f"{p.files_per_s:.0f} files/s, {p.mb_per_s:.1f} MB/s | "
+            f"ETA {format_eta(p.eta)} | {p.path}"
+        )
+        if p.queues:
+            self._queues_label.setText(
+                "Queues: " + " | ".join(f"{name} {n}" for name, n in p.queues.items())
+            )
 
     def _on_error(self, msg: str) -> None:
-        self._scan_btn.setEnabled(True)
+        self._scanning = False
+        self._update_scan_buttons()
+        self._refresh_resume_button()
         QMessageBox.critical(self, "Scan failed", msg)
         self._status.setText("Error")
 
-    def _on_finished(self, scanned: int, indexed: int, skipped: int) -> None:
-        self._scan_btn.setEnabled(True)
-        self._status.setText(f"Done. Scanned {scanned}, indexed {indexed}, skipped {skipped}. Finding duplicates...")
+    def _on_finished(self, res: ScanResult) -> None:
+        self._scanning = False
+        self._update_scan_buttons()
+        self._queues_label.setText("")
+        self._status.setText(
+            f"Done. Scanned {res.scanned}, indexed {res.indexed}, skipped {res.skipped} "
+            f"(new {res.new}, changed {res.changed}, unchanged {res.unchanged}, "
+            f"vanished {res.vanished}). "
+            "Finding duplicates..."
+        )
 
         db = PhotoDB(self._db_path)
         records = list(db.iter_images())
@@ -342,7 +617,7 @@ class ScannerWindow(QWidget):
             for other in g[1:]:
                 rows.append(DuplicateRow(group_id=g[0].sha256[:12], best_path=best, other_path=other.path, method="sha256"))
 
-        ph_groups = group_duplicates_by_phash(records, threshold=int(self._phash_threshold.value()))
+        ph_groups = self._group_similar(records)
         for idx, g in enumerate(ph_groups, start=1):
             best = g[0].path
             gid = f"phash-{idx}"
@@ -350,7 +625,16 @@ class ScannerWindow(QWidget):
                 rows.append(DuplicateRow(group_id=gid, best_path=best, other_path=other.path, method="phash"))
 
         self._render_duplicates(rows)
-        self._status.setText(f"Done. Images: {len(records)} | Duplicate rows: {len(rows)}")
+        self._status.setText(
+            f"Done. Images: {len(records)} | Duplicate rows: {len(rows)} | "
+            f"New {res.new} | Changed {res.changed} | Unchanged {res.unchanged} | "
+            f"Vanished {res.vanished}"
+            + (f" | Moved {res.moved}" if res.moved else "")
+            + (f" | Reused {res.reused}" if res.reused else "")
+            + (f" | Known bad {res.known_bad}" if res.known_bad else "")
+        )
+        if res.profile is not None:
+            ScanProfileDialog(res.profile, self).exec()
 
     def _render_duplicates(self, rows: list[DuplicateRow]) -> None:
         self._dupes_table.setRowCount(len(rows))
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+
+# Same parameters as imagehash.phash(): an 8x8 block of low DCT frequencies
+# taken from a 32x32 grayscale downsample.
+PHASH_SIZE = 8
+PHASH_INPUT_SIZE = PHASH_SIZE * 4
+
+# Hash families stored per image. All are 64-bit and compared by Hamming distance.
+# rhash is pHash in a canonical orientation, so rotated/mirrored copies match.
+HASH_FAMILIES = ("phash", "dhash", "ahash", "whash", "chash", "rhash")
+
+# Colour-moment hash: 5 channels x (mean, std, skew), each quantised to
+# CHASH_LEVELS levels and stored as a thermometer code, so the Hamming distance
+# between two hashes is the summed level difference.
+CHASH_LEVELS = 5
+_CHASH_BITS = CHASH_LEVELS - 1
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(n: int, k: int) -> np.ndarray:
+    """First ``k`` rows of the unnormalised DCT-II matrix of size ``n``.
+
+    Matches scipy.fftpack.dct(type=2, norm=None), which imagehash uses:
+    y[k] = 2 * sum_n x[n] * cos(pi * k * (2n + 1) / (2N)).
+    """
+    rows = np.arange(k, dtype=np.float64)[:, None]
+    cols = np.arange(n, dtype=np.float64)[None, :]
+    return 2.0 * np.cos(np.pi * rows * (2.0 * cols + 1.0) / (2.0 * n))
+
+
+# Transposes that swap width and height.
+_SWAPS_AXES = (
+    Image.Transpose.ROTATE_90,
+    Image.Transpose.ROTATE_270,
+    Image.Transpose.TRANSPOSE,
+    Image.Transpose.TRANSVERSE,
+)
+
+
+def phash_input(img: Image.Image, transpose: Optional[Image.Transpose] = None) -> np.ndarray:
+    """Downsample an image to the 32x32 grayscale array that phash_batch() expects.
+
+    Uses the same conversion and filter as imagehash.phash(), so the hashes
+    agree with the hex strings already stored in the database. ``transpose``
+    (e.g. the EXIF orientation) is applied to the downsample rather than to
+    the full image; the two commute.
+    """
+    grey = img.convert("L")
+    if transpose in _SWAPS_AXES:
+        # Resize filters the displayed rows first and rounds in between; keep
+        # that order so the hash is the one of the transposed full image.
+        grey = grey.resize((grey.width, PHASH_INPUT_SIZE), Image.Resampling.LANCZOS)
+    small = grey.resize((PHASH_INPUT_SIZE, PHASH_INPUT_SIZE), Image.Resampling.LANCZOS)
+    if transpose is not None:
+        small = small.transpose(transpose)
+    return np.asarray(small, dtype=np.uint8)
+
+
+def _dct_low(stack: np.ndarray) -> np.ndarray:
+    """The 8x8 low-frequency DCT corner of every image in an (N, 32, 32) stack."""
+    stack = np.asarray(stack, dtype=np.float64)
+    if stack.ndim != 3 or stack.shape[1:] != (PHASH_INPUT_SIZE, PHASH_INPUT_SIZE):
+        raise ValueError(
+            f"expected an (N, {PHASH_INPUT_SIZE}, {PHASH_INPUT_SIZE}) stack, got {stack.shape}"
+        )
+    d = _dct_matrix(PHASH_INPUT_SIZE, PHASH_SIZE)
+    return d @ stack @ d.T  # (N, 8, 8)
+
+
+def _pack_median_bits(low: np.ndarray) -> np.ndarray:
+    flat = low.reshape(len(low), -1)
+    med = np.median(flat, axis=1, keepdims=True)
+    return np.packbits(flat > med, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def phash_batch(stack: np.ndarray) -> np.ndarray:
+    """pHash a stack of 32x32 grayscale images in one go.
+
+    ``stack`` has shape (N, 32, 32). Only the 8x8 low-frequency corner of the
+    2D DCT is needed, so it is computed as D @ X @ D.T with an 8x32 DCT matrix
+    for the whole stack at once. Returns N packed hashes as uint64, most
+    significant bit first (i.e. ``f"{h:016x}"`` is the imagehash string).
+    """
+    return _pack_median_bits(_dct_low(stack))
+
+
+def canonical_phash_batch(stack: np.ndarray) -> np.ndarray:
+    """Orientation-invariant pHash of a stack of 32x32 grayscale images.
+
+    The 8 rotations/mirrors of an image only permute and negate its DCT
+    coefficients: a horizontal mirror multiplies C[u, v] by (-1)**v, a vertical
+    one by (-1)**u, and a transpose swaps u and v. Each image is brought into
+    a canonical orientation in the DCT domain, with |C[0, 1]| >= |C[1, 0]| and
+    both non-negative, and then hashed like pHash.
+
+    Images near the boundary between two canonical orientations (|C[0, 1]|
+    close to |C[1, 0]|, or either close to 0) are the exception: resampling
+    noise can put a rotated copy on the other side, and its hash is then
+    unrelated. On random test images that is about one in 70.
+    """
+    low = _dct_low(stack)
+    swap = np.abs(low[:, 0, 1]) < np.abs(low[:, 1, 0])
+    low[swap] = low[swap].transpose(0, 2, 1)
+    alternating = np.where(np.arange(PHASH_SIZE) % 2 == 1, -1.0, 1.0)
+    low[low[:, 0, 1] < 0] *= alternating[None, :]
+    low[low[:, 1, 0] < 0] *= alternating[:, None]
+    return _pack_median_bits(low)
+
+
+def phash_image(img: Image.Image) -> int:
+    """pHash of a single image as an int."""
+    return int(phash_batch(phash_input(img)[None])[0])
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    """Pack a boolean array (row-major, MSB first) into an int, like imagehash's hex strings."""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash_from_input(pixels: np.ndarray) -> int:
+    """Difference hash of a phash_input() array: is each pixel of a 9x8
+    downsample brighter than its left neighbour."""
+    small = np.asarray(
+        Image.fromarray(pixels).resize((PHASH_SIZE + 1, PHASH_SIZE), Image.Resampling.LANCZOS)
+    )
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+
+def ahash_from_input(pixels: np.ndarray) -> int:
+    """Average hash of a phash_input() array: is each pixel of an 8x8 downsample above the mean."""
+    small = np.asarray(
+        Image.fromarray(pixels).resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS)
+    )
+    return _pack_bits(small > small.mean())
+
+
+def whash_from_input(pixels: np.ndarray) -> int:
+    """Haar wavelet hash of a phash_input() array.
+
+    Follows the steps of imagehash.whash's haar mode, but not its values:
+    imagehash starts from its own downsample of the image to the largest
+    power of two below the shorter side, so these hashes differ from
+    imagehash ones and must not be compared with them.
+
+    With the Haar wavelet, dropping the coarsest LL band and keeping the 8x8
+    LL level leaves the 8x8 block means minus the global mean, so the hash is
+    the block means compared with their median; no transform is needed.
+    """
+    k = PHASH_INPUT_SIZE // PHASH_SIZE
+    blocks = pixels.astype(np.float64).reshape(PHASH_SIZE, k, PHASH_SIZE, k).mean(axis=(1, 3))
+    return _pack_bits(blocks > np.median(blocks))
+
+
+def _quantise(values: np.ndarray, low: float, high: float) -> np.ndarray:
+    scaled = (np.clip(values, low, high) - low) / (high - low) * CHASH_LEVELS
+    return np.minimum(scaled.astype(np.int64), CHASH_LEVELS - 1)
+
+
+def colour_moment_hash(img: Image.Image) -> int:
+    """Colour-moment hash: mean, standard deviation and skewness of Y, Cb, Cr, S, V.
+
+    Complements the structural hashes: it stays close under small edits and
+    tells apart flat images that differ only in colour. Uses 60 of the 64 bits.
+    """
+    small = img.convert("RGB").resize((PHASH_INPUT_SIZE, PHASH_INPUT_SIZE), Image.Resampling.BOX)
+    ycc = np.asarray(small.convert("YCbCr"), dtype=np.float64).reshape(-1, 3)
+    hsv = np.asarray(small.convert("HSV"), dtype=np.float64).reshape(-1, 3)[:, 1:]
+    chans = np.concatenate([ycc, hsv], axis=1)  # (pixels, 5)
+    mean = chans.mean(axis=0)
+    std = chans.std(axis=0)
+    skew = ((chans - mean) ** 3).mean(axis=0) / np.maximum(std, 1e-6) ** 3
+
+    levels = np.concatenate(
+        [_quantise(mean, 0, 256), _quantise(std, 0, 100), _quantise(skew, -2, 2)]
+    )
+    value = 0
+    for level in levels:
+        value = (value << _CHASH_BITS) | ((1 << int(level)) - 1)
+    return value
+
+
+@dataclass(frozen=True)
+class ImageHashes:
+    """All hash families for one image, as unsigned 64-bit ints."""
+
+    phash: int
+    dhash: int
+    ahash: int
+    whash: int
+    chash: int
+    rhash: int
+    # The phash_input() array the grey families were computed from.
+    pixels: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+
+
+def compute_hashes(
+    img: Image.Image, transpose: Optional[Image.Transpose] = None, with_phash: bool = True
+) -> ImageHashes:
+    """Compute every hash family from one decode, as if ``img`` were transposed.
+
+    The grey families share the 32x32 pHash downsample, so they add almost
+    nothing on top of pHash; the colour-moment hash needs one small RGB resize
+    and does not depend on the orientation.
+
+    Without ``with_phash``, phash and rhash are left 0 for the caller to
+    compute from ``pixels`` for many images at once with phash_batch() and
+    canonical_phash_batch().
+    """
+    pixels = phash_input(img, transpose)
+    return ImageHashes(
+        phash=int(phash_batch(pixels[None])[0]) if with_phash else 0,
+        rhash=int(canonical_phash_batch(pixels[None])[0]) if with_phash else 0,
+        dhash=dhash_from_input(pixels),
+        ahash=ahash_from_input(pixels),
+        whash=whash_from_input(pixels),
+        chash=colour_moment_hash(img),
+        pixels=pixels,
+    )
+
+
+def hamming_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise Hamming distances between two arrays of 64-bit hashes, shape (len(a), len(b))."""
+    x = np.asarray(a, dtype=np.uint64)[:, None] ^ np.asarray(b, dtype=np.uint64)[None, :]
+    return _POPCOUNT8[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+# hamming_neighbors() splits hashes into this many 16-bit bands.
+_BANDS = 4
+
+
+def _band_masks(radius: int) -> np.ndarray:
+    """Every 16-bit XOR mask of at most ``radius`` set bits."""
+    return np.array([m for m in range(1 << 16) if m.bit_count() <= radius], dtype=np.int64)
+
+
+def hamming_neighbors(
+    queries: np.ndarray, table: np.ndarray, threshold: int, chunk: int = 2048
+) -> tuple[np.ndarray, np.ndarray]:
+    """Index pairs (i, j) with ``queries[i]`` within ``threshold`` bits of ``table[j]``.
+
+    Multi-index hashing: two 64-bit hashes at most ``threshold`` bits apart
+    differ in at most ``threshold // 4`` bits in one of their four 16-bit
+    bands, so only table entries found by probing that neighbourhood of each
+    query band are compared. For small thresholds this touches a tiny part of
+    the table, where hamming_matrix() compares everything with everything.
+    Each pair is returned once.
+    """
+    q = np.asarray(queries, dtype=np.uint64)
+    t = np.asarray(table, dtype=np.uint64)
+    masks = _band_masks(threshold // _BANDS)
+    pairs = []
+    for band in range(_BANDS):
+        shift = np.uint64(16 * band)
+        keys = ((t >> shift) & np.uint64(0xFFFF)).astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        for start in range(0, len(q), chunk):
+            part = ((q[start : start + chunk] >> shift) & np.uint64(0xFFFF)).astype(np.int64)
+            probes = (part[:, None] ^ masks[None, :]).ravel()
+            left = np.searchsorted(keys, probes, side="left")
+            counts = np.searchsorted(keys, probes, side="right") - left
+            total = int(counts.sum())
+            if not total:
+                continue
+            # Expand every probe's run [left, left + count) of the sorted table.
+            qi = np.repeat(np.repeat(np.arange(start, start + len(part)), len(masks)), counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            tj = order[np.repeat(left, counts) + offsets]
+            x = q[qi] ^ t[tj]
+            dist = _POPCOUNT8[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            near = dist <= threshold
+            pairs.append(qi[near] * len(t) + tj[near])
+    if not pairs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # A pair close in several bands is found once per band.
+    found = np.unique(np.concatenate(pairs))
+    return found // len(t), found % len(t)
+
+
+def phash_to_hex(value: int) -> str:
+    return f"{int(value):016x}"
+
+
+def phash_from_hex(text: str) -> int:
+    return int(text, 16)
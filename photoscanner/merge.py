@@ -0,0 +1,86 @@
+"""Combine shard databases scanned on separate machines into one index.
+
+Scanning a NAS over the network from one workstation is bound by the network.
+Instead, each storage node scans its local disks into its own shard database,
+e.g. ``python -m photoscanner --db nas1.sqlite scan /volume1/photos``, and the
+shards are merged into the main database afterwards, mapping node-local paths
+onto the paths the workstation sees them under::
+
+    python -m photoscanner merge nas1.sqlite nas2.sqlite \\
+        --map /volume1/photos=//nas1/photos --map /share/pics=//nas2/pics
+
+The merged rows carry the same hashes a central scan would have produced, so
+duplicate grouping works across shards. Shards must be scanned without
+``exact_only``: its "partial:" keys are only unique within one shard, so a
+shard that still holds any is refused rather than merged.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence
+
+from photoscanner.db import PhotoDB, ShardMergeStats
+
+
+@dataclass(frozen=True)
+class MergeResult:
+    shards: int
+    images: int
+    inserted: int
+    updated: int
+    kept: int
+    deleted: int
+    bad_files: int
+    per_shard: dict[str, ShardMergeStats] = field(default_factory=dict)
+
+
+def parse_prefix_map(specs: Iterable[str]) -> list[tuple[str, str]]:
+    """Parse ``OLD=NEW`` prefix mappings (as given on the command line)."""
+    out = []
+    for spec in specs:
+        old, sep, new = spec.partition("=")
+        if not sep or not old or not new:
+            raise ValueError(f"invalid prefix mapping {spec!r}, expected OLD=NEW")
+        out.append((old, new))
+    return out
+
+
+def merge_shards(
+    db: PhotoDB,
+    shards: Sequence[Path],
+    prefix_map: Sequence[tuple[str, str]] = (),
+    replace: bool = False,
+    progress_cb: Optional[Callable[[str, ShardMergeStats], None]] = None,
+) -> MergeResult:
+    """Merge ``shards`` into ``db`` in order, see PhotoDB.merge_shard().
+
+    Each shard is merged in its own transaction; ``progress_cb(shard, stats)``
+    is called after each one. Conflicts between shards resolve like those with
+    the target: the newer ``mtime_ns`` wins.
+    """
+    for shard in shards:
+        if not Path(shard).is_file():
+            raise FileNotFoundError(f"shard database not found: {shard}")
+
+    per_shard: dict[str, ShardMergeStats] = {}
+    for shard in shards:
+        # Brings an older shard up to the current schema.
+        PhotoDB(Path(shard)).close()
+        stats = db.merge_shard(Path(shard), prefix_map, replace=replace)
+        per_shard[str(shard)] = stats
+        if progress_cb is not None:
+            progress_cb(str(shard), stats)
+
+    values = per_shard.values()
+    return MergeResult(
+        shards=len(per_shard),
+        images=sum(s.images for s in values),
+        inserted=sum(s.inserted for s in values),
+        updated=sum(s.updated for s in values),
+        kept=sum(s.kept for s in values),
+        deleted=sum(s.deleted for s in values),
+        bad_files=sum(s.bad_files for s in values),
+        per_shard=per_shard,
+    )
@@ -0,0 +1,290 @@
+"""Ordered, resumable upgrades of PhotoDB databases to the current schema.
+
+Each Migration brings the database from the previous version to its
+``version``. PhotoDB runs the pending ones when it opens a database, so an
+existing index is upgraded in place instead of having to be rebuilt by a new
+scan. The version is kept in the ``meta`` table; databases from before the
+table had a version count as version 1.
+
+Migrations that rewrite a large table use rebuild_table(): the rows are copied
+into the new layout in batches, each committed on its own, and the old table
+is only swapped out at the end in the same transaction that records the new
+version. An upgrade interrupted at any point (Ctrl+C, a crash, a full disk)
+therefore leaves a valid database of the old version, and the next open
+continues with the copy where it stopped.
+
+A migration pins the DDL it creates instead of using the current one from
+photoscanner.db, which keeps changing after it has shipped.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+
+# Rows copied per transaction by rebuild_table().
+DEFAULT_BATCH_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class MigrationProgress:
+    """Progress of the migration to ``version``, reported after every batch."""
+
+    version: int
+    description: str
+    # Rows done out of ``total``; both 0 for steps that are not batched.
+    done: int
+    total: int
+
+
+class MigrationContext:
+    """What a Migration's ``apply`` works with."""
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        migration: "Migration",
+        batch_size: int,
+        progress_cb: Optional[Callable[[MigrationProgress], None]],
+    ) -> None:
+        self.conn = conn
+        self.migration = migration
+        self.batch_size = max(1, batch_size)
+        self._progress_cb = progress_cb
+
+    def report(self, done: int, total: int) -> None:
+        if self._progress_cb is not None:
+            self._progress_cb(
+                MigrationProgress(self.migration.version, self.migration.description, done, total)
+            )
+
+
+@dataclass(frozen=True)
+class Migration:
+    """An upgrade from ``version - 1`` to ``version``.
+
+    ``apply`` may commit intermediate batches, but must be able to continue
+    from any of them. Whatever it leaves uncommitted is committed together
+    with the new version number.
+    """
+
+    version: int
+    description: str
+    apply: Callable[[MigrationContext], None]
+    # Run VACUUM afterwards to give freed pages back to the file system.
+    vacuum: bool = False
+
+
+def schema_version(conn: sqlite3.Connection) -> Optional[int]:
+    """Version of the database on ``conn``; None for a new, empty database."""
+    has_meta = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='meta'"
+    ).fetchone()
+    if has_meta:
+        row = conn.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone()
+        if row is not None:
+            return int(row[0])
+    has_images = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='images'"
+    ).fetchone()
+    return 1 if has_images else None
+
+
+def migrate(
+    conn: sqlite3.Connection,
+    target: int,
+    progress_cb: Optional[Callable[[MigrationProgress], None]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    migrations: Optional[Sequence[Migration]] = None,
+) -> list[int]:
+    """Apply the pending migrations up to ``target`` in order and return the
+    versions applied. New databases are left alone; PhotoDB creates them at
+    the current version.
+
+    Raises ValueError for a database written by a newer version.
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    current = schema_version(conn)
+    if current is None:
+        return []
+    if current > target:
+        raise ValueError(
+            f"database has schema version {current}, newer than the supported {target}"
+        )
+
+    conn.commit()
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if not current < migration.version <= target:
+            continue
+        ctx = MigrationContext(conn, migration, batch_size, progress_cb)
+        try:
+            migration.apply(ctx)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES('schema_version', ?)",
+                (str(migration.version),),
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        current = migration.version
+        applied.append(migration.version)
+    if current < target:
+        raise ValueError(f"no migration to schema version {target}, stopped at {current}")
+
+    if any(m.vacuum for m in migrations if m.version in applied):
+        if progress_cb is not None:
+            progress_cb(MigrationProgress(current, "compact the database file", 0, 0))
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return applied
+
+
+def rebuild_table(
+    ctx: MigrationContext,
+    table: str,
+    create_sql: str,
+    columns: Sequence[str],
+    exprs: Optional[Sequence[str]] = None,
+    key: str = "path",
+) -> None:
+    """Copy ``table`` into a new layout and swap it in.
+
+    ``create_sql`` creates the new table, with ``{table}`` in place of its
+    name. ``exprs`` are the SELECT expressions over the old table filling
+    ``columns`` (default: the columns themselves). Rows are copied in
+    ``key`` order, ``ctx.batch_size`` per transaction; an interrupted copy
+    continues after the last copied key. Indexes of the old table are dropped
+    with it; PhotoDB recreates the current ones.
+
+    The swap is left uncommitted, for migrate() to commit with the version.
+    """
+    conn = ctx.conn
+    new = f"{table}_v{ctx.migration.version}"
+    exprs = list(columns) if exprs is None else list(exprs)
+    conn.execute(create_sql.format(table=new))
+    conn.commit()
+
+    total = int(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+    done = int(conn.execute(f"SELECT COUNT(*) FROM {new}").fetchone()[0])
+    last = conn.execute(f"SELECT MAX({key}) FROM {new}").fetchone()[0]
+    ctx.report(done, total)
+    insert = f"INSERT INTO {new}({', '.join(columns)}) SELECT {', '.join(exprs)} FROM {table}"
+    while True:
+        if last is None:
+            cur = conn.execute(f"{insert} ORDER BY {key} LIMIT ?", (ctx.batch_size,))
+        else:
+            cur = conn.execute(
+                f"{insert} WHERE {key} > ? ORDER BY {key} LIMIT ?", (last, ctx.batch_size)
+            )
+        if cur.rowcount <= 0:
+            conn.rollback()
+            break
+        done += cur.rowcount
+        last = conn.execute(f"SELECT MAX({key}) FROM {new}").fetchone()[0]
+        conn.commit()
+        ctx.report(done, total)
+
+    conn.execute("BEGIN")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+
+
+# --- Version 2: pHash as INTEGER, SHA-256 and partial keys as BLOBs ----------
+
+_V1_PARTIAL_PREFIX = "partial:"
+
+_V2_IMAGES_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        path TEXT PRIMARY KEY,
+        sha256 BLOB NOT NULL,
+        phash INTEGER,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        file_size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        score REAL NOT NULL,
+        embedding BLOB,
+        faces_json TEXT,
+        objects_json TEXT,
+        dhash INTEGER,
+        ahash INTEGER,
+        whash INTEGER,
+        chash INTEGER,
+        rhash INTEGER,
+        from_preview INTEGER NOT NULL DEFAULT 0,
+        partial_hash BLOB
+    );
+"""
+
+_V2_IMAGE_COLUMNS = (
+    "path",
+    "sha256",
+    "phash",
+    "width",
+    "height",
+    "file_size",
+    "mtime_ns",
+    "score",
+    "embedding",
+    "faces_json",
+    "objects_json",
+    "dhash",
+    "ahash",
+    "whash",
+    "chash",
+    "rhash",
+    "from_preview",
+    "partial_hash",
+)
+
+
+def _v1_digest_blob(value: Optional[str]) -> Optional[bytes]:
+    if value is None:
+        return None
+    if value.startswith(_V1_PARTIAL_PREFIX):
+        value = value[len(_V1_PARTIAL_PREFIX) :]
+    return bytes.fromhex(value)
+
+
+def _v1_phash_int(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    n = int(value, 16)
+    return n - (1 << 64) if n >= 1 << 63 else n
+
+
+def _to_v2(ctx: MigrationContext) -> None:
+    conn = ctx.conn
+    # Version 1 databases gained these columns over time.
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(images)")}
+    for column, decl in (
+        ("dhash", "INTEGER"),
+        ("ahash", "INTEGER"),
+        ("whash", "INTEGER"),
+        ("chash", "INTEGER"),
+        ("rhash", "INTEGER"),
+        ("from_preview", "INTEGER NOT NULL DEFAULT 0"),
+        ("partial_hash", "TEXT"),
+    ):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE images ADD COLUMN {column} {decl}")
+    conn.commit()
+
+    conn.create_function("v1_digest_blob", 1, _v1_digest_blob, deterministic=True)
+    conn.create_function("v1_phash_int", 1, _v1_phash_int, deterministic=True)
+    converted = {
+        "sha256": "v1_digest_blob(sha256)",
+        "partial_hash": "v1_digest_blob(partial_hash)",
+        "phash": "v1_phash_int(phash)",
+    }
+    exprs = [converted.get(c, c) for c in _V2_IMAGE_COLUMNS]
+    rebuild_table(ctx, "images", _V2_IMAGES_SQL, _V2_IMAGE_COLUMNS, exprs)
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(2, "store pHash as INTEGER and SHA-256 as BLOB", _to_v2, vacuum=True),
+)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+
+# Marks the end of the stream on a queue.
+_END = object()
+# Returned by _get() once the pipeline has been stopped.
+_STOPPED = object()
+
+# How often blocked threads re-check whether the pipeline was stopped.
+_POLL_INTERVAL = 0.1
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of a Pipeline.
+
+    ``fn`` receives a single item (or a list of up to ``batch_size`` items when
+    ``batch_size > 1``) and returns the item(s) to pass on. ``workers`` threads
+    run the stage concurrently. A batching stage waits up to ``batch_wait``
+    seconds for a batch to fill before running a partial one.
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    batch_size: int = 1
+    batch_wait: float = 0.0
+
+
+class ByteBudget:
+    """Caps the number of buffered bytes in flight between two stages.
+
+    A single request larger than the whole budget is still admitted once the
+    budget is empty, so oversized files cannot deadlock the pipeline.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._limit = limit
+        self._used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int, stop: Optional[threading.Event] = None) -> bool:
+        with self._cond:
+            while self._used > 0 and self._used + n > self._limit:
+                if stop is not None and stop.is_set():
+                    return False
+                self._cond.wait(_POLL_INTERVAL)
+            self._used += n
+            return True
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self._used -= n
+            self._cond.notify_all()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+
+class Pipeline:
+    """Streams items from ``source`` through ``stages`` over bounded queues.
+
+    The source runs on its own thread and every stage on ``stage.workers``
+    threads. Iterating the pipeline yields the output of the last stage in the
+    caller's thread, which makes the caller the natural single writer. Full
+    queues block upstream stages, so memory stays bounded by the queue sizes.
+
+    An exception escaping the source or a stage function stops the pipeline
+    and is re-raised from the iterator.
+    """
+
+    def __init__(self, source: Iterable[Any], stages: list[Stage], queue_size: int = 32) -> None:
+        self._source = source
+        self._stages = stages
+        # _queues[i] feeds stages[i]; the last queue feeds the consumer.
+        self._queues: list[queue.Queue] = [
+            queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)
+        ]
+        self._names = [s.name for s in stages] + ["write"]
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._source_thread: Optional[threading.Thread] = None
+        # Stage threads, in stage order.
+        self._threads: list[threading.Thread] = []
+
+    def queue_depths(self) -> dict[str, int]:
+        """Items waiting in front of each stage (and the consumer, as ``write``)."""
+        return {name: q.qsize() for name, q in zip(self._names, self._queues)}
+
+    @property
+    def stop_event(self) -> threading.Event:
+        return self._stop
+
+    def close(self) -> None:
+        """Stop the pipeline and wait for the stage threads to exit, so that
+        what the stage functions use can be released afterwards. The source
+        thread is not waited for; it only feeds the first queue."""
+        self._stop.set()
+        for t in self._threads:
+            if t.is_alive():
+                t.join()
+
+    def __iter__(self) -> Iterator[Any]:
+        self._start()
+        out = self._queues[-1]
+        try:
+            while True:
+                item = self._get(out)
+                if item is _END or item is _STOPPED:
+                    break
+                yield item
+            if self._error is not None:
+                raise self._error
+        finally:
+            self._stop.set()
+
+    def _start(self) -> None:
+        self._source_thread = threading.Thread(
+            target=self._run_source, name="pipeline-source", daemon=True
+        )
+        for idx, stage in enumerate(self._stages):
+            remaining = [max(1, stage.workers)]
+            lock = threading.Lock()
+            for n in range(remaining[0]):
+                self._threads.append(
+                    threading.Thread(
+                        target=self._run_stage,
+                        args=(idx, remaining, lock),
+                        name=f"pipeline-{stage.name}-{n}",
+                        daemon=True,
+                    )
+                )
+        self._source_thread.start()
+        for t in self._threads:
+            t.start()
+
+    def _fail(self, e: BaseException) -> None:
+        if self._error is None:
+            self._error = e
+        self._stop.set()
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        """Next item, or _STOPPED once the pipeline has been stopped."""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _STOPPED
+
+    def _run_source(self) -> None:
+        try:
+            for item in self._source:
+                if not self._put(self._queues[0], item):
+                    return
+        except BaseException as e:
+            self._fail(e)
+            return
+        self._put(self._queues[0], _END)
+
+    def _run_stage(self, idx: int, remaining: list[int], lock: threading.Lock) -> None:
+        stage = self._stages[idx]
+        inq = self._queues[idx]
+        outq = self._queues[idx + 1]
+        try:
+            done = False
+            while not done:
+                item = self._get(inq)
+                if item is _STOPPED:
+                    return
+                if item is _END:
+                    break
+
+                if stage.batch_size <= 1:
+                    if not self._put(outq, stage.fn(item)):
+                        return
+                    continue
+
+                batch = [item]
+                deadline = time.monotonic() + stage.batch_wait
+                while len(batch) < stage.batch_size:
+                    try:
+                        nxt = inq.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if nxt is _END:
+                        done = True
+                        break
+                    batch.append(nxt)
+                for out in stage.fn(batch):
+                    if not self._put(outq, out):
+                        return
+        except BaseException as e:
+            self._fail(e)
+            return
+
+        # Let sibling workers see the end marker too; the last one forwards it.
+        inq.put(_END)
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            self._put(outq, _END)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import io
+import os
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+
+# Camera RAW formats. All but CR3 are TIFF-based (or, for RAF, carry a JPEG at
+# a fixed header offset) and are read by the built-in parser; CR3 needs the
+# optional rawpy. Without it raw_preview() raises RuntimeError, which scans
+# treat as transient, so such files are retried once rawpy is installed.
+RAW_EXTS = {
+    ".arw",
+    ".cr2",
+    ".cr3",
+    ".dng",
+    ".nef",
+    ".nrw",
+    ".orf",
+    ".pef",
+    ".raf",
+    ".rw2",
+    ".srw",
+}
+
+# TIFF tags used to locate embedded JPEGs.
+_TAG_NEW_SUBFILE_TYPE = 0x00FE
+_TAG_COMPRESSION = 0x0103
+_TAG_STRIP_OFFSETS = 0x0111
+_TAG_ORIENTATION = 0x0112
+_TAG_STRIP_BYTE_COUNTS = 0x0117
+_TAG_SUB_IFDS = 0x014A
+_TAG_JPEG_OFFSET = 0x0201
+_TAG_JPEG_LENGTH = 0x0202
+_TAG_EXIF_IFD = 0x8769
+
+# TIFF magic numbers: standard, Olympus ORF ("RO"/"RS") and Panasonic RW2.
+_TIFF_MAGICS = {42, 0x4F52, 0x5352, 0x55}
+# Baseline/extended/progressive JPEG; lossless JPEG (SOF3) is raw sensor data.
+_DISPLAYABLE_SOF = {0xC0, 0xC1, 0xC2}
+_MAX_IFDS = 64
+
+
+@dataclass(frozen=True)
+class Preview:
+    """An embedded JPEG preview and the orientation of the file containing it."""
+
+    data: bytes
+    orientation: int = 1
+
+
+def is_raw_path(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in RAW_EXTS
+
+
+def _jpeg_sof(buf, start: int, end: int) -> Optional[int]:
+    """The SOF marker of the JPEG at buf[start:end], or None if it is not a JPEG."""
+    if buf[start : start + 2] != b"\xff\xd8":
+        return None
+    i = start + 2
+    while i + 4 <= end:
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return marker
+        if marker in (0xD9, 0xDA):
+            return None
+        (seg_len,) = struct.unpack(">H", buf[i + 2 : i + 4])
+        i += 2 + seg_len
+    return None
+
+
+def _tiff_jpegs(buf, base: int = 0) -> tuple[list[tuple[int, int]], int]:
+    """Find (offset, length) of every JPEG referenced from the TIFF at ``base``.
+
+    Walks the IFD chain plus SubIFDs and the EXIF IFD. Returns the candidates
+    and the orientation from IFD0. Malformed structures end the walk early
+    rather than raising.
+    """
+    head = bytes(buf[base : base + 8])
+    if len(head) < 8 or head[:2] not in (b"II", b"MM"):
+        return [], 1
+    bo = "<" if head[:2] == b"II" else ">"
+    magic, ifd0 = struct.unpack(bo + "HI", head[2:8])
+    if magic not in _TIFF_MAGICS:
+        return [], 1
+
+    size = len(buf)
+    found: list[tuple[int, int]] = []
+    orientation = 1
+    todo = [ifd0]
+    seen: set[int] = set()
+    first = True
+    while todo and len(seen) < _MAX_IFDS:
+        off = todo.pop(0)
+        if off == 0 or off in seen or base + off + 2 > size:
+            continue
+        seen.add(off)
+        pos = base + off
+        (count,) = struct.unpack(bo + "H", buf[pos : pos + 2])
+        if pos + 2 + count * 12 + 4 > size:
+            continue
+        tags: dict[int, list[int]] = {}
+        for n in range(count):
+            e = pos + 2 + n * 12
+            tag, typ, cnt = struct.unpack(bo + "HHI", buf[e : e + 8])
+            if typ == 3:  # SHORT
+                width, fmt = 2, "H"
+            elif typ in (4, 13):  # LONG, IFD
+                width, fmt = 4, "I"
+            else:
+                continue
+            if cnt * width <= 4:
+                raw = buf[e + 8 : e + 8 + cnt * width]
+            else:
+                (voff,) = struct.unpack(bo + "I", buf[e + 8 : e + 12])
+                if cnt > 1024 or base + voff + cnt * width > size:
+                    continue
+                raw = buf[base + voff : base + voff + cnt * width]
+            tags[tag] = list(struct.unpack(bo + fmt * cnt, raw))
+        (next_ifd,) = struct.unpack(bo + "I", buf[pos + 2 + count * 12 : pos + 6 + count * 12])
+
+        if first and _TAG_ORIENTATION in tags:
+            orientation = tags[_TAG_ORIENTATION][0]
+        first = False
+        if _TAG_JPEG_OFFSET in tags and _TAG_JPEG_LENGTH in tags:
+            found.append((tags[_TAG_JPEG_OFFSET][0], tags[_TAG_JPEG_LENGTH][0]))
+        if (
+            tags.get(_TAG_COMPRESSION, [0])[0] in (6, 7)
+            and len(tags.get(_TAG_STRIP_OFFSETS, [])) == 1
+        ):
+            found.append((tags[_TAG_STRIP_OFFSETS][0], tags.get(_TAG_STRIP_BYTE_COUNTS, [0])[0]))
+        todo.extend(tags.get(_TAG_SUB_IFDS, []))
+        todo.extend(tags.get(_TAG_EXIF_IFD, []))
+        todo.append(next_ifd)
+
+    return [(base + o, n) for o, n in found if n > 0 and base + o + n <= size], orientation
+
+
+def _largest_displayable(buf, candidates: list[tuple[int, int]]) -> Optional[bytes]:
+    best: Optional[tuple[int, int]] = None
+    for off, length in candidates:
+        if _jpeg_sof(buf, off, off + length) not in _DISPLAYABLE_SOF:
+            continue
+        if best is None or length > best[1]:
+            best = (off, length)
+    if best is None:
+        return None
+    return bytes(buf[best[0] : best[0] + best[1]])
+
+
+def raw_preview(buf) -> Optional[Preview]:
+    """The largest embedded JPEG preview of a RAW file held in ``buf``.
+
+    Decoding the camera's own preview instead of demosaicing the sensor data
+    is what makes RAW files about as cheap to scan as JPEGs. Files the
+    built-in parser finds no preview in are handed to rawpy; RuntimeError if
+    it is not installed (as opposed to None: the file has no usable preview).
+    """
+    if bytes(buf[:16]) == b"FUJIFILMCCD-RAW ":
+        off, length = struct.unpack(">II", buf[84:92])
+        data = _largest_displayable(buf, [(off, length)])
+        if data is not None:
+            return Preview(data)
+    else:
+        candidates, orientation = _tiff_jpegs(buf)
+        data = _largest_displayable(buf, candidates)
+        if data is not None:
+            return Preview(data, orientation)
+
+    try:
+        import rawpy  # type: ignore
+    except Exception as e:
+        raise RuntimeError(
+            "Reading this RAW file requires 'rawpy'. Install with: pip install rawpy"
+        ) from e
+    try:
+        with rawpy.imread(io.BytesIO(bytes(buf))) as raw:
+            thumb = raw.extract_thumb()
+    except Exception:
+        return None
+    if thumb.format != rawpy.ThumbFormat.JPEG:
+        return None
+    return Preview(bytes(thumb.data))
+
+
+def exif_thumbnail(exif: Optional[bytes]) -> Optional[bytes]:
+    """The JPEG thumbnail stored in an EXIF block (PIL's ``img.info["exif"]``)."""
+    if not exif:
+        return None
+    base = 6 if exif[:6] == b"Exif\x00\x00" else 0
+    candidates, _ = _tiff_jpegs(exif, base)
+    return _largest_displayable(exif, candidates)
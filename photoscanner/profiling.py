@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+
+# Stages in pipeline order, for reports. Stages not listed here (there are
+# none today) are appended in name order.
+STAGE_ORDER = (
+    "list",
+    "read",
+    "extract",
+    "sha256",
+    "partial_hash",
+    "lookup",
+    "preview",
+    "decode",
+    "phash",
+    "sharpness",
+    "phash_batch",
+    "embed",
+    "detect",
+    "write",
+)
+
+# Histogram buckets are 2**(1/8) apart (~9%), which bounds the error of the
+# reported percentiles while the memory use stays constant per stage.
+_BUCKETS_PER_OCTAVE = 8
+# Bucket of zero durations (clock resolution), sorted before every other.
+_ZERO_BUCKET = -(1 << 30)
+
+PERCENTILES = (50, 95, 99)
+
+
+class Histogram:
+    """Log-bucketed histogram of durations in seconds."""
+
+    __slots__ = ("count", "total", "min", "max", "_buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self._buckets: dict[int, int] = {}
+
+    def add(self, value: float, count: int = 1) -> None:
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        key = math.floor(math.log2(value) * _BUCKETS_PER_OCTAVE) if value > 0 else _ZERO_BUCKET
+        self._buckets[key] = self._buckets.get(key, 0) + count
+
+    def percentile(self, q: float) -> float:
+        """Approximate ``q``-th percentile (0-100); 0.0 when empty."""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen >= rank:
+                if key == _ZERO_BUCKET:
+                    return 0.0
+                mid = 2.0 ** ((key + 0.5) / _BUCKETS_PER_OCTAVE)
+                return min(max(mid, self.min), self.max)
+        return self.max
+
+
+class _StageStats:
+    __slots__ = ("wall", "cpu", "bytes")
+
+    def __init__(self) -> None:
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.bytes = 0
+
+
+class _Measurement:
+    """Context manager timing one stage run; ``nbytes`` may be set inside the block."""
+
+    __slots__ = ("_sink", "_stage", "nbytes", "_wall", "_cpu")
+
+    def __init__(self, sink: Any, stage: str, nbytes: int) -> None:
+        self._sink = sink
+        self._stage = stage
+        self.nbytes = nbytes
+
+    def __enter__(self) -> "_Measurement":
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._sink.record(
+            self._stage,
+            time.perf_counter() - self._wall,
+            time.thread_time() - self._cpu,
+            self.nbytes,
+        )
+
+
+class _NullMeasurement:
+    __slots__ = ("nbytes",)
+
+    def __enter__(self) -> "_NullMeasurement":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every call is a no-op."""
+
+    enabled = False
+    _MEASUREMENT = _NullMeasurement()
+
+    def measure(self, stage: str, nbytes: int = 0) -> _NullMeasurement:
+        return self._MEASUREMENT
+
+    def record(self, stage: str, wall: float, cpu: float, nbytes: int = 0, count: int = 1) -> None:
+        pass
+
+    def record_all(self, timings: Optional[Iterable[tuple[str, float, float, int]]]) -> None:
+        pass
+
+    def report(self) -> Optional[dict]:
+        return None
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class TimingLog:
+    """Stage timings of a single file, collected where the work runs (possibly
+    a worker process) and merged into the scan's ScanProfiler afterwards."""
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.entries: list[tuple[str, float, float, int]] = []
+
+    def measure(self, stage: str, nbytes: int = 0) -> _Measurement:
+        return _Measurement(self, stage, nbytes)
+
+    def record(self, stage: str, wall: float, cpu: float, nbytes: int = 0, count: int = 1) -> None:
+        self.entries.append((stage, wall, cpu, nbytes))
+
+
+class ScanProfiler:
+    """Per-stage wall time, CPU time and bytes of one scan. Thread-safe.
+
+    CPU time is that of the measuring thread, so stages running concurrently
+    on other threads are not charged to each other.
+    """
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: dict[str, _StageStats] = {}
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+
+    def measure(self, stage: str, nbytes: int = 0) -> _Measurement:
+        return _Measurement(self, stage, nbytes)
+
+    def record(self, stage: str, wall: float, cpu: float, nbytes: int = 0, count: int = 1) -> None:
+        """Record ``count`` runs of ``stage`` that took ``wall``/``cpu`` seconds each."""
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats()
+            stats.wall.add(wall, count)
+            stats.cpu.add(cpu, count)
+            stats.bytes += nbytes
+
+    def record_all(self, timings: Optional[Iterable[tuple[str, float, float, int]]]) -> None:
+        """Merge TimingLog entries returned from a worker."""
+        for stage, wall, cpu, nbytes in timings or ():
+            self.record(stage, wall, cpu, nbytes)
+
+    def report(self) -> dict:
+        """JSON-serialisable summary; times in seconds."""
+        with self._lock:
+            order = {name: i for i, name in enumerate(STAGE_ORDER)}
+            names = sorted(self._stages, key=lambda n: (order.get(n, len(order)), n))
+            stages = {}
+            for name in names:
+                s = self._stages[name]
+                entry: dict[str, Any] = {
+                    "count": s.wall.count,
+                    "wall_total": s.wall.total,
+                    "cpu_total": s.cpu.total,
+                    "wall_max": s.wall.max,
+                }
+                for q in PERCENTILES:
+                    entry[f"wall_p{q}"] = s.wall.percentile(q)
+                for q in PERCENTILES:
+                    entry[f"cpu_p{q}"] = s.cpu.percentile(q)
+                entry["bytes"] = s.bytes
+                entry["mb_per_s"] = (
+                    s.bytes / s.wall.total / 1e6 if s.bytes and s.wall.total > 0 else 0.0
+                )
+                stages[name] = entry
+        return {
+            "wall_seconds": time.perf_counter() - self._started,
+            "cpu_seconds": time.process_time() - self._cpu_started,
+            "stages": stages,
+        }
+
+
+def make_profiler(enabled: bool) -> ScanProfiler | NullProfiler:
+    return ScanProfiler() if enabled else NULL_PROFILER
+
+
+PROFILE_COLUMNS = (
+    "Stage", "Count", "Wall s", "CPU s", "p50 ms", "p95 ms", "p99 ms", "Max ms", "MB", "MB/s"
+)
+
+
+def profile_rows(report: dict) -> list[tuple[str, ...]]:
+    """Rows for PROFILE_COLUMNS, formatted for display."""
+    rows = []
+    for name, s in report["stages"].items():
+        rows.append(
+            (
+                name,
+                str(s["count"]),
+                f"{s['wall_total']:.2f}",
+                f"{s['cpu_total']:.2f}",
+                f"{s['wall_p50'] * 1000:.2f}",
+                f"{s['wall_p95'] * 1000:.2f}",
+                f"{s['wall_p99'] * 1000:.2f}",
+                f"{s['wall_max'] * 1000:.2f}",
+                f"{s['bytes'] / 1e6:.1f}" if s["bytes"] else "",
+                f"{s['mb_per_s']:.1f}" if s["bytes"] else "",
+            )
+        )
+    return rows
+
+
+def format_profile(report: dict) -> str:
+    """Plain-text table of a report, for logs and terminals."""
+    rows = [PROFILE_COLUMNS] + profile_rows(report)
+    widths = [max(len(r[i]) for r in rows) for i in range(len(PROFILE_COLUMNS))]
+    lines = [
+        "  ".join(
+            cell.ljust(w) if i == 0 else cell.rjust(w)
+            for i, (cell, w) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    ]
+    lines.append(
+        f"total: {report['wall_seconds']:.2f} s wall, "
+        f"{report['cpu_seconds']:.2f} s CPU (main process)"
+    )
+    return "\n".join(lines)
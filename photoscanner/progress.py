@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import dataclasses
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+# Default seconds between progress callbacks (10 Hz).
+DEFAULT_PROGRESS_INTERVAL = 0.1
+# Throughput is measured over this many trailing seconds.
+RATE_WINDOW = 5.0
+# A snapshot is sent at least this often even if no file finished, so a
+# stalled stage still shows up in the queue depths.
+HEARTBEAT_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class ScanProgress:
+    """Snapshot of a running scan, delivered at most every progress interval."""
+
+    # Files found by the walk, including unchanged ones that need no work.
+    scanned: int
+    indexed: int
+    skipped: int
+    # Files sent through the pipeline, and how many of those have finished.
+    queued: int
+    done: int
+    bytes_done: int
+    elapsed: float
+    files_per_s: float
+    mb_per_s: float
+    # Seconds until the queued work is done; None while the walk is still
+    # discovering files.
+    eta: Optional[float]
+    walk_done: bool
+    # Items completed per stage ("list" counts directories) and items waiting
+    # in front of each pipeline stage.
+    stages: dict[str, int] = field(default_factory=dict)
+    queues: dict[str, int] = field(default_factory=dict)
+    # Last file that finished.
+    path: str = ""
+
+
+class ProgressTracker:
+    """Counts scan events and reports them as ScanProgress at a bounded rate.
+
+    Counters are updated from the walk, the stage threads and the writer; a
+    reporter thread turns them into one callback per ``interval`` when
+    something changed (else every HEARTBEAT_INTERVAL), plus a final one on
+    exit. The callback therefore runs on the reporter thread, or on the
+    scan's thread for the final snapshot. Without a callback no thread is
+    started and only the counters are kept.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[ScanProgress], None]] = None,
+        interval: float = DEFAULT_PROGRESS_INTERVAL,
+    ) -> None:
+        self._callback = callback
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = time.monotonic()
+        self._scanned = 0
+        self._indexed = 0
+        self._skipped = 0
+        self._queued = 0
+        self._queued_bytes = 0
+        self._done = 0
+        self._bytes_done = 0
+        self._walk_done = False
+        self._stages: dict[str, int] = {}
+        self._path = ""
+        self._version = 0
+        self._reported_version = -1
+        self._samples: deque[tuple[float, int, int]] = deque([(self._started, 0, 0)])
+        self.queue_depths: Optional[Callable[[], dict[str, int]]] = None
+
+    def __enter__(self) -> "ProgressTracker":
+        if self._callback is not None:
+            self._thread = threading.Thread(target=self._run, name="scan-progress", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._callback is not None and exc[0] is None:
+            self._callback(self.snapshot())
+
+    def dir_listed(self) -> None:
+        self.stage_done("list")
+
+    def file_seen(self) -> None:
+        with self._lock:
+            self._scanned += 1
+            self._version += 1
+
+    def file_queued(self, size: int) -> None:
+        with self._lock:
+            self._queued += 1
+            self._queued_bytes += size
+            self._version += 1
+
+    def stage_done(self, stage: str) -> None:
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0) + 1
+            self._version += 1
+
+    def file_done(self, path: str, size: int, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._indexed += 1
+            else:
+                self._skipped += 1
+            self._done += 1
+            self._bytes_done += size
+            self._stages["write"] = self._stages.get("write", 0) + 1
+            self._path = path
+            self._version += 1
+
+    def file_redone(self, path: str, size: int) -> None:
+        """A file processed a second time (e.g. the use_previews confirm pass):
+        counts as work done, but not again as indexed or skipped."""
+        with self._lock:
+            self._done += 1
+            self._bytes_done += size
+            self._stages["write"] = self._stages.get("write", 0) + 1
+            self._path = path
+            self._version += 1
+
+    def walk_finished(self) -> None:
+        with self._lock:
+            self._walk_done = True
+            self._version += 1
+
+    def snapshot(self) -> ScanProgress:
+        now = time.monotonic()
+        with self._lock:
+            done, bytes_done = self._done, self._bytes_done
+            remaining_files = self._queued - done
+            remaining_bytes = self._queued_bytes - bytes_done
+            samples = self._samples
+            samples.append((now, done, bytes_done))
+            while len(samples) > 2 and now - samples[1][0] >= RATE_WINDOW:
+                samples.popleft()
+            t0, done0, bytes0 = samples[0]
+            span = now - t0
+            files_per_s = (done - done0) / span if span > 0 else 0.0
+            bytes_per_s = (bytes_done - bytes0) / span if span > 0 else 0.0
+            eta: Optional[float] = None
+            if self._walk_done:
+                if remaining_files <= 0:
+                    eta = 0.0
+                elif bytes_per_s > 0 and remaining_bytes > 0:
+                    eta = remaining_bytes / bytes_per_s
+                elif files_per_s > 0:
+                    eta = remaining_files / files_per_s
+            progress = ScanProgress(
+                scanned=self._scanned,
+                indexed=self._indexed,
+                skipped=self._skipped,
+                queued=self._queued,
+                done=done,
+                bytes_done=bytes_done,
+                elapsed=now - self._started,
+                files_per_s=files_per_s,
+                mb_per_s=bytes_per_s / 1e6,
+                eta=eta,
+                walk_done=self._walk_done,
+                stages=dict(self._stages),
+                path=self._path,
+            )
+        depths = self.queue_depths
+        if depths is not None:
+            try:
+                progress = dataclasses.replace(progress, queues=depths())
+            except Exception:
+                pass
+        return progress
+
+    def _run(self) -> None:
+        last = 0.0
+        while not self._stop.wait(self._interval):
+            with self._lock:
+                changed = self._version != self._reported_version
+                self._reported_version = self._version
+            now = time.monotonic()
+            if changed or now - last >= HEARTBEAT_INTERVAL:
+                last = now
+                self._callback(self.snapshot())
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    seconds = int(round(seconds))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
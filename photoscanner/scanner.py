@@ -1,20 +1,81 @@
 from __future__ import annotations
 
+import dataclasses
 import hashlib
+import io
+import json
+import mmap
 import os
+import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+
+from photoscanner.db import (
+    PARTIAL_HASH_PREFIX,
+    BadFile,
+    ContentIndex,
+    DirCacheEntry,
+    ImageRecord,
+    ImageWriter,
+    IndexedFile,
+    PhotoDB,
+    dumps_json,
+    path_prefix_bounds,
+)
+from photoscanner.pipeline import ByteBudget, Pipeline, Stage
+from photoscanner.previews import RAW_EXTS, exif_thumbnail, is_raw_path, raw_preview
+from photoscanner.profiling import (
+    NULL_PROFILER,
+    NullProfiler,
+    ScanProfiler,
+    TimingLog,
+    make_profiler,
+)
+from photoscanner.progress import DEFAULT_PROGRESS_INTERVAL, ProgressTracker, ScanProgress
+from photoscanner.walker import FileEntry, iter_dir_listings, iter_file_entries
 
-import cv2
-import numpy as np
-from PIL import Image
-import imagehash
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
 
-from photoscanner.db import ImageRecord, PhotoDB, dumps_json
+    from PIL import Image
+
+# OpenCV, numpy, PIL and photoscanner.hashing (numpy) are imported where they
+# are used, so importing this module (the CLI, the GUI, spawned workers) does
+# not pay for them up front.
 
 
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff", ".heic", ".heif"}
+# Everything the scanner indexes: images PIL decodes directly, plus RAW files,
+# which are hashed from their embedded JPEG preview.
+SCAN_EXTS = IMAGE_EXTS | RAW_EXTS
+
+# Files up to this size are read into memory in one call; larger ones (big TIFFs,
+# panoramas) are memory-mapped so the raw buffer never has to fit in RAM.
+BULK_READ_LIMIT = 64 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Longest edge of the working image in fast-decode mode; pHash only looks at a
+# 32x32 thumbnail.
+FAST_DECODE_SIZE = 512
+# Sharpness is measured with the longest edge scaled to this size, whatever
+# the decode mode or the original's resolution, so that scores stored by fast
+# and full scans and for a 12 MP and a 50 MP copy are comparable.
+SHARPNESS_SIZE = 512
+
+# Exact-only scans store "partial:<hex>" in the sha256 column for files whose
+# (size, head, tail) fingerprint is unique, since no byte-identical copy can
+# exist. The key never collides with a real hex digest, so SHA-256 grouping
+# is unaffected. A later normal scan replaces it with the full digest.
+# PARTIAL_HASH_PREFIX itself lives in photoscanner.db, which stores the keys.
+PARTIAL_HASH_BLOCK = 64 * 1024
+
+# use_previews: only files at least this large are hashed from their EXIF
+# thumbnail (below it a fast decode is cheap anyway), and preview hashes within
+# this many bits of another image make the file a near-duplicate candidate.
+PREVIEW_MIN_FILE_SIZE = 2 * 1024 * 1024
+PREVIEW_CANDIDATE_THRESHOLD = 10
 
 
 @dataclass(frozen=True)
@@ -22,6 +83,54 @@ class ScanOptions:
     compute_embeddings: bool = False
     detect_faces: bool = False
     detect_objects: bool = False
+    # Skip files whose size and mtime match the indexed row (and which already
+    # carry the requested AI features) instead of re-processing them.
+    incremental: bool = False
+    # Number of processes used for decoding/hashing (the CPU stage). 1 keeps
+    # everything in-process.
+    workers: int = 1
+    # Decode at reduced resolution (JPEG DCT scaling via PIL draft()) for pHash
+    # and sharpness. Width/height still come from the full-size header.
+    fast_decode: bool = False
+    # Only find byte-identical copies: no decoding, and the full SHA-256 is only
+    # computed when file size and a head/tail partial hash collide. Rows are
+    # written without pHash/dimensions and are completed by a later normal scan.
+    exact_only: bool = False
+    # Threads listing directories concurrently (helps on network shares).
+    walk_threads: int = 4
+    # Pipeline tuning: reader threads, AI batching/threads, queue length between
+    # stages and the cap on file bytes held in memory between read and decode.
+    io_threads: int = 4
+    ai_workers: int = 1
+    ai_batch_size: int = 16
+    queue_size: int = 32
+    read_buffer_bytes: int = 256 * 1024 * 1024
+    # DB writer batching: flush after this many rows or seconds, whichever first.
+    commit_size: int = 500
+    commit_interval: float = 2.0
+    # Hash large JPEGs from their embedded EXIF thumbnail instead of decoding
+    # them. After the scan, files whose thumbnail hash is close to another
+    # image's are fully decoded to confirm; the rest keep the preview-based
+    # features until a scan without this option.
+    use_previews: bool = False
+    # Incremental scans skip listing directories whose mtime is unchanged since
+    # the last scan (edits in place that keep the directory mtime are missed).
+    # deep=True lists every directory, e.g. when directory mtimes are unreliable.
+    deep: bool = False
+    # Record per-stage wall/CPU time histograms and bytes read; the summary is
+    # returned as ScanResult.profile (see photoscanner.profiling).
+    profile: bool = False
+    # Re-process files recorded as bad (see PhotoDB.get_bad_files) even if they
+    # are unchanged since they failed.
+    retry_bad: bool = False
+    # Copy the features of an already indexed file with the same SHA-256
+    # (pHash family, dimensions, score, embedding, detections) instead of
+    # decoding the file again; AI results the copy lacks are still computed.
+    reuse_features: bool = True
+    # Recognise files that were moved or renamed (a vanished row with the same
+    # size, mtime and file name, confirmed by the partial hash) and move their
+    # rows to the new path instead of indexing them as new files.
+    detect_moves: bool = True
 
 
 @dataclass(frozen=True)
@@ -29,18 +138,62 @@ class ScanResult:
     scanned: int
     indexed: int
     skipped: int
+    # Per-run classification against the index, regardless of incremental mode.
+    new: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    vanished: int = 0
+    # Unchanged files not processed because an earlier scan failed on them;
+    # they are not counted as skipped.
+    known_bad: int = 0
+    # Files whose features were copied from indexed content with the same
+    # SHA-256 (see ScanOptions.reuse_features); included in indexed.
+    reused: int = 0
+    # Rows moved to a new path (ScanOptions.detect_moves); these files are not
+    # counted as new, nor their old paths as vanished.
+    moved: int = 0
+    # True when the scan continued from a checkpoint left by an interrupted run.
+    resumed: bool = False
+    # ScanProfiler.report() when ScanOptions.profile was set.
+    profile: Optional[dict] = None
+
+
+# Options that only affect speed, not what gets written; they are left out of
+# the checkpoint hash so a scan can be resumed with different tuning.
+_TUNING_OPTIONS = {
+    "workers",
+    "walk_threads",
+    "io_threads",
+    "ai_workers",
+    "ai_batch_size",
+    "queue_size",
+    "read_buffer_bytes",
+    "commit_size",
+    "commit_interval",
+    "profile",
+    "reuse_features",
+    "detect_moves",
+}
+
+
+def options_to_json(options: ScanOptions) -> str:
+    return dumps_json(dataclasses.asdict(options))
+
+
+def options_from_json(value: str) -> ScanOptions:
+    """Inverse of options_to_json(); unknown keys (from other versions) are ignored."""
+    names = {f.name for f in dataclasses.fields(ScanOptions)}
+    return ScanOptions(**{k: v for k, v in json.loads(value).items() if k in names})
+
+
+def options_hash(options: ScanOptions) -> str:
+    relevant = {k: v for k, v in dataclasses.asdict(options).items() if k not in _TUNING_OPTIONS}
+    return hashlib.sha1(dumps_json(relevant).encode("utf-8")).hexdigest()
 
 
 def iter_image_files(folders: Iterable[Path]) -> Iterable[Path]:
-    for folder in folders:
-        folder = Path(folder)
-        if not folder.exists():
-            continue
-        for root, _dirs, files in os.walk(folder):
-            for name in files:
-                p = Path(root) / name
-                if p.suffix.lower() in IMAGE_EXTS:
-                    yield p
+    for entry in iter_file_entries(folders, SCAN_EXTS):
+        yield Path(entry.path)
 
 
 def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
@@ -54,6 +207,43 @@ def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
     return h.hexdigest()
 
 
+def sha256_buffer(buf: bytes | mmap.mmap, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    h = hashlib.sha256()
+    with memoryview(buf) as view:
+        for start in range(0, len(view), chunk_size):
+            h.update(view[start : start + chunk_size])
+    return h.hexdigest()
+
+
+def partial_hash(path: Path, file_size: int, block: int = PARTIAL_HASH_BLOCK) -> str:
+    """Cheap fingerprint of the first and last ``block`` bytes plus the file size."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(file_size.to_bytes(8, "little"))
+    with path.open("rb") as f:
+        h.update(f.read(block))
+        if file_size > block:
+            f.seek(max(block, file_size - block))
+            h.update(f.read(block))
+    return PARTIAL_HASH_PREFIX + h.hexdigest()
+
+
+def partial_hash_buffer(buf: bytes | mmap.mmap, block: int = PARTIAL_HASH_BLOCK) -> str:
+    """partial_hash() of a file already in memory."""
+    size = len(buf)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(size.to_bytes(8, "little"))
+    with memoryview(buf) as view:
+        h.update(view[:block])
+        if size > block:
+            start = max(block, size - block)
+            h.update(view[start : start + block])
+    return PARTIAL_HASH_PREFIX + h.hexdigest()
+
+
+def is_full_sha256(value: str) -> bool:
+    return not value.startswith(PARTIAL_HASH_PREFIX)
+
+
 def image_quality_score(width: int, height: int, file_size: int, sharpness: float) -> float:
     # Spec requirement: "best" can be based on size or resolution.
     # Keep it simple + stable; sharpness helps choose between same-res copies.
@@ -67,6 +257,9 @@ def laplacian_sharpness(img: Image.Image) -> float:
     Uses OpenCV/Numpy if available for speed (100x faster than pure Python).
     """
     try:
+        import cv2
+        import numpy as np
+
         # Convert PIL image to numpy array (RGB)
         # Note: we need grayscale
         if img.mode != 'L':
@@ -91,7 +284,846 @@ def laplacian_sharpness(img: Image.Image) -> float:
         return 0.0
 
 
-import threading
+def load_working_image(img: Image.Image, fast: bool) -> Image.Image:
+    """Load ``img`` for feature extraction, optionally at reduced resolution.
+
+    In fast mode JPEGs are decoded with DCT-domain scaling (1/2..1/8) via
+    ``draft()``, then everything is downscaled so the longest edge is
+    FAST_DECODE_SIZE. Images already smaller than that are left as-is.
+    """
+    from PIL import Image
+
+    if not fast:
+        img.load()
+        return img
+
+    w, h = img.size
+    scale = FAST_DECODE_SIZE / max(w, h, 1)
+    if scale < 1.0:
+        # Ask for the fitted size so draft() may pick the coarsest DCT scale that
+        # still covers it in both dimensions.
+        img.draft(None, (max(1, int(w * scale)), max(1, int(h * scale))))
+    img.load()
+    if max(img.size) > FAST_DECODE_SIZE:
+        img.thumbnail((FAST_DECODE_SIZE, FAST_DECODE_SIZE), Image.Resampling.BILINEAR)
+    return img
+
+
+def sharpness_input(img: Image.Image) -> Image.Image:
+    """``img`` in grayscale, scaled (up or down) to SHARPNESS_SIZE on its longest edge."""
+    from PIL import Image
+
+    gray = img.convert("L")
+    w, h = gray.size
+    scale = SHARPNESS_SIZE / max(w, h, 1)
+    if scale == 1.0:
+        return gray
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return gray.resize(size, Image.Resampling.BILINEAR)
+
+
+# EXIF orientation tag value -> PIL Image.Transpose member that displays the
+# image upright.
+_ORIENTATION_TRANSPOSE = {
+    2: "FLIP_LEFT_RIGHT",
+    3: "ROTATE_180",
+    4: "FLIP_TOP_BOTTOM",
+    5: "TRANSPOSE",
+    6: "ROTATE_270",
+    7: "TRANSVERSE",
+    8: "ROTATE_90",
+}
+
+
+def exif_orientation(img: Image.Image) -> int:
+    """EXIF orientation tag (1-8), 1 if absent or unreadable."""
+    try:
+        return int(img.getexif().get(0x0112, 1))
+    except Exception:
+        return 1
+
+
+def orientation_transpose(orientation: int) -> Optional[Image.Transpose]:
+    """The transpose that displays an image with EXIF ``orientation`` upright, None for none."""
+    from PIL import Image
+
+    method = _ORIENTATION_TRANSPOSE.get(orientation)
+    return getattr(Image.Transpose, method) if method is not None else None
+
+
+def is_up_to_date(prev: IndexedFile, file_size: int, mtime_ns: int, options: ScanOptions) -> bool:
+    """True when an indexed row still matches the file on disk and has the requested features."""
+    if prev.file_size != file_size or prev.mtime_ns != mtime_ns:
+        return False
+    if options.exact_only:
+        return True
+    if not prev.decoded:
+        return False
+    if prev.from_preview and not options.use_previews:
+        return False
+    if is_raw_path(prev.path):
+        # The AI models cannot open RAW files, so these are never filled in.
+        return True
+    if options.compute_embeddings and not prev.has_embedding:
+        return False
+    if options.detect_faces and not prev.has_faces:
+        return False
+    if options.detect_objects and not prev.has_objects:
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class ImageFeatures:
+    """CPU-bound per-file features, computed in a worker process."""
+
+    width: int
+    height: int
+    phash: str
+    sharpness: float
+    sha256: str
+    dhash: Optional[int] = None
+    ahash: Optional[int] = None
+    whash: Optional[int] = None
+    chash: Optional[int] = None
+    rhash: Optional[int] = None
+    # Hashes and sharpness came from the embedded EXIF thumbnail (use_previews).
+    from_preview: bool = False
+    partial_hash: Optional[str] = None
+    # TimingLog entries when ScanOptions.profile is set.
+    timings: Optional[tuple[tuple[str, float, float, int], ...]] = None
+    # The 32x32 phash_input() array of an extraction with ``batch_phash``,
+    # whose phash and rhash are left to the caller.
+    phash_input: Optional[bytes] = None
+
+
+def read_file(path: str) -> bytes | mmap.mmap:
+    """Read a file in one go, or memory-map it if it exceeds BULK_READ_LIMIT."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= BULK_READ_LIMIT:
+            return f.read()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _working_image(
+    img: Image.Image, options: ScanOptions, file_size: int
+) -> tuple[Image.Image, bool]:
+    """The reduced image features are computed on, and whether it is the EXIF thumbnail."""
+    from PIL import Image
+
+    if options.use_previews and file_size >= PREVIEW_MIN_FILE_SIZE:
+        thumb = exif_thumbnail(img.info.get("exif"))
+        if thumb is not None:
+            try:
+                with Image.open(io.BytesIO(thumb)) as t:
+                    t.load()
+                    return t.copy(), True
+            except Exception:
+                pass
+    return load_working_image(img, options.fast_decode), False
+
+
+def extract_features_from_buffer(
+    buf: bytes | mmap.mmap,
+    options: ScanOptions,
+    raw: bool = False,
+    sha256: Optional[str] = None,
+    batch_phash: bool = False,
+) -> ImageFeatures:
+    """Hash and decode an in-memory file. Top-level so it can run in a process pool.
+
+    The same buffer feeds both the SHA-256 digest and the decoder; pass
+    ``sha256`` if the caller already has it. For RAW files (``raw=True``) the
+    features come from the embedded JPEG preview, width and height included:
+    those are the preview's, which is the full image size for most cameras
+    but smaller than the sensor for some. With ``batch_phash`` the
+    phash is "" and rhash None; the caller computes them for many files at
+    once from ``phash_input`` (see hash_phash_inputs()).
+    """
+    from PIL import Image
+
+    from photoscanner.hashing import compute_hashes, phash_to_hex
+
+    log = TimingLog() if options.profile else NULL_PROFILER
+    sha = sha256
+    if sha is None:
+        with log.measure("sha256", len(buf)):
+            sha = sha256_buffer(buf)
+    preview_orientation = 1
+    if raw:
+        with log.measure("preview"):
+            preview = raw_preview(buf)
+        if preview is None:
+            raise ValueError("RAW file has no embedded JPEG preview")
+        src = io.BytesIO(preview.data)
+        preview_orientation = preview.orientation
+    else:
+        # BytesIO shares the bytes object rather than copying it; an mmap is
+        # already a seekable file-like object.
+        src = io.BytesIO(buf) if isinstance(buf, bytes) else buf
+    with Image.open(src) as img:
+        with log.measure("decode"):
+            # Header size, before draft() shrinks it.
+            width, height = img.size
+            orientation = exif_orientation(img)
+            if orientation == 1:
+                # RAW previews usually leave the orientation to the RAW container.
+                orientation = preview_orientation
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            work, from_preview = _working_image(img, options, len(buf))
+        with log.measure("phash"):
+            # Hash the image the way it is displayed. The transpose is applied
+            # to the 32x32 downsample, not to the full-resolution decode.
+            transpose = orientation_transpose(orientation)
+            hashes = compute_hashes(work, transpose, with_phash=not batch_phash)
+        with log.measure("sharpness"):
+            # Laplacian variance is the same for every orientation.
+            sharp = laplacian_sharpness(sharpness_input(work))
+
+    return ImageFeatures(
+        width=int(width),
+        height=int(height),
+        phash="" if batch_phash else phash_to_hex(hashes.phash),
+        sharpness=float(sharp),
+        sha256=sha,
+        dhash=hashes.dhash,
+        ahash=hashes.ahash,
+        whash=hashes.whash,
+        chash=hashes.chash,
+        rhash=None if batch_phash else hashes.rhash,
+        from_preview=from_preview,
+        partial_hash=partial_hash_buffer(buf),
+        timings=tuple(log.entries) if log.enabled else None,
+        phash_input=hashes.pixels.tobytes() if batch_phash else None,
+    )
+
+
+def extract_features(path: str, options: ScanOptions, batch_phash: bool = False) -> ImageFeatures:
+    """Read, hash and decode one file, touching the disk once.
+
+    ``batch_phash`` is as for extract_features_from_buffer().
+    """
+    log = TimingLog() if options.profile else NULL_PROFILER
+    # A memory-mapped file is really read while it is hashed; this only
+    # accounts its bytes.
+    with log.measure("read") as m:
+        buf = read_file(path)
+        m.nbytes = len(buf)
+    try:
+        feats = extract_features_from_buffer(
+            buf, options, raw=is_raw_path(path), batch_phash=batch_phash
+        )
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+    if log.enabled:
+        feats = dataclasses.replace(feats, timings=tuple(log.entries) + (feats.timings or ()))
+    return feats
+
+
+def hash_phash_inputs(features: list[ImageFeatures]) -> list[ImageFeatures]:
+    """Fill in phash and rhash of ``batch_phash`` extractions, with one
+    vectorized call per hash for the whole list."""
+    import numpy as np
+
+    from photoscanner.hashing import (
+        PHASH_INPUT_SIZE,
+        canonical_phash_batch,
+        phash_batch,
+        phash_to_hex,
+    )
+
+    stack = np.frombuffer(b"".join(f.phash_input for f in features), dtype=np.uint8)
+    stack = stack.reshape(-1, PHASH_INPUT_SIZE, PHASH_INPUT_SIZE)
+    phashes = phash_batch(stack)
+    rhashes = canonical_phash_batch(stack)
+    return [
+        dataclasses.replace(f, phash=phash_to_hex(int(p)), rhash=int(r), phash_input=None)
+        for f, p, r in zip(features, phashes, rhashes)
+    ]
+
+
+@dataclass
+class _ScanItem:
+    """A file travelling through the scan pipeline, accumulating its results."""
+
+    entry: FileEntry
+    # File contents from the read stage; None for memory-mapped (large) files,
+    # which the CPU stage maps itself.
+    data: Optional[bytes] = None
+    features: Optional[ImageFeatures] = None
+    embedding: Optional[bytes] = None
+    faces_json: Optional[str] = None
+    objects_json: Optional[str] = None
+    # Indexed row with the same content whose features are copied instead of
+    # ``features`` (ScanOptions.reuse_features).
+    reused: Optional[ImageRecord] = None
+    error: Optional[Exception] = None
+    # ``error`` came from decoding the file and is recorded as bad; failures of
+    # the other stages (reading, AI) are taken as transient.
+    bad: bool = False
+
+
+class _ScanStages:
+    """Stage functions of the scan pipeline: read -> cpu -> phash -> ai.
+
+    Each stage records failures on the item instead of raising, so one bad
+    file never stops the pipeline; the writer counts it as skipped.
+
+    With a ``content`` index, the cpu stage hashes in-memory files first and
+    takes the features of indexed content with the same digest rather than
+    decoding; the ai stage then only computes what that row lacks.
+    """
+
+    def __init__(
+        self,
+        options: ScanOptions,
+        embedding_model: Optional[object],
+        detector: Optional[object],
+        pool: Optional[ProcessPoolExecutor],
+        budget: ByteBudget,
+        profiler: ScanProfiler | NullProfiler = NULL_PROFILER,
+        tracker: Optional[ProgressTracker] = None,
+        content: Optional[ContentIndex] = None,
+    ) -> None:
+        self._options = options
+        self._embedding_model = embedding_model
+        self._detector = detector
+        self._pool = pool
+        self._budget = budget
+        self._profiler = profiler
+        self._tracker = tracker or ProgressTracker()
+        self._content = content
+        self.stop: Optional[threading.Event] = None
+
+    @property
+    def needs_ai(self) -> bool:
+        o = self._options
+        return (o.compute_embeddings and self._embedding_model is not None) or (
+            (o.detect_faces or o.detect_objects) and self._detector is not None
+        )
+
+    def read(self, item: _ScanItem) -> _ScanItem:
+        size = item.entry.size
+        if size > BULK_READ_LIMIT:
+            return item
+        if not self._budget.acquire(size, self.stop):
+            item.error = RuntimeError("scan stopped")
+            return item
+        try:
+            with self._profiler.measure("read", size), open(item.entry.path, "rb") as f:
+                item.data = f.read()
+        except Exception as e:
+            self._budget.release(size)
+            item.error = e
+        self._tracker.stage_done("read")
+        return item
+
+    def cpu(self, item: _ScanItem) -> _ScanItem:
+        if item.error is not None:
+            return item
+        data = item.data
+        try:
+            if data is not None:
+                sha = None
+                if self._content is not None:
+                    # Large (memory-mapped) files are left out: the lookup
+                    # would cost them a second read whenever it misses.
+                    with self._profiler.measure("sha256", len(data)):
+                        sha = sha256_buffer(data)
+                    with self._profiler.measure("lookup"):
+                        donor = self._content.find(
+                            sha, item.entry.path, allow_preview=self._options.use_previews
+                        )
+                    if donor is not None:
+                        item.reused = donor
+                        item.embedding = donor.embedding
+                        item.faces_json = donor.faces_json
+                        item.objects_json = donor.objects_json
+                        return item
+                raw = is_raw_path(item.entry.path)
+                fn, args = extract_features_from_buffer, (data, self._options, raw, sha, True)
+            else:
+                fn, args = extract_features, (item.entry.path, self._options, True)
+            # Includes the round trip to the worker process, if any.
+            with self._profiler.measure("extract"):
+                try:
+                    if self._pool is not None:
+                        item.features = self._pool.submit(fn, *args).result()
+                    else:
+                        item.features = fn(*args)
+                except Exception as e:
+                    item.bad = _is_decode_error(e)
+                    raise
+            self._profiler.record_all(item.features.timings)
+        except Exception as e:
+            item.error = e
+        finally:
+            if data is not None:
+                item.data = None
+                self._budget.release(item.entry.size)
+            self._tracker.stage_done("cpu")
+        return item
+
+    def phash(self, batch: list[_ScanItem]) -> list[_ScanItem]:
+        # The cpu stage leaves the pHash families out (batch_phash) so that
+        # they are computed here with one vectorized call per batch.
+        todo = [
+            it
+            for it in batch
+            if it.error is None and it.features is not None and it.features.phash_input
+        ]
+        if todo:
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                for it, feats in zip(todo, hash_phash_inputs([it.features for it in todo])):
+                    it.features = feats
+            except Exception as e:
+                for it in todo:
+                    it.error = e
+                    it.bad = _is_decode_error(e)
+            if self._profiler.enabled:
+                n = len(todo)
+                wall = (time.perf_counter() - wall) / n
+                cpu = (time.thread_time() - cpu) / n
+                self._profiler.record("phash_batch", wall, cpu, count=n)
+        for _ in batch:
+            self._tracker.stage_done("phash")
+        return batch
+
+    def ai(self, batch: list[_ScanItem]) -> list[_ScanItem]:
+        o = self._options
+        # The models open files themselves and cannot read RAW formats.
+        ok = [it for it in batch if it.error is None and not is_raw_path(it.entry.path)]
+        # Files with reused features may already carry an embedding.
+        embed = [it for it in ok if it.embedding is None]
+
+        if embed and o.compute_embeddings and self._embedding_model is not None:
+            paths = [Path(it.entry.path) for it in embed]
+            try:
+                wall = time.perf_counter()
+                cpu = time.thread_time()
+                if hasattr(self._embedding_model, "embed_files"):
+                    vecs = self._embedding_model.embed_files(paths)
+                else:
+                    vecs = [self._embedding_model.embed_file(p) for p in paths]
+                for it, vec in zip(embed, vecs):
+                    it.embedding = vec
+                if self._profiler.enabled:
+                    # A batch is charged evenly to its files.
+                    n = len(paths)
+                    self._profiler.record(
+                        "embed",
+                        (time.perf_counter() - wall) / n,
+                        (time.thread_time() - cpu) / n,
+                        count=n,
+                    )
+            except Exception:
+                # Fall back to one at a time so a single bad file only fails itself.
+                for it, p in zip(embed, paths):
+                    try:
+                        with self._profiler.measure("embed"):
+                            it.embedding = self._embedding_model.embed_file(p)
+                    except Exception as e:
+                        it.error = e
+
+        if (o.detect_faces or o.detect_objects) and self._detector is not None:
+            for it in ok:
+                if it.error is not None:
+                    continue
+                if (not o.detect_faces or it.faces_json is not None) and (
+                    not o.detect_objects or it.objects_json is not None
+                ):
+                    # Everything requested came with the reused features.
+                    continue
+                try:
+                    with self._profiler.measure("detect"):
+                        det = self._detector.analyze_file(
+                            Path(it.entry.path), faces=o.detect_faces, objects=o.detect_objects
+                        )
+                    if det.get("faces") is not None:
+                        it.faces_json = dumps_json(det.get("faces"))
+                    if det.get("objects") is not None:
+                        it.objects_json = dumps_json(det.get("objects"))
+                except Exception as e:
+                    it.error = e
+
+        for _ in batch:
+            self._tracker.stage_done("ai")
+        return batch
+
+
+def _iter_exact_only(
+    db: PhotoDB,
+    pending: list[FileEntry],
+    profiler: ScanProfiler | NullProfiler = NULL_PROFILER,
+) -> Iterable[_ScanItem]:
+    """Size -> partial hash -> SHA-256 cascade for exact-only scans.
+
+    Indexed rows of the same size take part in the comparison, so a new file
+    that matches an earlier exact-only row upgrades that row to its full digest.
+    """
+    by_size: dict[int, list[FileEntry]] = {}
+    for entry in pending:
+        by_size.setdefault(entry.size, []).append(entry)
+
+    pending_paths = {entry.path for entry in pending}
+    indexed = db.get_sha256_by_file_size(by_size)
+
+    def hashed(entry: FileEntry, sha: Optional[str] = None, key: Optional[str] = None) -> _ScanItem:
+        try:
+            if sha is None:
+                with profiler.measure("sha256", entry.size):
+                    sha = sha256_file(Path(entry.path))
+        except Exception as e:
+            return _ScanItem(entry, error=e)
+        return _ScanItem(
+            entry,
+            features=ImageFeatures(
+                width=0, height=0, phash="", sharpness=0.0, sha256=sha, partial_hash=key
+            ),
+        )
+
+    for size, entries in by_size.items():
+        peers = [(p, sha) for p, sha in indexed.get(size, []) if p not in pending_paths]
+
+        keys: dict[str, list[FileEntry]] = {}
+        for entry in entries:
+            # The partial hash would read the whole file anyway.
+            if size <= 2 * PARTIAL_HASH_BLOCK:
+                yield hashed(entry)
+                continue
+            try:
+                with profiler.measure("partial_hash", min(size, 2 * PARTIAL_HASH_BLOCK)):
+                    key = partial_hash(Path(entry.path), size)
+                keys.setdefault(key, []).append(entry)
+            except Exception as e:
+                yield _ScanItem(entry, error=e)
+
+        peer_keys: dict[str, list[tuple[str, str]]] = {}
+        for p, sha in peers:
+            if not is_full_sha256(sha):
+                peer_keys.setdefault(sha, []).append((p, sha))
+            elif keys:
+                try:
+                    peer_keys.setdefault(partial_hash(Path(p), size), []).append((p, sha))
+                except OSError:
+                    continue
+
+        for key, group in keys.items():
+            colliding = peer_keys.get(key, [])
+            if len(group) == 1 and not colliding:
+                yield hashed(group[0], key, key)
+                continue
+            for entry in group:
+                yield hashed(entry, key=key)
+            for p, sha in colliding:
+                if not is_full_sha256(sha):
+                    try:
+                        db.update_image_sha256(p, sha256_file(Path(p)))
+                    except OSError:
+                        continue
+
+
+class _DirTracker:
+    """Tracks when every file of a directory has reached the writer.
+
+    The walk side calls add() per file sent into the pipeline and listed() once
+    a directory's files have all been sent; the writer calls finished() per
+    file. Completed directories are collected for drain().
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: dict[str, int] = {}
+        self._listed: set[str] = set()
+        self._done: list[str] = []
+
+    def add(self, directory: str) -> None:
+        with self._lock:
+            self._pending[directory] = self._pending.get(directory, 0) + 1
+
+    def listed(self, directory: str) -> None:
+        with self._lock:
+            if self._pending.get(directory, 0) == 0:
+                self._pending.pop(directory, None)
+                self._done.append(directory)
+            else:
+                self._listed.add(directory)
+
+    def finished(self, directory: str) -> None:
+        with self._lock:
+            n = self._pending[directory] - 1
+            if n > 0:
+                self._pending[directory] = n
+                return
+            del self._pending[directory]
+            if directory in self._listed:
+                self._listed.discard(directory)
+                self._done.append(directory)
+
+    def drain(self) -> list[str]:
+        with self._lock:
+            done, self._done = self._done, []
+        return done
+
+
+# Failures that say nothing about the file itself: running out of memory, and
+# RuntimeError, which covers a stopped scan, a broken worker pool and
+# model/device errors.
+_TRANSIENT_ERRORS = (MemoryError, RuntimeError)
+
+
+def _is_decode_error(error: Exception) -> bool:
+    """Whether a feature extraction failure is down to the file's contents.
+
+    Only these are recorded as bad. I/O errors carry an errno (ENOENT, EACCES,
+    and EIO/ESTALE/ETIMEDOUT from a NAS or USB disk going away) and are tried
+    again by the next scan; PIL reports undecodable data as OSError without
+    one.
+    """
+    if isinstance(error, _TRANSIENT_ERRORS + (TimeoutError, ConnectionError)):
+        return False
+    if isinstance(error, OSError):
+        return error.errno is None
+    return True
+
+
+def _bad_file(entry: FileEntry, error: Exception) -> BadFile:
+    return BadFile(
+        path=entry.path,
+        file_size=entry.size,
+        mtime_ns=entry.mtime_ns,
+        error_class=type(error).__name__,
+        message=str(error)[:500],
+    )
+
+
+def _same_content(
+    db: PhotoDB,
+    old_path: str,
+    entry: FileEntry,
+    profiler: ScanProfiler | NullProfiler = NULL_PROFILER,
+) -> bool:
+    """Whether ``entry`` holds the content indexed for ``old_path``: compared by
+    partial hash where the row has one, else by full SHA-256."""
+    rec = db.get_image(old_path)
+    if rec is None:
+        return False
+    path = Path(entry.path)
+    # Exact-only rows may carry the partial hash in place of the digest.
+    key = rec.partial_hash or (rec.sha256 if not is_full_sha256(rec.sha256) else None)
+    try:
+        if key is not None:
+            with profiler.measure("partial_hash", min(entry.size, 2 * PARTIAL_HASH_BLOCK)):
+                return partial_hash(path, entry.size) == key
+        with profiler.measure("sha256", entry.size):
+            return sha256_file(path) == rec.sha256
+    except OSError:
+        return False
+
+
+def _is_known_bad(bad: Optional[BadFile], entry: FileEntry) -> bool:
+    return bad is not None and bad.file_size == entry.size and bad.mtime_ns == entry.mtime_ns
+
+
+# Directories modified this recently are not cached: a change in the same
+# mtime tick (coarse on FAT/SMB) would go unnoticed.
+DIR_MTIME_SLACK_NS = 2_000_000_000
+
+
+# How long the AI stage waits for a batch to fill before running a partial one.
+AI_BATCH_WAIT = 0.05
+# Files per vectorized pHash call, and how long the phash stage waits for a
+# batch to fill. Decoding dominates, so a short wait is enough.
+PHASH_BATCH_SIZE = 64
+PHASH_BATCH_WAIT = 0.01
+
+
+def _index_entries(
+    db: PhotoDB,
+    entries: Iterable[FileEntry],
+    options: ScanOptions,
+    embedding_model: Optional[object],
+    detector: Optional[object],
+    on_item: Callable[[FileEntry, bool], None],
+    running_event: Optional[threading.Event] = None,
+    tracker: Optional[ProgressTracker] = None,
+    profiler: ScanProfiler | NullProfiler = NULL_PROFILER,
+) -> int:
+    """Extract features for ``entries`` and write them to ``db``.
+
+    The shared back half of scan_folders and index_paths. ``on_item(entry, ok)``
+    is called from this thread once per entry, after its record (if any) was
+    handed to the writer. Files that fail to decode are recorded in the
+    bad_files table (see _is_decode_error); other failures are retried by the
+    next scan. ``tracker`` receives the per-stage counts and can read the
+    pipeline's queue depths while it runs.
+
+    Returns the number of files whose features were reused from indexed
+    content with the same SHA-256.
+    """
+    pool: Optional[ProcessPoolExecutor] = None
+    pipeline: Optional[Pipeline] = None
+    content: Optional[ContentIndex] = None
+    reused = 0
+    if options.exact_only:
+        # Size grouping needs the whole candidate list before hashing starts.
+        results: Iterable[_ScanItem] = _iter_exact_only(db, list(entries), profiler)
+    else:
+        if options.workers > 1:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn avoids forking a process that has Qt / model threads running.
+            pool = ProcessPoolExecutor(
+                max_workers=options.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        if options.reuse_features:
+            content = ContentIndex(db.db_path)
+        stages = _ScanStages(
+            options,
+            embedding_model,
+            detector,
+            pool,
+            ByteBudget(options.read_buffer_bytes),
+            profiler,
+            tracker,
+            content,
+        )
+        stage_list = [
+            Stage("read", stages.read, workers=options.io_threads),
+            Stage("cpu", stages.cpu, workers=max(1, options.workers)),
+            Stage("phash", stages.phash, batch_size=PHASH_BATCH_SIZE, batch_wait=PHASH_BATCH_WAIT),
+        ]
+        if stages.needs_ai:
+            stage_list.append(
+                Stage(
+                    "ai",
+                    stages.ai,
+                    workers=options.ai_workers,
+                    batch_size=options.ai_batch_size,
+                    batch_wait=AI_BATCH_WAIT,
+                )
+            )
+        pipeline = Pipeline(
+            (_ScanItem(e) for e in entries), stage_list, queue_size=options.queue_size
+        )
+        stages.stop = pipeline.stop_event
+        results = pipeline
+        if tracker is not None:
+            tracker.queue_depths = pipeline.queue_depths
+
+    writer = ImageWriter(
+        db,
+        commit_size=options.commit_size,
+        commit_interval=options.commit_interval,
+        # Exact-only records must not blank the features of unchanged rows.
+        hashes_only=options.exact_only,
+    )
+    try:
+        with writer:
+            for item in results:
+                if running_event is not None:
+                    running_event.wait()
+
+                entry = item.entry
+                feats = item.features
+                if item.error is None and item.reused is not None:
+                    # Same bytes, so the same dimensions, hashes and score.
+                    record = dataclasses.replace(
+                        item.reused,
+                        path=entry.path,
+                        file_size=entry.size,
+                        mtime_ns=entry.mtime_ns,
+                        embedding=item.embedding,
+                        faces_json=item.faces_json,
+                        objects_json=item.objects_json,
+                    )
+                    with profiler.measure("write"):
+                        writer.add(record)
+                    reused += 1
+                    on_item(entry, True)
+                    continue
+                if item.error is not None or feats is None:
+                    if item.error is not None and item.bad:
+                        # Committed by the writer's next flush.
+                        db.add_bad_files([_bad_file(entry, item.error)])
+                    on_item(entry, False)
+                    continue
+
+                score = image_quality_score(feats.width, feats.height, entry.size, feats.sharpness)
+                record = ImageRecord(
+                    path=entry.path,
+                    sha256=feats.sha256,
+                    phash=feats.phash,
+                    width=feats.width,
+                    height=feats.height,
+                    file_size=entry.size,
+                    mtime_ns=entry.mtime_ns,
+                    score=float(score),
+                    embedding=item.embedding,
+                    faces_json=item.faces_json,
+                    objects_json=item.objects_json,
+                    dhash=feats.dhash,
+                    ahash=feats.ahash,
+                    whash=feats.whash,
+                    chash=feats.chash,
+                    rhash=feats.rhash,
+                    from_preview=feats.from_preview,
+                    partial_hash=feats.partial_hash,
+                )
+                # Most adds only buffer the row; the ones that flush a batch show up as the tail.
+                with profiler.measure("write"):
+                    writer.add(record)
+                on_item(entry, True)
+            with profiler.measure("write"):
+                writer.flush()
+    finally:
+        if tracker is not None:
+            tracker.queue_depths = None
+        if pipeline is not None:
+            # Stage threads may still be using the pool or the content index.
+            pipeline.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if content is not None:
+            content.close()
+    return reused
+
+
+def _preview_candidates(db: PhotoDB, folders: list[Path]) -> list[str]:
+    """Paths of preview-hashed rows below ``folders`` whose pHash or
+    rotation-invariant hash is within PREVIEW_CANDIDATE_THRESHOLD of another
+    indexed image."""
+    import numpy as np
+
+    from photoscanner.hashing import hamming_neighbors
+
+    rows = db.get_phash_rows()
+    bounds = [path_prefix_bounds(str(f)) for f in folders]
+    queries = np.array(
+        [
+            i
+            for i, (path, _, _, from_preview) in enumerate(rows)
+            if from_preview and any(lo <= path < hi for lo, hi in bounds)
+        ],
+        dtype=np.int64,
+    )
+    if not len(queries):
+        return []
+
+    near = np.zeros(len(queries), dtype=bool)
+    for column in (1, 2):
+        hashes = np.array([row[column] for row in rows], dtype=np.int64).view(np.uint64)
+        qi, tj = hamming_neighbors(hashes[queries], hashes, PREVIEW_CANDIDATE_THRESHOLD)
+        # Every row is near itself.
+        near[qi[queries[qi] != tj]] = True
+    return [rows[i][0] for i in queries[near]]
+
 
 def scan_folders(
     db: PhotoDB,
@@ -99,80 +1131,441 @@ def scan_folders(
     options: ScanOptions,
     embedding_model: Optional[object] = None,
     detector: Optional[object] = None,
-    progress_cb: Optional[callable] = None,
+    progress_cb: Optional[Callable[[ScanProgress], None]] = None,
     running_event: Optional[threading.Event] = None,
+    resume: bool = False,
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
 ) -> ScanResult:
+    """Index every image below ``folders`` into ``db``.
+
+    Files stream through walk -> read -> cpu -> ai stages connected by bounded
+    queues (see photoscanner.pipeline); the calling thread is the DB writer.
+    ``progress_cb``, if given, receives a ScanProgress (counts, throughput,
+    ETA, per-stage counters and queue depths) at most every
+    ``progress_interval`` seconds, from a reporter thread, plus once at the end.
+
+    Progress is checkpointed in the database as the set of directories whose
+    files are all committed. With ``resume=True`` and a checkpoint for the same
+    folders and options, those directories are not listed again. The
+    checkpoint is removed when the scan completes.
+
+    Incremental scans also keep each directory's mtime and image count (the
+    ``dirs`` table). A directory whose mtime and count still match, and whose
+    rows need no further work, is not re-listed; its subdirectories are still
+    visited. ``options.deep`` disables this.
+
+    With ``options.use_previews``, files hashed from their EXIF thumbnail that
+    turn out to be near-duplicate candidates are fully decoded at the end.
+
+    With ``options.profile``, per-stage timings are returned in
+    ``ScanResult.profile``.
+
+    Files that failed in an earlier scan and have not changed since are not
+    read again (``ScanResult.known_bad``) unless ``options.retry_bad``.
+
+    With ``options.detect_moves``, a new file that has the size, mtime and
+    name of an indexed row not seen by the walk is held back until the walk
+    ends. If that row has vanished by then and the partial hash confirms the
+    content, the row is moved to the new path, keeping its hashes, embedding
+    and detections (``ScanResult.moved``); otherwise the file is indexed as
+    new.
+
+    With ``options.reuse_features``, a file whose SHA-256 is already indexed
+    (a copied folder, say) gets that row's features instead of being decoded,
+    embedded and run through detection again (``ScanResult.reused``).
+    """
+    profiler = make_profiler(options.profile)
     scanned = 0
     indexed = 0
     skipped = 0
+    new = 0
+    changed = 0
+    unchanged = 0
+    known_bad = 0
+    moved = 0
 
-    for path in iter_image_files(folders):
-        if running_event is not None:
-            running_event.wait()
+    # Rows we expect to see again; whatever is left after the walk has vanished.
+    # Folders that are missing (e.g. an unmounted share) are left out so their
+    # rows are not reported as vanished.
+    known: dict[str, IndexedFile] = {}
+    bad: dict[str, BadFile] = {}
+    # Bad file records the walk has not come across; those of files that are
+    # gone are dropped after the walk.
+    unseen_bad: set[str] = set()
+    for folder in folders:
+        if Path(folder).exists():
+            known.update(db.get_indexed_files(str(folder)))
+            folder_bad = db.get_bad_files(str(folder))
+            unseen_bad.update(folder_bad)
+            if not options.retry_bad:
+                bad.update(folder_bad)
 
-        scanned += 1
+    folder_keys = [str(Path(f)) for f in folders]
+    opts_hash = options_hash(options)
+    completed: set[str] = set()
+    resumed = False
+    if resume:
+        cp = db.get_checkpoint()
+        if cp is not None and cp.folders == folder_keys and cp.options_hash == opts_hash:
+            completed = db.get_checkpoint_dirs()
+            resumed = True
+    if not resumed:
+        db.start_checkpoint(folder_keys, options_to_json(options), opts_hash)
+    if completed:
+        # Files in finished directories were seen by the interrupted run.
+        for p in [p for p in known if os.path.dirname(p) in completed]:
+            del known[p]
+
+    known_by_dir: dict[str, list[str]] = {}
+    for p in known:
+        known_by_dir.setdefault(os.path.dirname(p), []).append(p)
+    bad_by_dir: dict[str, list[str]] = {}
+    for p in bad:
+        if p not in known:
+            bad_by_dir.setdefault(os.path.dirname(p), []).append(p)
+
+    # Directories that may be trusted without listing, if their mtime still
+    # matches: every image found last time is indexed and needs no more work,
+    # or is a known bad file.
+    dir_cache: dict[str, DirCacheEntry] = {}
+    if options.incremental and not options.deep:
+        for folder in folders:
+            for d, cached in db.get_dir_cache(str(folder)).items():
+                paths = known_by_dir.get(d, [])
+                if len(paths) + len(bad_by_dir.get(d, ())) == cached.entry_count and all(
+                    is_up_to_date(known[p], known[p].file_size, known[p].mtime_ns, options)
+                    for p in paths
+                ):
+                    dir_cache[d] = cached
+
+    def cached_subdirs(path: str) -> Optional[tuple[str, ...]]:
+        cached = dir_cache.get(path)
+        if cached is None:
+            return None
         try:
-            stat = path.stat()
-            file_size = int(stat.st_size)
-            mtime_ns = int(stat.st_mtime_ns)
-
-            with Image.open(path) as img:
-                img.load()
-                width, height = img.size
-                ph = imagehash.phash(img)
-                sharp = laplacian_sharpness(img)
-
-            sha = sha256_file(path)
-            score = image_quality_score(width, height, file_size, sharp)
-
-            embedding_blob: Optional[bytes] = None
-            faces_json: Optional[str] = None
-            objects_json: Optional[str] = None
-
-            if options.compute_embeddings and embedding_model is not None:
-                embedding_blob = embedding_model.embed_file(path)
-
-            if (options.detect_faces or options.detect_objects) and detector is not None:
-                det = detector.analyze_file(path, faces=options.detect_faces, objects=options.detect_objects)
-                faces_json = dumps_json(det.get("faces")) if det.get("faces") is not None else None
-                objects_json = dumps_json(det.get("objects")) if det.get("objects") is not None else None
-
-            db.upsert_image(
-                ImageRecord(
-                    path=str(path),
-                    sha256=sha,
-                    phash=str(ph),
-                    width=int(width),
-                    height=int(height),
-                    file_size=file_size,
-                    mtime_ns=mtime_ns,
-                    score=float(score),
-                    embedding=embedding_blob,
-                    faces_json=faces_json,
-                    objects_json=objects_json,
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        return cached.subdirs if mtime_ns == cached.mtime_ns else None
+
+    visited: set[str] = set()
+    listed: dict[str, DirCacheEntry] = {}
+    dirs = _DirTracker()
+
+    def drain_dirs() -> None:
+        done = dirs.drain()
+        if done:
+            # Only ever committed by the writer's next flush, i.e. together
+            # with or after the rows of the files they cover.
+            db.add_checkpoint_dirs(done)
+            db.upsert_dirs([listed.pop(d) for d in done if d in listed])
+
+    tracker = ProgressTracker(progress_cb, progress_interval)
+
+    # Not-yet-seen rows by mtime, built when the walk finds its first new file;
+    # and the new files that may be moved rows, settled after the walk.
+    rows_by_mtime: Optional[dict[int, list[str]]] = None
+    maybe_moved: list[FileEntry] = []
+
+    def move_source(entry: FileEntry) -> Optional[str]:
+        nonlocal rows_by_mtime
+        if rows_by_mtime is None:
+            rows_by_mtime = {}
+            for p, row in known.items():
+                rows_by_mtime.setdefault(row.mtime_ns, []).append(p)
+        name = os.path.basename(entry.path)
+        for p in rows_by_mtime.get(entry.mtime_ns, ()):
+            row = known.get(p)
+            if row is not None and row.file_size == entry.size and os.path.basename(p) == name:
+                return p
+        return None
+
+    def pending_files() -> Iterable[FileEntry]:
+        nonlocal scanned, new, changed, unchanged, known_bad
+        listings = iter_dir_listings(
+            folders,
+            SCAN_EXTS,
+            threads=options.walk_threads,
+            skip_files=completed.__contains__ if completed else None,
+            cached_subdirs=cached_subdirs if dir_cache else None,
+        )
+        listing_started = time.time_ns()
+        for listing in listings:
+            visited.add(listing.path)
+            if profiler.enabled and not listing.cached:
+                profiler.record("list", listing.wall, listing.cpu)
+            if listing.cached:
+                # Unchanged directory: its rows are still there and up to date.
+                for p in known_by_dir.get(listing.path, []):
+                    if known.pop(p, None) is not None:
+                        scanned += 1
+                        unchanged += 1
+                        tracker.file_seen()
+                for p in bad_by_dir.get(listing.path, []):
+                    unseen_bad.discard(p)
+                    if bad.pop(p, None) is not None:
+                        scanned += 1
+                        unchanged += 1
+                        known_bad += 1
+                        tracker.file_seen()
+                dirs.listed(listing.path)
+                continue
+            tracker.dir_listed()
+            if listing.skipped:
+                continue
+            if listing.mtime_ns and listing.mtime_ns < listing_started - DIR_MTIME_SLACK_NS:
+                listed[listing.path] = DirCacheEntry(
+                    path=listing.path,
+                    mtime_ns=listing.mtime_ns,
+                    entry_count=len(listing.files),
+                    subdirs=listing.subdirs,
                 )
-            )
-            indexed += 1
+            for entry in listing.files:
+                if running_event is not None:
+                    running_event.wait()
 
-            if indexed % 100 == 0:
-                db.commit()
+                scanned += 1
+                tracker.file_seen()
+                unseen_bad.discard(entry.path)
+                prev = known.pop(entry.path, None)
+                if _is_known_bad(bad.get(entry.path), entry):
+                    # A row left from before the file went bad is kept as is.
+                    unchanged += 1
+                    known_bad += 1
+                    continue
+                if prev is None:
+                    if options.detect_moves and known and move_source(entry) is not None:
+                        dirs.add(listing.path)
+                        maybe_moved.append(entry)
+                        continue
+                    new += 1
+                elif prev.file_size == entry.size and prev.mtime_ns == entry.mtime_ns:
+                    unchanged += 1
+                    if options.incremental and is_up_to_date(
+                        prev, entry.size, entry.mtime_ns, options
+                    ):
+                        continue
+                else:
+                    changed += 1
 
-            if progress_cb is not None:
-                progress_cb(scanned, indexed, skipped, str(path))
+                dirs.add(listing.path)
+                tracker.file_queued(entry.size)
+                yield entry
+            dirs.listed(listing.path)
+        tracker.walk_finished()
 
-        except Exception:
+    def on_item(entry: FileEntry, ok: bool) -> None:
+        nonlocal indexed, skipped
+        dirs.finished(os.path.dirname(entry.path))
+        drain_dirs()
+        if ok:
+            indexed += 1
+        else:
             skipped += 1
-            if progress_cb is not None:
-                progress_cb(scanned, indexed, skipped, str(path))
+        tracker.file_done(entry.path, entry.size, ok)
+
+    with tracker:
+        reused = _index_entries(
+            db,
+            pending_files(),
+            options,
+            embedding_model,
+            detector,
+            on_item,
+            running_event,
+            tracker,
+            profiler,
+        )
+
+        # The walk is over: rows still unseen have vanished.
+        follow_up: list[FileEntry] = []
+        for entry in maybe_moved:
+            old = move_source(entry)
+            if old is not None and _same_content(db, old, entry, profiler):
+                row = known.pop(old)
+                db.rename_image(old, entry.path)
+                moved += 1
+                if options.incremental and is_up_to_date(row, entry.size, entry.mtime_ns, options):
+                    dirs.finished(os.path.dirname(entry.path))
+                    continue
+            else:
+                new += 1
+            follow_up.append(entry)
+            tracker.file_queued(entry.size)
+        # Files in directories a resumed scan skipped were not seen either, but
+        # still exist.
+        db.delete_bad_files([p for p in unseen_bad if not os.path.exists(p)])
+        drain_dirs()
+        db.commit()
+        if follow_up:
+            reused += _index_entries(
+                db,
+                follow_up,
+                options,
+                embedding_model,
+                detector,
+                on_item,
+                running_event,
+                tracker,
+                profiler,
+            )
+
+        if options.use_previews and not options.exact_only:
+            confirm: list[FileEntry] = []
+            for path in _preview_candidates(db, folders):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                confirm.append(FileEntry(path, int(st.st_size), int(st.st_mtime_ns)))
+                tracker.file_queued(int(st.st_size))
+            if confirm:
+                full = dataclasses.replace(options, use_previews=False)
+                _index_entries(
+                    db,
+                    confirm,
+                    full,
+                    embedding_model,
+                    detector,
+                    lambda e, ok: tracker.file_redone(e.path, e.size),
+                    running_event,
+                    tracker,
+                    profiler,
+                )
+    if not completed:
+        # Cached directories that were not reached any more have been removed.
+        for folder in folders:
+            if Path(folder).exists():
+                db.delete_dirs(d for d in db.get_dir_cache(str(folder)) if d not in visited)
+
+    db.clear_checkpoint()
+    return ScanResult(
+        scanned=scanned,
+        indexed=indexed,
+        skipped=skipped,
+        new=new,
+        changed=changed,
+        unchanged=unchanged,
+        vanished=len(known),
+        known_bad=known_bad,
+        reused=reused,
+        moved=moved,
+        resumed=resumed,
+        profile=profiler.report(),
+    )
+
+
+def index_paths(
+    db: PhotoDB,
+    paths: Iterable[str],
+    options: ScanOptions,
+    embedding_model: Optional[object] = None,
+    detector: Optional[object] = None,
+    progress_cb: Optional[Callable[[ScanProgress], None]] = None,
+    running_event: Optional[threading.Event] = None,
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+) -> ScanResult:
+    """Bring the index in line with the files at ``paths``.
+
+    Meant for the handful of files a watch event batch touched. Paths that
+    exist go through the same extraction as scan_folders (unchanged ones are
+    skipped when ``options.incremental``, as are unchanged known bad files
+    unless ``options.retry_bad``); paths that are gone are removed from the
+    index and counted as vanished. Non-image paths are ignored.
+    """
+    profiler = make_profiler(options.profile)
+    scanned = 0
+    indexed = 0
+    skipped = 0
+    new = 0
+    changed = 0
+    unchanged = 0
+    vanished = 0
+    known_bad = 0
+    tracker = ProgressTracker(progress_cb, progress_interval)
+
+    entries: list[FileEntry] = []
+    for path in sorted(set(str(p) for p in paths)):
+        if os.path.splitext(path)[1].lower() not in SCAN_EXTS:
+            continue
+        try:
+            st = os.stat(path)
+            is_file = os.path.isfile(path)
+        except OSError:
+            is_file = False
+        if not is_file:
+            if db.get_indexed_file(path) is not None:
+                db.delete_image(path)
+                vanished += 1
+            db.delete_bad_files([path])
             continue
 
+        scanned += 1
+        tracker.file_seen()
+        entry = FileEntry(path, int(st.st_size), int(st.st_mtime_ns))
+        prev = db.get_indexed_file(path)
+        if not options.retry_bad and _is_known_bad(db.get_bad_file(path), entry):
+            unchanged += 1
+            known_bad += 1
+            continue
+        if prev is None:
+            new += 1
+        elif prev.file_size == entry.size and prev.mtime_ns == entry.mtime_ns:
+            unchanged += 1
+            if options.incremental and is_up_to_date(prev, entry.size, entry.mtime_ns, options):
+                continue
+        else:
+            changed += 1
+        entries.append(entry)
+        tracker.file_queued(entry.size)
     db.commit()
-    return ScanResult(scanned=scanned, indexed=indexed, skipped=skipped)
+    tracker.walk_finished()
+
+    def on_item(entry: FileEntry, ok: bool) -> None:
+        nonlocal indexed, skipped
+        if ok:
+            indexed += 1
+        else:
+            skipped += 1
+        tracker.file_done(entry.path, entry.size, ok)
+
+    reused = 0
+    with tracker:
+        if entries:
+            reused = _index_entries(
+                db,
+                entries,
+                options,
+                embedding_model,
+                detector,
+                on_item,
+                running_event,
+                tracker,
+                profiler,
+            )
+
+    return ScanResult(
+        scanned=scanned,
+        indexed=indexed,
+        skipped=skipped,
+        new=new,
+        changed=changed,
+        unchanged=unchanged,
+        vanished=vanished,
+        known_bad=known_bad,
+        reused=reused,
+        profile=profiler.report(),
+    )
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
 
 
 def hamming_distance_hex_phash(a: str, b: str) -> int:
-    # imagehash uses hex strings for pHash by default.
-    return bin(int(a, 16) ^ int(b, 16)).count("1")
+    # imagehash uses hex strings for pHash by default; records carry the int
+    # as ImageRecord.phash_int, see hamming_distance().
+    return hamming_distance(int(a, 16), int(b, 16))
 
 
 def group_duplicates_by_sha256(records: list[ImageRecord]) -> list[list[ImageRecord]]:
@@ -185,20 +1578,68 @@ def group_duplicates_by_sha256(records: list[ImageRecord]) -> list[list[ImageRec
     return groups
 
 
-def group_duplicates_by_phash(records: list[ImageRecord], threshold: int = 6) -> list[list[ImageRecord]]:
+def _record_hashes(record: ImageRecord, families: tuple[str, ...]) -> Optional[tuple[int, ...]]:
+    """The requested hash families of a record as ints, or None if any is missing."""
+    out = []
+    for family in families:
+        if family == "phash":
+            # Rows from an exact-only scan have no pHash yet.
+            value = record.phash_int
+        else:
+            value = getattr(record, family)
+        if value is None:
+            return None
+        out.append(value)
+    return tuple(out)
+
+
+def group_duplicates_by_phash(
+    records: list[ImageRecord],
+    threshold: int | dict[str, int] = 6,
+    families: Iterable[str] = ("phash",),
+    mode: str = "all",
+) -> list[list[ImageRecord]]:
+    """Group near-duplicates by the Hamming distance of their perceptual hashes.
+
+    ``families`` selects which of HASH_FAMILIES to compare; ``threshold`` is the
+    maximum distance in bits, either for all families or per family. With
+    ``mode="all"`` two images match when every family is within its threshold,
+    with ``mode="any"`` when at least one is. Records lacking one of the
+    requested hashes are left out.
+    """
+    from photoscanner.hashing import HASH_FAMILIES
+
+    families = tuple(families)
+    unknown = [f for f in families if f not in HASH_FAMILIES]
+    if not families or unknown:
+        raise ValueError(f"Unknown hash families: {unknown or families}")
+    if mode not in ("all", "any"):
+        raise ValueError(f"Unknown mode: {mode!r}")
+    limits = tuple(
+        threshold.get(f, 6) if isinstance(threshold, dict) else threshold for f in families
+    )
+    match = all if mode == "all" else any
+
+    # Parse every hash once up front rather than per comparison.
+    remaining: list[tuple[ImageRecord, tuple[int, ...]]] = []
+    for r in records:
+        hashes = _record_hashes(r, families)
+        if hashes is not None:
+            remaining.append((r, hashes))
+
     # Simple greedy clustering. Good enough for a first version.
-    remaining = records[:]
     groups: list[list[ImageRecord]] = []
-
     while remaining:
-        seed = remaining.pop()
+        seed, seed_hashes = remaining.pop()
         cluster = [seed]
-        keep: list[ImageRecord] = []
-        for r in remaining:
-            if hamming_distance_hex_phash(seed.phash, r.phash) <= threshold:
+        keep: list[tuple[ImageRecord, tuple[int, ...]]] = []
+        for r, hashes in remaining:
+            if match(
+                (a ^ b).bit_count() <= limit for a, b, limit in zip(seed_hashes, hashes, limits)
+            ):
                 cluster.append(r)
             else:
-                keep.append(r)
+                keep.append((r, hashes))
         remaining = keep
         if len(cluster) > 1:
             cluster.sort(key=lambda x: x.score, reverse=True)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+
+class FileEntry(NamedTuple):
+    """A file found by the walker, with the stat data the scan needs."""
+
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class DirListing(NamedTuple):
+    """One directory visited by the walker.
+
+    ``skipped`` is True when the caller asked not to list its files; ``files``
+    is then empty, but its subdirectories were still visited. ``cached`` means
+    the directory was not read at all and its subdirectories came from the
+    caller's cache. ``mtime_ns`` is the directory mtime taken before listing
+    (0 if it was not read). ``wall``/``cpu`` are the seconds spent listing it
+    and stat'ing its files, for profiling.
+    """
+
+    path: str
+    files: list[FileEntry]
+    skipped: bool
+    subdirs: tuple[str, ...] = ()
+    mtime_ns: int = 0
+    cached: bool = False
+    wall: float = 0.0
+    cpu: float = 0.0
+
+
+def list_dir(
+    path: str, exts: set[str], files_wanted: bool = True
+) -> tuple[list[FileEntry], list[str]]:
+    """List one directory: matching files (with stat) and subdirectories to descend into.
+
+    Uses the DirEntry stat cache, which on Windows comes for free with the
+    directory listing and elsewhere saves building a Path per file. Like
+    ``os.walk``, symlinked directories are not followed and unreadable
+    directories are skipped. With ``files_wanted=False`` only subdirectories
+    are collected and no file is stat'ed.
+    """
+    files: list[FileEntry] = []
+    subdirs: list[str] = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                        continue
+                    if not files_wanted or os.path.splitext(entry.name)[1].lower() not in exts:
+                        continue
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files.append(FileEntry(entry.path, int(st.st_size), int(st.st_mtime_ns)))
+    except OSError:
+        return [], []
+    files.sort()
+    subdirs.sort()
+    return files, subdirs
+
+
+def iter_dir_listings(
+    folders: Iterable[Path],
+    exts: set[str],
+    threads: int = 1,
+    skip_files: Optional[Callable[[str], bool]] = None,
+    cached_subdirs: Optional[Callable[[str], Optional[Iterable[str]]]] = None,
+) -> Iterator[DirListing]:
+    """Yield a DirListing for every directory below (and including) ``folders``.
+
+    ``skip_files(dir_path)`` returning True keeps that directory's files out of
+    the listing while still descending into its subdirectories.
+    ``cached_subdirs(dir_path)`` may return the subdirectories of a directory
+    known to be unchanged; it is then not listed at all. It runs on the walker
+    threads.
+
+    With ``threads > 1`` subdirectories are listed concurrently by a bounded
+    thread pool, which hides per-directory round trips on SMB/NFS mounts.
+    Files within a directory are in name order; the order between directories
+    is not defined in that case.
+    """
+    roots = [str(Path(f)) for f in folders if Path(f).is_dir()]
+
+    def visit(path: str) -> tuple[DirListing, list[str]]:
+        if cached_subdirs is not None:
+            known = cached_subdirs(path)
+            if known is not None:
+                subdirs = list(known)
+                return DirListing(path, [], True, tuple(subdirs), cached=True), subdirs
+        skipped = skip_files is not None and skip_files(path)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        # Taken before listing, so a change made while listing shows up as a
+        # newer mtime on the next scan.
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime_ns = 0
+        files, subdirs = list_dir(path, exts, files_wanted=not skipped)
+        wall = time.perf_counter() - wall
+        cpu = time.thread_time() - cpu
+        listing = DirListing(path, files, skipped, tuple(subdirs), mtime_ns, wall=wall, cpu=cpu)
+        return listing, subdirs
+
+    if threads <= 1:
+        stack = list(reversed(roots))
+        while stack:
+            listing, subdirs = visit(stack.pop())
+            yield listing
+            stack.extend(reversed(subdirs))
+        return
+
+    todo: deque[str] = deque(roots)
+    max_in_flight = threads * 2
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="walker") as pool:
+        in_flight: set[Future] = set()
+        while todo or in_flight:
+            while todo and len(in_flight) < max_in_flight:
+                in_flight.add(pool.submit(visit, todo.popleft()))
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                listing, subdirs = fut.result()
+                todo.extend(subdirs)
+                yield listing
+
+
+def iter_file_entries(
+    folders: Iterable[Path], exts: set[str], threads: int = 1
+) -> Iterator[FileEntry]:
+    """Yield every file below ``folders`` whose suffix is in ``exts``."""
+    for listing in iter_dir_listings(folders, exts, threads):
+        yield from listing.files
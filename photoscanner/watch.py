@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from photoscanner.db import PhotoDB, path_prefix_bounds
+from photoscanner.scanner import SCAN_EXTS, ScanOptions, ScanResult, index_paths
+from photoscanner.walker import iter_file_entries
+
+
+# Seconds without new events before a batch is processed.
+DEFAULT_DEBOUNCE = 2.0
+# Upper bound on how long a steady stream of events (e.g. a large copy) can
+# hold a batch back.
+DEFAULT_MAX_DELAY = 30.0
+
+
+@dataclass
+class WatchBatch:
+    """Debounced changes, applied in order: moves, deleted dirs, then paths."""
+
+    moves: list[tuple[str, str, bool]] = field(default_factory=list)  # (src, dest, is_dir)
+    deleted_dirs: list[str] = field(default_factory=list)
+    # Directories whose contents appeared at once (created or moved in).
+    new_dirs: list[str] = field(default_factory=list)
+    # Files to reconcile with the disk: (re)index if present, drop if gone.
+    paths: set[str] = field(default_factory=set)
+
+
+class EventBatcher:
+    """Collects filesystem events from watcher threads and debounces them.
+
+    Repeated events for the same file collapse into a single reconcile, so a
+    file that is written in many chunks is only extracted once it settles.
+    """
+
+    def __init__(
+        self, debounce: float = DEFAULT_DEBOUNCE, max_delay: float = DEFAULT_MAX_DELAY
+    ) -> None:
+        self._debounce = debounce
+        self._max_delay = max_delay
+        self._lock = threading.Lock()
+        self._batch = WatchBatch()
+        self._first = 0.0
+        self._last = 0.0
+
+    def _touch(self) -> None:
+        now = time.monotonic()
+        if not self._first:
+            self._first = now
+        self._last = now
+
+    def file_changed(self, path: str) -> None:
+        """A file was created, modified or deleted."""
+        if os.path.splitext(path)[1].lower() not in SCAN_EXTS:
+            return
+        with self._lock:
+            self._batch.paths.add(path)
+            self._touch()
+
+    def dir_created(self, path: str) -> None:
+        with self._lock:
+            self._batch.new_dirs.append(path)
+            self._touch()
+
+    def dir_deleted(self, path: str) -> None:
+        with self._lock:
+            self._batch.deleted_dirs.append(path)
+            self._touch()
+
+    def moved(self, src: str, dest: str, is_dir: bool) -> None:
+        with self._lock:
+            batch = self._batch
+            batch.moves.append((src, dest, is_dir))
+            if is_dir:
+                # Pending paths inside the directory now live under dest.
+                low, high = path_prefix_bounds(src)
+                dest_prefix, _ = path_prefix_bounds(dest)
+                for p in [p for p in batch.paths if low <= p < high]:
+                    batch.paths.discard(p)
+                    batch.paths.add(dest_prefix + p[len(low):])
+                batch.new_dirs.append(dest)
+            else:
+                batch.paths.add(src)
+                batch.paths.add(dest)
+            self._touch()
+
+    def take(self, force: bool = False) -> Optional[WatchBatch]:
+        """Return the pending batch once it has settled (or ``force``), else None."""
+        with self._lock:
+            if not self._first:
+                return None
+            now = time.monotonic()
+            settled = now - self._last >= self._debounce or now - self._first >= self._max_delay
+            if not (settled or force):
+                return None
+            batch, self._batch = self._batch, WatchBatch()
+            self._first = self._last = 0.0
+            return batch
+
+
+class _EventHandler:
+    """watchdog event handler feeding an EventBatcher (duck-typed dispatch())."""
+
+    def __init__(self, batcher: EventBatcher) -> None:
+        self._batcher = batcher
+
+    def dispatch(self, event: Any) -> None:
+        kind = event.event_type
+        src = os.fsdecode(event.src_path)
+        if kind == "moved":
+            self._batcher.moved(src, os.fsdecode(event.dest_path), event.is_directory)
+        elif event.is_directory:
+            if kind == "created":
+                self._batcher.dir_created(src)
+            elif kind == "deleted":
+                self._batcher.dir_deleted(src)
+        elif kind in ("created", "modified", "deleted", "closed"):
+            self._batcher.file_changed(src)
+
+
+def _create_observer() -> Any:
+    try:
+        from watchdog.observers import Observer  # type: ignore
+    except Exception as e:  # pragma: no cover
+        raise RuntimeError(
+            "Watch mode requires 'watchdog'. Install with: pip install watchdog"
+        ) from e
+    return Observer()
+
+
+def apply_batch(
+    db: PhotoDB,
+    batch: WatchBatch,
+    options: ScanOptions,
+    embedding_model: Optional[object] = None,
+    detector: Optional[object] = None,
+    running_event: Optional[threading.Event] = None,
+) -> ScanResult:
+    """Apply one debounced batch of events to the index."""
+    for src, dest, is_dir in batch.moves:
+        if is_dir:
+            db.rename_images_below(src, dest)
+        elif os.path.splitext(dest)[1].lower() in SCAN_EXTS:
+            db.rename_image(src, dest)
+    vanished = 0
+    for folder in batch.deleted_dirs:
+        if not os.path.isdir(folder):
+            vanished += db.delete_images_below(folder)
+    db.commit()
+
+    paths = set(batch.paths)
+    for folder in batch.new_dirs:
+        # A directory that appears at once may come with a single event for
+        # all its files; moved rows keep their stat, so they are skipped below.
+        paths.update(e.path for e in iter_file_entries([Path(folder)], SCAN_EXTS))
+
+    res = index_paths(db, paths, options, embedding_model, detector, running_event=running_event)
+    return ScanResult(
+        scanned=res.scanned,
+        indexed=res.indexed,
+        skipped=res.skipped,
+        new=res.new,
+        changed=res.changed,
+        unchanged=res.unchanged,
+        vanished=res.vanished + vanished,
+        known_bad=res.known_bad,
+        reused=res.reused,
+        profile=res.profile,
+    )
+
+
+class FolderWatcher:
+    """Keeps ``db`` up to date with the folders stored in its ``folders`` table.
+
+    Uses watchdog (inotify on Linux, ReadDirectoryChangesW on Windows, FSEvents
+    on macOS). Events are debounced into batches and pushed through the same
+    feature extraction as scan_folders; incremental skipping is forced on so
+    only files that actually changed are decoded. Files that changed while
+    nothing was watching are only picked up by a regular scan, so run one
+    before starting the watcher.
+    """
+
+    def __init__(
+        self,
+        db: PhotoDB,
+        options: ScanOptions,
+        embedding_model: Optional[object] = None,
+        detector: Optional[object] = None,
+        debounce: float = DEFAULT_DEBOUNCE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        batch_cb: Optional[Callable[[ScanResult], None]] = None,
+        running_event: Optional[threading.Event] = None,
+    ) -> None:
+        self._db = db
+        self._options = dataclasses.replace(options, incremental=True)
+        self._embedding_model = embedding_model
+        self._detector = detector
+        self._batcher = EventBatcher(debounce, max_delay)
+        self._batch_cb = batch_cb
+        self._running_event = running_event
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Watch until ``stop_event`` is set; batches are applied in this thread."""
+        folders = [f for f in self._db.get_folders() if os.path.isdir(f)]
+        observer = _create_observer()
+        handler = _EventHandler(self._batcher)
+        for folder in folders:
+            observer.schedule(handler, folder, recursive=True)
+        observer.start()
+        try:
+            while not stop_event.wait(0.2):
+                self._apply(self._batcher.take())
+        finally:
+            observer.stop()
+            observer.join()
+        # Do not drop events that arrived just before the stop.
+        self._apply(self._batcher.take(force=True))
+
+    def _apply(self, batch: Optional[WatchBatch]) -> None:
+        if batch is None:
+            return
+        res = apply_batch(
+            self._db,
+            batch,
+            self._options,
+            self._embedding_model,
+            self._detector,
+            self._running_event,
+        )
+        if self._batch_cb is not None:
+            self._batch_cb(res)
@@ -0,0 +1,107 @@
+"""Bad file registry: what gets recorded, when it is skipped and when it is dropped."""
+
+from __future__ import annotations
+
+import errno
+import os
+import sys
+
+from PIL import UnidentifiedImageError
+
+from photoscanner import scanner
+from photoscanner.db import BadFile, PhotoDB
+from photoscanner.scanner import ScanOptions, _is_decode_error, scan_folders
+
+
+def test_undecodable_file_is_skipped_until_it_changes(tmp_path, write_image):
+    lib = tmp_path / "lib"
+    write_image(lib / "ok.jpg")
+    broken = lib / "broken.jpg"
+    broken.write_bytes(b"not a jpeg")
+    db = PhotoDB(tmp_path / "db.sqlite")
+
+    res = scan_folders(db, [lib], ScanOptions())
+    assert (res.indexed, res.skipped) == (1, 1)
+    assert list(db.get_bad_files()) == [str(broken)]
+
+    res = scan_folders(db, [lib], ScanOptions())
+    assert (res.skipped, res.known_bad) == (0, 1)
+    res = scan_folders(db, [lib], ScanOptions(retry_bad=True))
+    assert (res.skipped, res.known_bad) == (1, 0)
+
+    write_image(broken, seed=5)
+    res = scan_folders(db, [lib], ScanOptions(incremental=True))
+    assert (res.indexed, res.known_bad) == (1, 0)
+    assert db.get_bad_files() == {}
+    db.close()
+
+
+def test_read_errors_are_not_recorded(tmp_path, write_image, monkeypatch):
+    lib = tmp_path / "lib"
+    flaky = write_image(lib / "flaky.jpg")
+    real_open = open
+
+    def failing_open(path, *args, **kwargs):
+        if str(path) == str(flaky):
+            raise OSError(errno.EIO, "Input/output error", str(path))
+        return real_open(path, *args, **kwargs)
+
+    # Only the scanner's read stage sees the failing open().
+    monkeypatch.setattr(scanner, "open", failing_open, raising=False)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    res = scan_folders(db, [lib], ScanOptions())
+    assert res.skipped == 1
+    assert db.get_bad_files() == {}
+
+    monkeypatch.undo()
+    res = scan_folders(db, [lib], ScanOptions(incremental=True))
+    assert res.indexed == 1
+    db.close()
+
+
+def test_raw_files_needing_rawpy_are_not_recorded(tmp_path, monkeypatch):
+    lib = tmp_path / "lib"
+    lib.mkdir()
+    # An ISO BMFF container like CR3, which only rawpy can read.
+    (lib / "photo.cr3").write_bytes(b"\x00\x00\x00\x18ftypcrx " + bytes(64))
+    monkeypatch.setitem(sys.modules, "rawpy", None)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    res = scan_folders(db, [lib], ScanOptions())
+    assert (res.indexed, res.skipped) == (0, 1)
+    assert db.get_bad_files() == {}
+    db.close()
+
+
+def test_decode_error_classification():
+    assert _is_decode_error(UnidentifiedImageError("cannot identify image file"))
+    assert _is_decode_error(OSError("image file is truncated"))
+    assert _is_decode_error(ValueError("RAW file has no embedded JPEG preview"))
+    assert not _is_decode_error(OSError(errno.ESTALE, "Stale file handle"))
+    assert not _is_decode_error(FileNotFoundError(errno.ENOENT, "No such file"))
+    assert not _is_decode_error(TimeoutError())
+    assert not _is_decode_error(ConnectionResetError())
+    assert not _is_decode_error(RuntimeError("scan stopped"))
+
+
+def test_records_of_gone_files_are_dropped(tmp_path, write_image):
+    lib = tmp_path / "lib"
+    write_image(lib / "ok.jpg")
+    (lib / "gone.jpg").write_bytes(b"not a jpeg")
+    (lib / "sub").mkdir()
+    (lib / "sub" / "kept.jpg").write_bytes(b"not a jpeg either")
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [lib], ScanOptions())
+    assert len(db.get_bad_files()) == 2
+
+    os.remove(lib / "gone.jpg")
+    res = scan_folders(db, [lib], ScanOptions(incremental=True))
+    assert res.known_bad == 1
+    assert list(db.get_bad_files()) == [str(lib / "sub" / "kept.jpg")]
+
+    # Moving a row also drops the record of its old path.
+    db.add_bad_files([BadFile(str(lib / "ok.jpg"), 1, 1, "ValueError", "x")])
+    db.commit()
+    assert db.rename_image(str(lib / "ok.jpg"), str(lib / "moved.jpg"))
+    db.commit()
+    assert str(lib / "ok.jpg") not in db.get_bad_files()
+    db.close()
@@ -0,0 +1,87 @@
+"""Scan checkpoints: an interrupted scan resumes where it stopped."""
+
+from __future__ import annotations
+
+import dataclasses
+import os
+
+import pytest
+
+from photoscanner import scanner
+from photoscanner.db import PhotoDB
+from photoscanner.scanner import ScanOptions, options_from_json, scan_folders
+
+OPTIONS = ScanOptions(commit_size=3, walk_threads=1, io_threads=1)
+
+
+def _library(tmp_path, write_image):
+    lib = tmp_path / "lib"
+    for d in range(5):
+        for i in range(4):
+            write_image(lib / f"d{d}" / f"{i}.jpg", seed=10 * d + i)
+    return lib
+
+
+def _interrupted_scan(db, lib, monkeypatch, after=11):
+    """Run a scan that is interrupted while writing its ``after``-th file."""
+    calls = 0
+    score = scanner.image_quality_score
+
+    def interrupting(*args):
+        nonlocal calls
+        calls += 1
+        if calls == after:
+            raise KeyboardInterrupt
+        return score(*args)
+
+    monkeypatch.setattr(scanner, "image_quality_score", interrupting)
+    with pytest.raises(KeyboardInterrupt):
+        scan_folders(db, [lib], OPTIONS)
+    monkeypatch.undo()
+
+
+def test_resume_skips_completed_directories(tmp_path, write_image, monkeypatch):
+    lib = _library(tmp_path, write_image)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    _interrupted_scan(db, lib, monkeypatch)
+    db.close()
+
+    db = PhotoDB(tmp_path / "db.sqlite")
+    cp = db.get_checkpoint()
+    assert cp is not None and cp.folders == [str(lib)]
+    assert options_from_json(cp.options_json) == OPTIONS
+    completed = db.get_checkpoint_dirs()
+    done = [p for p in db.iter_image_paths() if os.path.dirname(p) in completed]
+    assert 0 < len(done) < 20
+
+    res = scan_folders(db, [lib], OPTIONS, resume=True)
+    assert res.resumed
+    assert res.indexed == 20 - len(done)
+    assert db.stats()["images"] == 20 and db.stats()["decoded"] == 20
+    assert db.get_checkpoint() is None
+    db.close()
+
+
+@pytest.mark.parametrize(
+    "change, resumed",
+    [
+        # Tuning options may change between runs ...
+        ({"options": dataclasses.replace(OPTIONS, workers=2, commit_size=50, queue_size=8)}, True),
+        # ... but other options or folders start the scan over.
+        ({"options": dataclasses.replace(OPTIONS, fast_decode=True)}, False),
+        ({"folders": ["d0", "d1"]}, False),
+    ],
+)
+def test_resume_requires_the_same_scan(tmp_path, write_image, monkeypatch, change, resumed):
+    lib = _library(tmp_path, write_image)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    _interrupted_scan(db, lib, monkeypatch)
+    options = change.get("options", OPTIONS)
+    folders = [lib / f for f in change.get("folders", [])] or [lib]
+
+    res = scan_folders(db, folders, options, resume=True)
+    assert res.resumed == resumed
+    if not resumed:
+        assert res.indexed == res.scanned
+    assert db.get_checkpoint() is None
+    db.close()
@@ -0,0 +1,37 @@
+"""Exact-only scans must not discard the features of already decoded rows."""
+
+from __future__ import annotations
+
+from photoscanner.db import PhotoDB
+from photoscanner.scanner import ScanOptions, is_full_sha256, scan_folders
+
+
+def test_exact_only_keeps_decoded_rows(tmp_path, write_image):
+    lib = tmp_path / "lib"
+    a = write_image(lib / "a.jpg", seed=1)
+    # Above 2 * PARTIAL_HASH_BLOCK, so exact-only gives it a partial key.
+    big = write_image(lib / "big.jpg", seed=2, size=(600, 400))
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [lib], ScanOptions())
+    db.update_image_objects(str(a), '[{"label":"cat"}]')
+    before = {r.path: r for r in db.iter_images()}
+
+    changed = write_image(lib / "a.jpg", seed=3)
+    write_image(lib / "new.jpg", seed=4)
+    res = scan_folders(db, [lib], ScanOptions(exact_only=True))
+    assert res.skipped == 0
+    after = {r.path: r for r in db.iter_images()}
+
+    # Unchanged: everything kept, including the full digest.
+    assert after[str(big)] == before[str(big)]
+    assert is_full_sha256(after[str(big)].sha256)
+    # Changed and new files get exact-only rows; the old features are stale.
+    assert after[str(changed)].phash == "" and after[str(changed)].objects_json is None
+    assert after[str(lib / "new.jpg")].phash == ""
+
+    # The next normal scan completes them, keeping the unchanged row as it is.
+    scan_folders(db, [lib], ScanOptions(incremental=True))
+    final = {r.path: r for r in db.iter_images()}
+    assert final[str(big)] == before[str(big)]
+    assert all(r.phash and r.width for r in final.values())
+    db.close()
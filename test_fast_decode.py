@@ -0,0 +1,23 @@
+"""Fast decode: reduced-resolution features stay comparable with a full decode."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from photoscanner.scanner import ScanOptions, extract_features
+
+
+@pytest.mark.parametrize("size", [(1600, 1200), (300, 200)])
+def test_sharpness_does_not_depend_on_decode_mode(tmp_path, size):
+    w, h = size
+    detail = np.random.default_rng(0).random((h // 8, w // 8, 3)) * 255
+    path = tmp_path / "photo.jpg"
+    img = Image.fromarray(detail.astype("uint8")).resize(size, Image.Resampling.BICUBIC)
+    img.save(path, quality=92)
+
+    full = extract_features(str(path), ScanOptions())
+    fast = extract_features(str(path), ScanOptions(fast_decode=True))
+    assert (fast.width, fast.height) == (full.width, full.height) == size
+    assert fast.sharpness == pytest.approx(full.sharpness, rel=0.05)
@@ -0,0 +1,86 @@
+"""Checks of the vectorized hash helpers in photoscanner.hashing."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from photoscanner.hashing import PHASH_INPUT_SIZE, hamming_matrix, hamming_neighbors, phash_input
+
+
+@pytest.mark.parametrize("threshold", [0, 3, 10, 11])
+def test_hamming_neighbors_matches_hamming_matrix(threshold):
+    rng = np.random.default_rng(threshold)
+    table = rng.integers(-(2**63), 2**63 - 1, size=5000, dtype=np.int64).view(np.uint64)
+    # Queries near some table entries, plus unrelated ones.
+    queries = table[:300].copy()
+    for i in range(len(queries)):
+        for bit in rng.choice(64, size=int(rng.integers(0, 14)), replace=False):
+            queries[i] ^= np.uint64(1) << np.uint64(int(bit))
+    queries = np.concatenate(
+        [queries, rng.integers(0, 2**63, size=100, dtype=np.int64).view(np.uint64)]
+    )
+
+    qi, tj = hamming_neighbors(queries, table, threshold)
+    expected = set(zip(*np.nonzero(hamming_matrix(queries, table) <= threshold)))
+    assert set(zip(qi.tolist(), tj.tolist())) == {(int(i), int(j)) for i, j in expected}
+    assert len(qi) == len(expected)
+
+
+@pytest.mark.parametrize("transpose", list(Image.Transpose))
+def test_phash_input_transposes_like_the_full_image(transpose):
+    rng = np.random.default_rng(int(transpose))
+    img = Image.fromarray(rng.integers(0, 256, size=(413, 701, 3), dtype=np.uint8))
+    size = (PHASH_INPUT_SIZE, PHASH_INPUT_SIZE)
+    expected = np.asarray(
+        img.transpose(transpose).convert("L").resize(size, Image.Resampling.LANCZOS)
+    )
+    assert np.array_equal(phash_input(img, transpose), expected)
+
+
+def test_batched_phash_matches_single_extraction(tmp_path, write_image):
+    from photoscanner.scanner import ScanOptions, extract_features, hash_phash_inputs
+
+    paths = [
+        str(write_image(tmp_path / f"{i}.jpg", seed=i, size=(80 + 7 * i, 60))) for i in range(5)
+    ]
+    deferred = [extract_features(p, ScanOptions(), batch_phash=True) for p in paths]
+    assert all(f.phash == "" and f.rhash is None for f in deferred)
+    single = [extract_features(p, ScanOptions()) for p in paths]
+    assert hash_phash_inputs(deferred) == single
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_canonical_phash_is_orientation_invariant(seed):
+    from photoscanner.hashing import canonical_phash_batch
+
+    rng = np.random.default_rng(seed)
+    detail = rng.integers(0, 256, size=(24, 36, 3), dtype=np.uint8)
+    img = Image.fromarray(detail).resize((360, 240), Image.Resampling.BICUBIC)
+    variants = [img] + [img.transpose(t) for t in Image.Transpose]
+    hashes = canonical_phash_batch(np.stack([phash_input(v) for v in variants]))
+    # Resampling the transposed images can flip a bit or two, not more than
+    # scan grouping tolerates by default. (None of these seeds is near a
+    # canonical orientation boundary, see canonical_phash_batch().)
+    distances = [(int(h) ^ int(hashes[0])).bit_count() for h in hashes[1:]]
+    assert max(distances) <= 6, distances
+
+
+def test_exif_rotated_jpeg_is_hashed_as_displayed(tmp_path):
+    from photoscanner.hashing import phash_image, phash_to_hex
+    from photoscanner.scanner import ScanOptions, extract_features
+
+    rng = np.random.default_rng(0)
+    stored = Image.fromarray(rng.integers(0, 256, size=(16, 24, 3), dtype=np.uint8))
+    stored = stored.resize((240, 160), Image.Resampling.BICUBIC)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotate 90 CW to display.
+    path = tmp_path / "rotated.jpg"
+    stored.save(path, quality=95, exif=exif.tobytes())
+
+    features = extract_features(str(path), ScanOptions())
+    assert (features.width, features.height) == (160, 240)
+    with Image.open(path) as decoded:
+        upright = decoded.transpose(Image.Transpose.ROTATE_270)
+    assert features.phash == phash_to_hex(phash_image(upright))
@@ -0,0 +1,116 @@
+"""Import-time budget for photoscanner entry points.
+
+Heavy dependencies (OpenCV, numpy, PIL, torch, ...) must only load on first
+use. Each entry point is imported in a fresh interpreter with
+``-X importtime``; the test fails when one of them pulls in a heavy module.
+
+Wall-clock import time depends too much on the machine and its load to be
+checked by default. Set PHOTOSCANNER_IMPORT_BUDGET_MS to also fail when the
+time spent importing non-stdlib modules exceeds that many milliseconds.
+
+Run with ``python -m pytest test_import_time.py`` or directly as a script,
+which also prints the slowest imports.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import os
+import subprocess
+import sys
+from typing import Optional
+
+import pytest
+
+# Milliseconds of non-stdlib import time (photoscanner itself plus anything
+# third-party) allowed per entry point; None skips the check. The entry points
+# take 5-40 ms on a developer machine, so 150 is a reasonable setting on CI.
+_BUDGET = os.environ.get("PHOTOSCANNER_IMPORT_BUDGET_MS")
+IMPORT_BUDGET_MS: Optional[float] = float(_BUDGET) if _BUDGET else None
+
+HEAVY_MODULES = (
+    "cv2",
+    "numpy",
+    "PIL",
+    "imagehash",
+    "scipy",
+    "torch",
+    "sentence_transformers",
+    "mediapipe",
+    "ultralytics",
+    "pyexiv2",
+    "watchdog",
+)
+
+HEADLESS_ENTRY_POINTS = (
+    "photoscanner.cli",
+    "photoscanner.scanner",
+    "photoscanner.watch",
+    "photoscanner.ai",
+    "photoscanner.db",
+)
+
+
+def measure_import(module: str) -> dict[str, tuple[int, int]]:
+    """Import ``module`` in a fresh interpreter: {name: (self_us, cumulative_us)}."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    out: dict[str, tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        out[name.strip()] = (int(self_us), int(cumulative_us))
+    return out
+
+
+def non_stdlib_ms(timings: dict[str, tuple[int, int]]) -> float:
+    stdlib = sys.stdlib_module_names
+    return sum(s for name, (s, _) in timings.items() if name.split(".")[0] not in stdlib) / 1000
+
+
+@pytest.mark.parametrize("module", HEADLESS_ENTRY_POINTS)
+def test_headless_import_is_light(module: str) -> None:
+    timings = measure_import(module)
+    loaded = {name.split(".")[0] for name in timings}
+    heavy = sorted(loaded.intersection(HEAVY_MODULES + ("PySide6",)))
+    assert not heavy, f"importing {module} loads {heavy}"
+
+
+@pytest.mark.skipif(IMPORT_BUDGET_MS is None, reason="PHOTOSCANNER_IMPORT_BUDGET_MS not set")
+@pytest.mark.parametrize("module", HEADLESS_ENTRY_POINTS)
+def test_headless_import_is_fast(module: str) -> None:
+    ms = non_stdlib_ms(measure_import(module))
+    assert ms <= IMPORT_BUDGET_MS, (
+        f"importing {module} took {ms:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
+    )
+
+
+@pytest.mark.skipif(importlib.util.find_spec("PySide6") is None, reason="PySide6 not installed")
+def test_main_window_defers_tool_windows() -> None:
+    timings = measure_import("photoscanner.gui.main_window")
+    loaded = set(timings)
+    deferred = {
+        "photoscanner.gui.scanner_window",
+        "photoscanner.gui.label_images_window",
+        "photoscanner.scanner",
+    }
+    assert not loaded & deferred, f"main window imports {sorted(loaded & deferred)} eagerly"
+    heavy = sorted({name.split(".")[0] for name in loaded}.intersection(HEAVY_MODULES))
+    assert not heavy, f"main window loads {heavy}"
+
+
+if __name__ == "__main__":
+    for module in HEADLESS_ENTRY_POINTS:
+        timings = measure_import(module)
+        print(
+            f"{module}: {non_stdlib_ms(timings):.1f} ms non-stdlib, "
+            f"{timings[module][1] / 1000:.1f} ms total"
+        )
+        for name, (s, c) in sorted(timings.items(), key=lambda kv: -kv[1][1])[:5]:
+            print(f"    {c / 1000:8.1f} ms  {name}")
@@ -0,0 +1,151 @@
+"""Merging shard databases: path remapping, conflicts and carried-over deletions."""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import sqlite3
+
+import pytest
+
+from photoscanner.db import BadFile, ImageRecord, PhotoDB
+from photoscanner.merge import merge_shards, parse_prefix_map
+
+
+def _record(path, mtime_ns=1, phash="0123456789abcdef", score=1.0):
+    return ImageRecord(
+        path=path,
+        sha256=hashlib.sha256(path.encode()).hexdigest(),
+        phash=phash,
+        width=10 if phash else 0,
+        height=10 if phash else 0,
+        file_size=100,
+        mtime_ns=mtime_ns,
+        score=score,
+        embedding=None,
+        faces_json=None,
+        objects_json=None,
+    )
+
+
+def _make_db(path, records, folders=(), bad=()):
+    db = PhotoDB(path)
+    for r in records:
+        db.upsert_image(r)
+    for f in folders:
+        db.add_folder(f)
+    db.add_bad_files(bad)
+    db.commit()
+    return db
+
+
+def test_prefix_map_longest_prefix_wins(tmp_path):
+    _make_db(
+        tmp_path / "shard.sqlite",
+        [
+            _record("/a/photos/x.jpg"),
+            _record("/a/photos/sub/y.jpg"),
+            _record("/a/photosX/z.jpg"),
+            _record("/other/w.jpg"),
+        ],
+        folders=["/a/photos"],
+        bad=[BadFile("/a/photos/sub/bad.jpg", 1, 1, "ValueError", "broken")],
+    ).close()
+    target = PhotoDB(tmp_path / "target.sqlite")
+    rules = parse_prefix_map(["/a/photos=/mnt/p", "/a/photos/sub=D:\\sub"])
+    result = merge_shards(target, [tmp_path / "shard.sqlite"], rules)
+
+    assert (result.images, result.inserted) == (4, 4)
+    assert sorted(r.path for r in target.iter_images()) == [
+        "/a/photosX/z.jpg",
+        "/mnt/p/x.jpg",
+        "/other/w.jpg",
+        "D:\\sub\\y.jpg",
+    ]
+    assert target.get_folders() == ["/mnt/p"]
+    assert list(target.get_bad_files()) == ["D:\\sub\\bad.jpg"]
+    target.close()
+
+
+def test_conflicts_keep_the_newer_row(tmp_path):
+    target = _make_db(
+        tmp_path / "target.sqlite",
+        [
+            _record("/p/newer_in_shard.jpg", mtime_ns=10, score=1.0),
+            _record("/p/older_in_shard.jpg", mtime_ns=10, score=1.0),
+            _record("/p/tie_undecoded.jpg", mtime_ns=10, phash=""),
+            _record("/p/tie_decoded.jpg", mtime_ns=10, score=1.0),
+        ],
+    )
+    _make_db(
+        tmp_path / "shard.sqlite",
+        [
+            _record("/p/newer_in_shard.jpg", mtime_ns=20, score=2.0),
+            _record("/p/older_in_shard.jpg", mtime_ns=5, score=2.0),
+            _record("/p/tie_undecoded.jpg", mtime_ns=10, score=2.0),
+            _record("/p/tie_decoded.jpg", mtime_ns=10, score=2.0),
+            _record("/p/new.jpg"),
+        ],
+    ).close()
+    result = merge_shards(target, [tmp_path / "shard.sqlite"])
+
+    assert (result.inserted, result.updated, result.kept) == (1, 2, 2)
+    scores = {r.path: r.score for r in target.iter_images()}
+    assert scores == {
+        "/p/newer_in_shard.jpg": 2.0,
+        "/p/older_in_shard.jpg": 1.0,
+        "/p/tie_undecoded.jpg": 2.0,
+        "/p/tie_decoded.jpg": 1.0,
+        "/p/new.jpg": 1.0,
+    }
+
+    # Merging the same shard again changes nothing.
+    again = merge_shards(target, [tmp_path / "shard.sqlite"])
+    assert (again.inserted, again.updated, again.kept) == (0, 0, 5)
+    target.close()
+
+
+def test_replace_deletes_rows_the_shard_lost(tmp_path):
+    target = _make_db(
+        tmp_path / "target.sqlite",
+        [_record("/mnt/p/kept.jpg"), _record("/mnt/p/gone.jpg"), _record("/elsewhere/x.jpg")],
+    )
+    _make_db(tmp_path / "shard.sqlite", [_record("/a/kept.jpg")], folders=["/a"]).close()
+    rules = parse_prefix_map(["/a=/mnt/p"])
+
+    result = merge_shards(target, [tmp_path / "shard.sqlite"], rules)
+    assert result.deleted == 0 and target.get_image("/mnt/p/gone.jpg") is not None
+    result = merge_shards(target, [tmp_path / "shard.sqlite"], rules, replace=True)
+    assert result.deleted == 1
+    assert sorted(r.path for r in target.iter_images()) == ["/elsewhere/x.jpg", "/mnt/p/kept.jpg"]
+    target.close()
+
+
+def test_invalid_merges_are_refused(tmp_path):
+    target = PhotoDB(tmp_path / "target.sqlite")
+    with pytest.raises(ValueError, match="itself"):
+        merge_shards(target, [tmp_path / "target.sqlite"])
+
+    _make_db(tmp_path / "shard.sqlite", [_record("/p/x.jpg")]).close()
+    conn = sqlite3.connect(tmp_path / "shard.sqlite")
+    conn.execute("UPDATE meta SET value='99' WHERE key='schema_version'")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError, match="newer"):
+        merge_shards(target, [tmp_path / "shard.sqlite"])
+    with pytest.raises(ValueError, match="schema version 99"):
+        target.merge_shard(tmp_path / "shard.sqlite")
+    with pytest.raises(FileNotFoundError):
+        merge_shards(target, [tmp_path / "missing.sqlite"])
+    assert target.stats()["images"] == 0
+
+    # Rows from an exact-only scan carry a partial key instead of the digest.
+    partial = dataclasses.replace(_record("/p/exact.jpg", phash=""), sha256="partial:" + "ab" * 16)
+    _make_db(tmp_path / "exact.sqlite", [partial]).close()
+    with pytest.raises(ValueError, match="exact-only"):
+        merge_shards(target, [tmp_path / "exact.sqlite"])
+    assert target.stats()["images"] == 0
+
+    with pytest.raises(ValueError, match="OLD=NEW"):
+        parse_prefix_map(["/no/target"])
+    target.close()
@@ -0,0 +1,128 @@
+"""Schema migrations: v1 contents, resuming an interrupted copy, newer databases."""
+
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from photoscanner.db import SCHEMA_VERSION, PhotoDB
+from photoscanner.migrations import migrate, schema_version
+from photoscanner.scanner import is_full_sha256
+
+# The images table as the last version 1 release left it.
+_V1_SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    INSERT INTO meta VALUES('schema_version', '1');
+    CREATE TABLE images (
+        path TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        phash TEXT NOT NULL,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        file_size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        score REAL NOT NULL,
+        embedding BLOB,
+        faces_json TEXT,
+        objects_json TEXT,
+        dhash INTEGER,
+        ahash INTEGER,
+        whash INTEGER,
+        chash INTEGER,
+        rhash INTEGER,
+        from_preview INTEGER NOT NULL DEFAULT 0,
+        partial_hash TEXT
+    );
+    CREATE INDEX idx_images_sha256 ON images(sha256);
+"""
+
+SHA = "ab" * 32
+PARTIAL = "partial:" + "cd" * 16
+
+
+def _make_v1(path, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(_V1_SCHEMA)
+    conn.executemany(
+        "INSERT INTO images(path, sha256, phash, width, height, file_size, mtime_ns, score,"
+        " partial_hash) VALUES(?, ?, ?, 10, 10, ?, ?, 1.0, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_v1_database_is_migrated(tmp_path):
+    path = tmp_path / "v1.sqlite"
+    _make_v1(
+        path,
+        [
+            ("/lib/decoded.jpg", SHA, "ffff000000000001", 100, 1, PARTIAL),
+            # Exact-only row: a partial key in place of the digest, no pHash.
+            ("/lib/exact.jpg", PARTIAL, "", 200, 2, PARTIAL),
+        ],
+    )
+    db = PhotoDB(path)
+    assert db.stats()["schema_version"] == SCHEMA_VERSION
+
+    decoded = db.get_image("/lib/decoded.jpg")
+    assert decoded.sha256 == SHA and decoded.phash == "ffff000000000001"
+    assert decoded.phash_int == 0xFFFF000000000001
+    assert decoded.partial_hash == PARTIAL
+    exact = db.get_image("/lib/exact.jpg")
+    assert exact.sha256 == PARTIAL and not is_full_sha256(exact.sha256)
+    assert exact.phash == "" and exact.partial_hash == PARTIAL
+
+    stored = db._conn.execute(
+        "SELECT typeof(phash), phash < 0, length(sha256), length(partial_hash)"
+        " FROM images ORDER BY path"
+    ).fetchall()
+    assert [tuple(r) for r in stored] == [("integer", 1, 32, 16), ("null", None, 16, 16)]
+    db.close()
+
+
+def test_interrupted_copy_resumes(tmp_path):
+    path = tmp_path / "v1.sqlite"
+    rows = [(f"/lib/{i:03d}.jpg", f"{i:064x}", f"{i:016x}", i, i, None) for i in range(25)]
+    _make_v1(path, rows)
+
+    class Interrupted(Exception):
+        pass
+
+    def interrupt(progress):
+        if progress.done == 20:
+            raise Interrupted
+
+    conn = sqlite3.connect(path)
+    with pytest.raises(Interrupted):
+        migrate(conn, 2, progress_cb=interrupt, batch_size=10)
+    # Still a valid version 1 database, with the first two batches copied.
+    assert schema_version(conn) == 1
+    assert conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 25
+    assert conn.execute("SELECT COUNT(*) FROM images_v2").fetchone()[0] == 20
+
+    progress = []
+    assert migrate(conn, 2, progress_cb=progress.append, batch_size=10) == [2]
+    assert (progress[0].done, progress[0].total) == (20, 25)
+    assert schema_version(conn) == 2
+    leftover = conn.execute("SELECT name FROM sqlite_master WHERE name='images_v2'").fetchone()
+    assert leftover is None
+    copied = conn.execute(
+        "SELECT path, hex(sha256), file_size FROM images ORDER BY path"
+    ).fetchall()
+    assert copied == [(p, sha.upper(), size) for p, sha, _, size, _, _ in rows]
+    conn.close()
+
+
+def test_newer_database_is_refused(tmp_path):
+    path = tmp_path / "new.sqlite"
+    PhotoDB(path).close()
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE meta SET value=? WHERE key='schema_version'", (str(SCHEMA_VERSION + 1),))
+    conn.commit()
+    with pytest.raises(ValueError, match="newer"):
+        migrate(conn, SCHEMA_VERSION)
+    conn.close()
+    with pytest.raises(ValueError, match="newer"):
+        PhotoDB(path)
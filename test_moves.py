@@ -0,0 +1,100 @@
+"""Move detection: renamed files keep their rows instead of being indexed anew."""
+
+from __future__ import annotations
+
+import os
+import shutil
+
+from photoscanner.db import PhotoDB
+from photoscanner.scanner import ScanOptions, scan_folders
+
+
+class CountingEmbedder:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def embed_files(self, paths):
+        self.calls += len(paths)
+        return [b"\x01" * 8 for _ in paths]
+
+
+OPTIONS = ScanOptions(incremental=True, compute_embeddings=True)
+
+
+def _library(tmp_path, write_image, count=4):
+    trip = tmp_path / "lib" / "trip"
+    for i in range(count):
+        write_image(trip / f"{i}.jpg", seed=i)
+    return tmp_path / "lib", trip
+
+
+def test_renamed_folder_keeps_its_rows(tmp_path, write_image):
+    lib, trip = _library(tmp_path, write_image)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    embedder = CountingEmbedder()
+    scan_folders(db, [lib], OPTIONS, embedder)
+    db.update_image_objects(str(trip / "0.jpg"), '[{"label":"dog"}]')
+    before = {os.path.basename(r.path): r for r in db.iter_images()}
+
+    os.rename(trip, lib / "italy")
+    embedder.calls = 0
+    res = scan_folders(db, [lib], OPTIONS, embedder)
+    assert (res.moved, res.new, res.vanished, res.indexed) == (4, 0, 0, 0)
+    assert embedder.calls == 0
+    after = {os.path.basename(r.path): r for r in db.iter_images()}
+    assert all(r.path.startswith(str(lib / "italy")) for r in after.values())
+    for name, r in after.items():
+        assert (r.sha256, r.phash) == (before[name].sha256, before[name].phash)
+        assert r.embedding == b"\x01" * 8
+    assert after["0.jpg"].objects_json == '[{"label":"dog"}]'
+    db.close()
+
+
+def test_copies_and_changed_content_are_not_moves(tmp_path, write_image):
+    lib, trip = _library(tmp_path, write_image, count=2)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [lib], OPTIONS, CountingEmbedder())
+
+    # A copy whose source is still there.
+    shutil.copy2(trip / "0.jpg", lib / "0.jpg")
+    # Same name, size and mtime in a new place, but different bytes.
+    st = os.stat(trip / "1.jpg")
+    data = bytearray((trip / "1.jpg").read_bytes())
+    data[len(data) // 2] ^= 0x01
+    os.remove(trip / "1.jpg")
+    (lib / "other").mkdir()
+    (lib / "other" / "1.jpg").write_bytes(data)
+    os.utime(lib / "other" / "1.jpg", ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    res = scan_folders(db, [lib], OPTIONS, CountingEmbedder())
+    assert (res.moved, res.new, res.vanished) == (0, 2, 1)
+    assert db.get_image(str(lib / "0.jpg")).sha256 == db.get_image(str(trip / "0.jpg")).sha256
+    # The vanished row stays (until pruned) next to the new one.
+    changed = db.get_image(str(lib / "other" / "1.jpg"))
+    assert changed.sha256 != db.get_image(str(trip / "1.jpg")).sha256
+    db.close()
+
+
+def test_rows_without_partial_hash_are_confirmed_by_sha256(tmp_path, write_image):
+    lib, trip = _library(tmp_path, write_image, count=2)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [lib], ScanOptions())
+    # Rows indexed before partial hashes were stored.
+    db._conn.execute("UPDATE images SET partial_hash=NULL")
+    db.commit()
+
+    os.rename(trip, lib / "renamed")
+    res = scan_folders(db, [lib], ScanOptions())
+    assert (res.moved, res.new, res.vanished) == (2, 0, 0)
+    db.close()
+
+
+def test_detect_moves_off_reindexes(tmp_path, write_image):
+    lib, trip = _library(tmp_path, write_image, count=2)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [lib], ScanOptions(incremental=True))
+
+    os.rename(trip, lib / "renamed")
+    res = scan_folders(db, [lib], ScanOptions(incremental=True, detect_moves=False))
+    assert (res.moved, res.new, res.vanished, res.indexed) == (0, 2, 2, 2)
+    db.close()
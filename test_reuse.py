@@ -0,0 +1,58 @@
+"""Feature reuse: files whose content is already indexed under another path."""
+
+from __future__ import annotations
+
+import shutil
+
+from photoscanner.db import PhotoDB
+from photoscanner.scanner import ScanOptions, extract_features, scan_folders
+
+
+def test_copy_reuses_the_indexed_features(tmp_path, write_image):
+    lib = tmp_path / "lib"
+    original = write_image(lib / "a" / "0.jpg", seed=1)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [lib], ScanOptions(incremental=True))
+
+    shutil.copy2(original, lib / "b.jpg")
+    res = scan_folders(db, [lib], ScanOptions(incremental=True))
+    assert (res.new, res.indexed, res.reused) == (1, 1, 1)
+    src, copy = db.get_image(str(original)), db.get_image(str(lib / "b.jpg"))
+    assert copy.sha256 == src.sha256
+    assert (copy.phash, copy.dhash, copy.rhash, copy.width, copy.height) == (
+        src.phash, src.dhash, src.rhash, src.width, src.height
+    )
+    db.close()
+
+
+def test_full_rescan_recomputes_features(tmp_path, write_image):
+    lib = tmp_path / "lib"
+    paths = [str(write_image(lib / f"{i}.jpg", seed=i, size=(700, 500))) for i in range(3)]
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [lib], ScanOptions(fast_decode=True))
+    # Stale features an earlier version might have stored.
+    db._conn.execute("UPDATE images SET dhash=0")
+    db.commit()
+
+    res = scan_folders(db, [lib], ScanOptions())
+    assert (res.indexed, res.reused) == (3, 0)
+    for p in paths:
+        assert db.get_image(p).dhash == extract_features(p, ScanOptions()).dhash != 0
+    db.close()
+
+
+def test_preview_rows_are_not_reused_without_previews(tmp_path, write_image):
+    original = write_image(tmp_path / "old" / "0.jpg", seed=1)
+    db = PhotoDB(tmp_path / "db.sqlite")
+    scan_folders(db, [tmp_path / "old"], ScanOptions())
+    # As if hashed from the EXIF thumbnail by a use_previews scan.
+    db._conn.execute("UPDATE images SET from_preview=1")
+    db.commit()
+
+    lib = tmp_path / "lib"
+    lib.mkdir()
+    shutil.copy2(original, lib / "copy.jpg")
+    res = scan_folders(db, [lib], ScanOptions())
+    assert (res.indexed, res.reused) == (1, 0)
+    assert not db.get_image(str(lib / "copy.jpg")).from_preview
+    db.close()